@@ -0,0 +1,86 @@
+import os
+import tempfile
+import time
+import unittest
+
+from assertpy import assert_that
+
+from app_lifecycle import AppLifecycle
+from HeartbeatLog import HeartbeatLog
+from metrics import Registry
+
+START = 1_700_000_000
+CLOSED_PORT = 1  # nothing listens here, so every connection attempt is refused
+
+
+class AppLifecycleTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def lifecycle(self, **options):
+        lifecycle = AppLifecycle(broker="127.0.0.1", port=CLOSED_PORT, min_backoff=0.01, max_backoff=0.04,
+                                 registry=Registry(), **options)
+        self.addCleanup(lifecycle.stop)
+        return lifecycle
+
+    def test_serves_an_empty_dashboard_until_started(self):
+        lifecycle = self.lifecycle()
+
+        assert_that(lifecycle.progress()).contains_entry({'ready': False}, {'stage': "created"})
+        assert_that(lifecycle.dashboard.view_records()).is_empty()
+
+    def test_warm_up_restores_history_without_a_broker(self):
+        log = HeartbeatLog(self.directory.name)
+        for epoch in range(START, START + 600, 10):
+            log.append("Patrick", epoch)
+        log.close()
+        lifecycle = self.lifecycle(log_dir=self.directory.name)
+
+        lifecycle.start()
+
+        assert_that(lifecycle.wait_until_ready(timeout=10)).is_true()
+        assert_that(lifecycle.progress()).contains_entry({'heartbeats_restored': 60}, {'mqtt_connected': False})
+        assert_that(lifecycle.dashboard.devices).contains_key("Patrick")
+
+    def test_restart_with_a_database_replays_only_newer_log_entries(self):
+        db = os.path.join(self.directory.name, "heartbeats.db")
+        log_dir = os.path.join(self.directory.name, "log")
+        log = HeartbeatLog(log_dir)
+        for epoch in range(START, START + 3600, 10):
+            log.append("Patrick", epoch)
+        log.close()
+
+        for restored in (360, 0):
+            lifecycle = self.lifecycle(log_dir=log_dir, db=db)
+            lifecycle.start()
+            assert_that(lifecycle.wait_until_ready(timeout=10)).is_true()
+            storage = lifecycle.dashboard.devices
+            assert_that(lifecycle.progress()).contains_entry({'heartbeats_restored': restored})
+            assert_that(storage.stats(storage.values())).contains_entry({'stored_heartbeats': 360})
+            lifecycle.stop()
+
+        # Logged but never committed to the database, e.g. after a crash
+        log = HeartbeatLog(log_dir)
+        log.append("Patrick", START + 3600)
+        log.close()
+        lifecycle = self.lifecycle(log_dir=log_dir, db=db)
+        lifecycle.start()
+        assert_that(lifecycle.wait_until_ready(timeout=10)).is_true()
+        storage = lifecycle.dashboard.devices
+        assert_that(lifecycle.progress()).contains_entry({'heartbeats_restored': 1})
+        assert_that(storage.stats(storage.values())).contains_entry({'stored_heartbeats': 361})
+
+    def test_connection_is_retried_with_backoff(self):
+        lifecycle = self.lifecycle()
+        lifecycle.start()
+        lifecycle.wait_until_ready(timeout=10)
+
+        time.sleep(0.3)
+
+        # 0.01 + 0.02 + 0.04 + 0.04 ... seconds apart: several attempts, but far fewer than without a wait
+        assert_that(lifecycle.mqtt_client.connect_attempts).is_between(3, 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+from collections.abc import Mapping, MutableMapping, ValuesView, ItemsView
+from types import MappingProxyType
+
+CHUNK_SIZE = 256  # keys per chunk; a freeze copies only the chunks written to since the last one
+
+
+class ChunkedMap(MutableMapping):
+    """
+    Dict split into chunks of CHUNK_SIZE keys, in insertion order, whose
+    freeze() shares every chunk left unwritten since the previous freeze.
+
+    Publishing a snapshot of a large map after a few writes thus copies a
+    few chunks, not the whole map. A key keeps the chunk it was first
+    inserted in, even after it is deleted, so frozen maps can share the
+    append-only key -> chunk table with the live one.
+    """
+
+    def __init__(self, items=()):
+        self.clear()
+        self.update(items)
+
+    def clear(self):
+        self._chunk_of = {}  # key -> chunk number; never rewritten, frozen maps read it too
+        self._chunks = []
+        self._frozen = []  # read-only view per chunk, None once it is written to
+        self._len = 0
+
+    def __getitem__(self, key):
+        return self._chunks[self._chunk_of[key]][key]
+
+    def __setitem__(self, key, value):
+        number = self._chunk_of.get(key)
+        if number is None:
+            number = self._chunk_of[key] = len(self._chunk_of) // CHUNK_SIZE
+            if number == len(self._chunks):
+                self._chunks.append({})
+                self._frozen.append(None)
+        chunk = self._chunks[number]
+        if key not in chunk:
+            self._len += 1
+        chunk[key] = value
+        self._frozen[number] = None
+
+    def __delitem__(self, key):
+        number = self._chunk_of[key]
+        del self._chunks[number][key]
+        self._len -= 1
+        self._frozen[number] = None
+
+    def __contains__(self, key):
+        number = self._chunk_of.get(key)
+        return number is not None and key in self._chunks[number]
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield from chunk
+
+    def __len__(self):
+        return self._len
+
+    def freeze(self):
+        """Immutable FrozenMap of the current contents, in O(chunks + written chunks * CHUNK_SIZE)."""
+        for number, frozen in enumerate(self._frozen):
+            if frozen is None:
+                self._frozen[number] = MappingProxyType(dict(self._chunks[number]))
+        return FrozenMap(tuple(self._frozen), self._chunk_of, self._len)
+
+
+class FrozenMap(Mapping):
+    """Read-only snapshot of a ChunkedMap; iterates in insertion order like a dict."""
+
+    def __init__(self, chunks=(), chunk_of=None, length=0):
+        self._chunks = chunks
+        self._chunk_of = {} if chunk_of is None else chunk_of
+        self._len = length
+
+    def __getitem__(self, key):
+        number = self._chunk_of.get(key)
+        if number is None or number >= len(self._chunks):
+            raise KeyError(key)  # inserted after this snapshot was taken
+        return self._chunks[number][key]
+
+    def __contains__(self, key):
+        number = self._chunk_of.get(key)
+        return number is not None and number < len(self._chunks) and key in self._chunks[number]
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield from chunk
+
+    def __len__(self):
+        return self._len
+
+    def values(self):
+        return _FrozenValues(self)
+
+    def items(self):
+        return _FrozenItems(self)
+
+
+class _FrozenValues(ValuesView):
+    def __iter__(self):
+        for chunk in self._mapping._chunks:
+            yield from chunk.values()
+
+
+class _FrozenItems(ItemsView):
+    def __iter__(self):
+        for chunk in self._mapping._chunks:
+            yield from chunk.items()
@@ -0,0 +1,37 @@
+import unittest
+from assertpy import assert_that
+
+from ChunkedMap import CHUNK_SIZE, ChunkedMap
+
+
+class ChunkedMapTest(unittest.TestCase):
+    def test_behaves_like_a_dict_in_insertion_order(self):
+        chunked = ChunkedMap((f"device_{n}", n) for n in range(3 * CHUNK_SIZE))
+        chunked["device_5"] = -5
+        del chunked["device_6"]
+        chunked["device_6"] = 6
+
+        expected = {f"device_{n}": n for n in range(3 * CHUNK_SIZE)}
+        expected["device_5"] = -5
+        assert_that(dict(chunked)).is_equal_to(expected)
+        assert_that(list(chunked.freeze().values())).is_equal_to(list(chunked.values()))
+
+    def test_a_frozen_map_keeps_its_contents_and_shares_unwritten_chunks(self):
+        chunked = ChunkedMap((n, n) for n in range(10 * CHUNK_SIZE))
+        first = chunked.freeze()
+        chunked[3] = "changed"
+        chunked["new"] = "added"
+
+        second = chunked.freeze()
+
+        assert_that(first[3]).is_equal_to(3)
+        assert_that("new" in first).is_false()
+        assert_that(first).is_length(10 * CHUNK_SIZE)
+        assert_that(second[3]).is_equal_to("changed")
+        assert_that(second["new"]).is_equal_to("added")
+        copied = [chunk for chunk in second._chunks if not any(chunk is old for old in first._chunks)]
+        assert_that(copied).is_length(2)  # the written chunk and the new one
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, used to speed up bulk reads
+    np = None
+
+
+def _lowbit(i):
+    return i & -i
+
+
+class CountIndex:
+    """
+    Fenwick tree of heartbeat counts per fixed-width time bucket.
+
+    count(start, end) answers "how many heartbeats between start and end"
+    in O(log n) whatever the width of the range. A bucket is counted when
+    its start lies in [start, end), so ranges are rounded to bucket starts.
+    """
+
+    def __init__(self, resolution=10):
+        self.resolution = resolution
+        self.base_bucket = None  # bucket held by tree position 1
+        self.first_bucket = None  # oldest bucket still kept once trim() has been called
+        self.total = 0  # heartbeats held in the tree
+        self._tree = array('q', [0, 0])  # 1-based; the capacity is always a power of two
+        # Heartbeats for the newest bucket are summed here and enter the tree
+        # once the next bucket starts, so coarse buckets cost one tree walk each.
+        self._open_bucket = None
+        self._open_count = 0
+
+    @property
+    def capacity(self):
+        return len(self._tree) - 1
+
+    def bucket_for(self, epoch):
+        return int(epoch // self.resolution)
+
+    def add(self, epoch, count=1):
+        """Count a heartbeat; returns False when it falls before the trimmed range."""
+        bucket = self.bucket_for(epoch)
+        if bucket == self._open_bucket:
+            self._open_count += count
+            return True
+        if self.first_bucket is not None and bucket < self.first_bucket:
+            return False
+        if self._open_bucket is None or bucket > self._open_bucket:
+            self._flush()
+            self._open_bucket, self._open_count = bucket, count
+            return True
+        self._add_to_tree(bucket, count)
+        return True
+
+    def load(self, first_bucket, counts):
+        """
+        Fill an empty index with per-bucket counts starting at first_bucket,
+        in O(n). The last bucket becomes the open bucket, as if it had just
+        been added.
+        """
+        if self._open_bucket is not None:
+            raise ValueError("load() needs an empty index")
+        counts = [int(count) for count in counts]
+        if not counts:
+            return
+        if len(counts) > 1:
+            self._build(counts[:-1])
+            self.base_bucket = first_bucket
+            self.total = sum(counts[:-1])
+        self._open_bucket, self._open_count = first_bucket + len(counts) - 1, counts[-1]
+
+    def _flush(self):
+        count, self._open_count = self._open_count, 0
+        if count:
+            self._add_to_tree(self._open_bucket, count)
+
+    def _add_to_tree(self, bucket, count):
+        if self.base_bucket is None:
+            self.base_bucket = bucket
+        elif bucket < self.base_bucket:
+            self._rebase(bucket)
+        position = bucket - self.base_bucket + 1
+        while position > self.capacity:
+            self._double()
+
+        self.total += count
+        tree = self._tree
+        capacity = len(tree) - 1
+        while position <= capacity:
+            tree[position] += count
+            position += position & -position
+
+    def count(self, start, end):
+        """Heartbeats in buckets starting within [start, end), start and end in epoch seconds."""
+        first = -int(-start // self.resolution)  # ceil
+        stop = -int(-end // self.resolution)
+        if self.first_bucket is not None:
+            first = max(first, self.first_bucket)
+        if first >= stop:
+            return 0
+        total = self._open_count if self._open_bucket is not None and first <= self._open_bucket < stop else 0
+        if self.base_bucket is None:
+            return total
+        return total + self._prefix(stop - self.base_bucket) - self._prefix(first - self.base_bucket)
+
+    def nth_bucket(self, start, n):
+        """
+        Start of the bucket holding the `n`-th heartbeat (from 1) of those
+        count(start, ...) counts, or None when it counts fewer. Found by
+        descending the tree, in O(log n).
+        """
+        first = -int(-start // self.resolution)
+        if self.first_bucket is not None:
+            first = max(first, self.first_bucket)
+        if self.base_bucket is not None:
+            before = self._prefix(first - self.base_bucket)
+            if before + n <= self.total:
+                tree, position, remaining = self._tree, 0, before + n
+                step = self.capacity
+                while step:
+                    if tree[position + step] < remaining:
+                        position += step
+                        remaining -= tree[position]
+                    step >>= 1
+                return (self.base_bucket + position) * self.resolution
+            n -= self.total - before
+        if self._open_bucket is not None and self._open_bucket >= first and n <= self._open_count:
+            return self._open_bucket * self.resolution
+        return None
+
+    def bucket_count(self, epoch):
+        """Heartbeats in the single bucket holding `epoch`."""
+        start = self.bucket_for(epoch) * self.resolution
+        return self.count(start, start + self.resolution)
+
+    def start_epoch(self):
+        """Start of the oldest bucket kept, or None when nothing has been trimmed."""
+        return None if self.first_bucket is None else self.first_bucket * self.resolution
+
+    def trim(self, before):
+        """
+        Forget buckets starting before `before`. Memory is released once
+        the forgotten buckets fill half the tree, so trimming is amortized O(1).
+        """
+        if self._open_bucket is None:
+            return
+        first = -int(-before // self.resolution)
+        if self.first_bucket is not None and first <= self.first_bucket:
+            return
+        self.first_bucket = first
+        if self._open_bucket < first:
+            self._open_bucket, self._open_count = None, 0
+        if self.base_bucket is None or 2 * (first - self.base_bucket) < self.capacity:
+            return
+        self._flush()
+        dead = first - self.base_bucket
+        if 2 * dead >= self.capacity:
+            counts = self.bucket_counts()[dead:]
+            self._build(counts)
+            self.base_bucket = first
+            self.total = sum(counts)
+
+    def _prefix(self, buckets):
+        """Sum of the first `buckets` buckets."""
+        if buckets <= 0:
+            return 0
+        if buckets >= self.capacity:
+            return self.total
+        tree = self._tree
+        total = 0
+        while buckets > 0:
+            total += tree[buckets]
+            buckets -= buckets & -buckets
+        return total
+
+    def _double(self):
+        # Nodes past the old capacity cover ranges entirely inside the new half,
+        # except the new root which covers everything.
+        capacity = self.capacity
+        self._tree.extend(array('q', bytes(8 * capacity)))
+        self._tree[2 * capacity] = self.total
+
+    def _rebase(self, bucket):
+        """Move the first bucket back to `bucket`, rebuilding the tree in O(n)."""
+        counts = self.bucket_counts()
+        while counts and not counts[-1]:
+            counts.pop()  # empty buckets past the newest would otherwise double the tree on every rebase
+        shift = self.base_bucket - bucket
+        self._build([0] * shift + counts)
+        self.base_bucket = bucket
+
+    def bucket_counts(self):
+        """Per-bucket counts, starting at base_bucket."""
+        self._flush()
+        return self._points()
+
+    def bucket_range(self, first, stop):
+        """Per-bucket counts for buckets [first, stop), as a list."""
+        counts = [0] * max(stop - first, 0)
+        if not counts:
+            return counts
+        if self.first_bucket is not None:
+            first_kept = max(first, self.first_bucket)
+        else:
+            first_kept = first
+        if self.base_bucket is not None:
+            points = self._points()
+            for bucket in range(max(first_kept, self.base_bucket), min(stop, self.base_bucket + len(points))):
+                counts[bucket - first] = points[bucket - self.base_bucket]
+        if self._open_bucket is not None and first_kept <= self._open_bucket < stop:
+            counts[self._open_bucket - first] += self._open_count
+        return counts
+
+    def _points(self):
+        """Undo the Fenwick sums: each node minus the nodes folded into it."""
+        capacity = self.capacity
+        if np is not None:
+            tree = np.array(self._tree, dtype=np.int64)
+            positions = np.arange(1, capacity + 1)
+            parents = positions + (positions & -positions)
+            inside = parents <= capacity
+            points = tree.copy()
+            np.subtract.at(points, parents[inside], tree[positions[inside]])
+            return points[1:].tolist()
+        values = self._tree.tolist()
+        for position in range(capacity, 0, -1):
+            parent = position + _lowbit(position)
+            if parent <= capacity:
+                values[parent] -= values[position]
+        return values[1:]
+
+    def _build(self, counts):
+        capacity = 1
+        while capacity < len(counts):
+            capacity *= 2
+        values = [0] + counts + [0] * (capacity - len(counts))
+        for position in range(1, capacity + 1):
+            parent = position + _lowbit(position)
+            if parent <= capacity:
+                values[parent] += values[position]
+        self._tree = array('q', values)
+
+    @property
+    def nbytes(self):
+        return len(self._tree) * self._tree.itemsize
@@ -0,0 +1,60 @@
+import unittest
+from assertpy import assert_that
+
+from CountIndex import CountIndex
+
+
+class CountIndexTest(unittest.TestCase):
+    def test_counts_heartbeats_in_range(self):
+        index = CountIndex(resolution=10)
+        for epoch in range(1000, 2000, 10):
+            index.add(epoch)
+        assert_that(index.count(1000, 2000)).is_equal_to(100)
+        assert_that(index.count(1500, 1600)).is_equal_to(10)
+        assert_that(index.count(0, 1000)).is_equal_to(0)
+
+    def test_range_is_rounded_to_bucket_starts(self):
+        index = CountIndex(resolution=10)
+        index.add(1004)
+        assert_that(index.count(1000, 1001)).is_equal_to(1)
+        assert_that(index.count(1001, 1010)).is_equal_to(0)
+
+    def test_grows_forwards_and_backwards(self):
+        index = CountIndex(resolution=1)
+        index.add(5000)
+        index.add(100_000)
+        index.add(10)
+        assert_that(index.count(0, 200_000)).is_equal_to(3)
+        assert_that(index.count(11, 100_000)).is_equal_to(1)
+        assert_that(index.bucket_counts()[0]).is_equal_to(1)
+
+    def test_descending_heartbeats_keep_the_tree_small(self):
+        index = CountIndex(resolution=10)
+        for epoch in range(3000, 0, -10):
+            index.add(epoch)
+        assert_that(index.count(0, 4000)).is_equal_to(300)
+        assert_that(index.capacity).is_less_than_or_equal_to(512)
+
+    def test_empty_index_counts_nothing(self):
+        assert_that(CountIndex().count(0, 10**10)).is_equal_to(0)
+
+    def test_nth_bucket_is_where_a_count_reaches_n(self):
+        index = CountIndex(resolution=10)
+        for epoch in (1000, 1003, 1020, 1050, 1050, 1090):
+            index.add(epoch)
+        index.trim(1010)
+
+        for start in (0, 1000, 1015, 1021, 1090):
+            for n in range(1, 6):
+                bucket = index.nth_bucket(start, n)
+                if bucket is None:
+                    assert_that(index.count(start, 2000)).is_less_than(n)
+                else:
+                    assert_that(index.count(start, bucket + 10)).is_greater_than_or_equal_to(n)
+                    assert_that(index.count(start, bucket)).is_less_than(n)
+        assert_that(index.nth_bucket(1015, 2)).is_equal_to(1050)
+        assert_that(index.nth_bucket(1015, 4)).is_equal_to(1090)  # the open bucket
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,33 +1,620 @@
-from datetime import datetime
-import pandas as pd
-from DeviceDashboardViewRow import DeviceDashboardViewRow
-from Device import Device
+import heapq
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from ChunkedMap import ChunkedMap
+from DashboardSnapshot import DashboardSnapshot
+from DeviceDashboardViewRow import DeviceDashboardViewRow, LAST_SEEN_FORMAT
+from DeviceStorage import MemoryStorage
+from FleetArrays import FleetArrays
+from GroupIndex import GroupIndex
+from HeartbeatPage import HeartbeatPage
+from metrics import ADD_BATCH_SECONDS, VIEW_FRAME_SECONDS
+from RollupIndex import DEFAULT_RAW_WINDOW, DEFAULT_RETENTION
+from StalenessIndex import DEFAULT_MISSED_HEARTBEATS, StalenessIndex
+from ViewIndex import ViewIndex
+from table_query import page_delta, query_page
+
+try:
+    import numpy as np
+except ImportError:  # bulk_load groups with plain dicts without numpy
+    np = None
+
+UPTIME_ENGINES = ("index", "count", "slots", "vectorized")
+DEFAULT_TIMELINE_BUCKETS = 120  # at most this many points per drill-down chart
+
 
 class DashBoard:
-    def __init__(self, heartbeat_interval = 10, uptime_window = 3600):
-        self.devices = {}  # Dictionary mapping device_id to Device objects
+    def __init__(self, heartbeat_interval = 10, uptime_window = 3600, uptime_engine = "index",
+                 raw_window = DEFAULT_RAW_WINDOW, retention = DEFAULT_RETENTION,
+                 missed_heartbeats = DEFAULT_MISSED_HEARTBEATS, storage = None):
+        if uptime_engine not in UPTIME_ENGINES:
+            raise ValueError(f"Unknown uptime engine {uptime_engine}, expected one of {UPTIME_ENGINES}")
+        # Mapping of device_id to device, kept in memory unless another storage backend is given
+        self.devices = storage if storage is not None else MemoryStorage()
         self.heartbeat_interval = heartbeat_interval
         self.uptime_window = uptime_window
+        self.uptime_engine = uptime_engine
+        self.raw_window = raw_window  # raw heartbeat timestamps are kept this long
+        self.retention = retention  # rolled-up counts are kept this long
+        self.missed_heartbeats = missed_heartbeats  # a device is offline after missing this many heartbeats
+        self.staleness = StalenessIndex(heartbeat_interval * missed_heartbeats)
+        self.on_status_change = None  # optional callback(StatusChange), called by the writer when snapshots are published
+        # Incremental view model: formatted records are cached per device and only
+        # recomputed when the device changed or the moving window changes its record
+        self._view = ViewIndex()  # formatted records, ordered by every sortable column
+        self._rows = ChunkedMap()  # device_id -> DeviceDashboardViewRow
+        self._dirty = set()
+        self._wakeups = []  # heap of (epoch, device_id): when a device's record may next change without a heartbeat
+        self._wake_at = {}  # device_id -> its live entry in _wakeups; other entries are skipped
+        self._reporting = set()  # devices that reported when last recomputed, looked at again next tick
+        self._view_settings = None
+        self._view_tick = None
+        self._view_fleet = None  # FleetArrays the vectorized records were computed from
+        self._fleet_uptimes = None  # their uptimes, by row
+        self._outage_cells_by_id = {}  # device_id -> (last outage text, outages in window), for the vectorized engine
+        self._outage_views = ChunkedMap()  # device_id -> frozen OutageIndex, published for readers
+        self._outages_view = self._outage_views.freeze()
+        self.fleet = None  # FleetArrays for the vectorized engine, built on first use
+        self.groups = GroupIndex(heartbeat_interval, uptime_window)  # per-group counters, kept up to date per heartbeat
+        self.log = None  # optional HeartbeatLog every applied heartbeat is appended to
+        # Snapshot read model: one writer (the ingest worker, or the caller when nothing
+        # publishes in the background) builds immutable snapshots that readers share
+        self.background_publishing = False
+        self._snapshot = DashboardSnapshot()
+        self._snapshot_published = threading.Condition()
+        self._device_views = ChunkedMap()  # device_id -> Device, as published
+        self._created = []  # IDs of devices created since the last publish
+        self._devices_view = self._device_views.freeze()
+        self._groups_restored = not self.devices  # recounted from the devices' history on the first publish otherwise
+        self._restore_staleness()
+
+    def _device(self, device_id):
+        device = self.devices.get(device_id)
+        if device is None:
+            device = self.devices.create(device_id, self.heartbeat_interval, self.raw_window, self.retention,
+                                         self.heartbeat_interval * self.missed_heartbeats)
+            self._created.append(device_id)
+        return device
 
     def addHeartBeat(self, heartbeat):
         device_id = heartbeat.device_id
-        if device_id not in self.devices:
-            self.devices[device_id] = Device(device_id)
-        self.devices[device_id].add_heartbeat(heartbeat)
+        epoch = heartbeat.timestamp.timestamp()
+        device = self._device(device_id)
+        self.groups.heartbeat(device_id, epoch, heartbeat.group, device.count_between)
+        if heartbeat.group is not None:
+            device.group = heartbeat.group  # kept with the device, so persistent storage can restore it
+        device.add_heartbeat(heartbeat)
+        self._dirty.add(device_id)
+        self.staleness.touch(device_id, epoch)
+        if self.fleet is not None:
+            self.fleet.record(device_id, epoch)
+        if self.log is not None:
+            self.log.append(device_id, epoch)
+
+    def addHeartBeats(self, heartbeats):
+        """Apply a batch of heartbeats, e.g. one drained from the ingest queue."""
+        started = time.perf_counter()
+        for heartbeat in heartbeats:
+            self.addHeartBeat(heartbeat)
+        if heartbeats:
+            # One observation per batch, so the hot loop stays untouched; batch sizes vary with the load
+            ADD_BATCH_SECONDS.observe(time.perf_counter() - started)
+        self.devices.commit()
+        if self.log is not None:
+            self.log.commit()  # one write per batch (group commit)
+
+    def load_device_epochs(self, device_id, epochs):
+        """Restore one device's history from ascending epoch seconds, without logging it again."""
+        device = self._device(device_id)
+        self.groups.load(device_id, epochs, None, device.count_between)
+        device.load_epochs(epochs)
+        self._dirty.add(device_id)
+        last_seen = device.last_seen_epoch()
+        if last_seen is not None:
+            self.staleness.touch(device_id, last_seen)
+        self.fleet = None  # rebuilt from the devices on next use
 
-    def generate_view_row(self, device_id):
+    def bulk_load(self, device_ids, epochs=None):
+        """
+        Load heartbeats from columnar input instead of HeartBeat objects:
+        parallel sequences of device IDs and epoch seconds, or, with epochs
+        left out, an iterable of (device_ids, epochs) batches. Each batch is
+        grouped by device and sorted, then appended to every device in one
+        step. Returns the number of heartbeats read.
+        """
+        batches = [(device_ids, epochs)] if epochs is not None else device_ids
+        total = 0
+        for batch_ids, batch_epochs in batches:
+            if len(batch_ids) != len(batch_epochs):
+                raise ValueError(f"Got {len(batch_ids)} device ids for {len(batch_epochs)} epochs")
+            for device_id, device_epochs in _group_by_device(batch_ids, batch_epochs):
+                self.load_device_epochs(device_id, device_epochs)
+                if self.log is not None:
+                    self.log.extend(device_id, device_epochs)
+            total += len(batch_epochs)
+        self.devices.commit()
+        if self.log is not None:
+            self.log.commit()
+        return total
+
+    def generate_view_row(self, device_id, uptime_engine=None, now=None):
         device = self.devices[device_id]
         return DeviceDashboardViewRow(
             device_id=device_id,
             last_seen=device.get_last_seen(),
-            uptime=device.calculate_uptime(self.heartbeat_interval, self.uptime_window)
+            uptime=self._device_uptime(device, uptime_engine or self.uptime_engine, now),
+            status="online" if self.staleness.is_online(device_id) else "offline",
+            group=self.groups.name_of(device_id),
+            **self._device_outages(device_id, device, now)
         )
 
-    def generateViewFrame(self):
-        unique_ids = set(self.devices.keys())
-        view_rows = list(map(self.generate_view_row, unique_ids))
-        return pd.DataFrame(view_rows)
+    def view_records(self, now=None):
+        """
+        Table records for every device, without pandas.
+
+        While an ingest worker publishes snapshots this returns the latest
+        one without blocking it; otherwise the view is refreshed first.
+        """
+        return list(self.snapshot(now).records)
+
+    def snapshot(self, now=None):
+        """Latest published DashboardSnapshot, refreshed first when nothing publishes in the background."""
+        if now is None and self.background_publishing:
+            return self._snapshot
+        return self.publish_snapshot(now)
+
+    def publish_snapshot(self, now=None):
+        """
+        Writer side: refresh the view and publish it as a new immutable
+        snapshot. Must only be called from the thread applying heartbeats.
+        """
+        if now is None:
+            now = datetime.now(tz=timezone.utc).timestamp()
+        self._update_status(now)
+        groups = tuple(self._group_index(now).records(now))
+        changed = self._refresh_view(now)
+        if changed is not None and not changed and self._snapshot.version and groups == self._snapshot.groups:
+            return self._snapshot
+
+        if len(self._devices_view) != len(self.devices):
+            self._devices_view = self._published_devices()
+        if len(self._outages_view) != len(self._outage_views) or changed is None or changed:
+            self._outages_view = self._outage_views.freeze()
+        # Chunked records, orders and rows: only the chunks changed since the last publish are copied
+        rows = self._rows.freeze().values() if self.uptime_engine != "vectorized" else None
+        records_by_id, orders = self._view.freeze()
+        version = self._snapshot.version + 1
+        snapshot = DashboardSnapshot(version, now, records_by_id.values(), rows,
+                                     self._devices_view, (self.heartbeat_interval, self.uptime_window),
+                                     records_by_id, orders, self._snapshot.recent_changes(version, changed), groups,
+                                     self._outages_view)
+        self._snapshot = snapshot
+        with self._snapshot_published:
+            self._snapshot_published.notify_all()
+        return snapshot
+
+    def _published_devices(self):
+        """Devices for the next snapshot: the ones created since the last publish are added, the rest shared."""
+        created, self._created = self._created, []
+        for device_id in created:
+            self._device_views[device_id] = self.devices[device_id]
+        if len(self._device_views) != len(self.devices):  # e.g. devices a persistent storage already held
+            for device_id in self.devices:
+                if device_id not in self._device_views:
+                    self._device_views[device_id] = self.devices[device_id]
+        return self._device_views.freeze()
+
+    def view_groups(self, now=None):
+        """Health of every group of devices, parents before their children; see GroupIndex."""
+        return list(self.snapshot(now).groups)
+
+    def view_page(self, page_current=0, page_size=50, sort_by=None, filter_query="", now=None):
+        """One page of the table and the number of matching records, sorted and filtered server-side."""
+        snapshot = self.snapshot(now)
+        return query_page(snapshot.records_by_id, snapshot.orders, page_current, page_size, sort_by, filter_query)
+
+    def page_delta(self, since_version=0, known_ids=(), page_current=0, page_size=50, sort_by=None,
+                   filter_query="", now=None):
+        """One page as a patch for a client that holds `known_ids` as of `since_version`, see table_query.page_delta."""
+        return page_delta(self.snapshot(now), since_version, known_ids, page_current, page_size, sort_by, filter_query)
+
+    @property
+    def view_version(self):
+        """Version of the latest published view; it only increases, and only when a record changed."""
+        return self._snapshot.version
+
+    def wait_for_snapshot(self, newer_than, timeout=None):
+        """Reader side: wait until a snapshot newer than version `newer_than` is published."""
+        with self._snapshot_published:
+            self._snapshot_published.wait_for(lambda: self._snapshot.version > newer_than, timeout)
+        return self._snapshot
+
+    def _update_status(self, now):
+        """Apply the online/offline transitions due by `now`; only the devices that changed are visited."""
+        self.staleness.set_timeout(self.heartbeat_interval * self.missed_heartbeats)
+        for change in self.staleness.tick(now):
+            self._dirty.add(change.device_id)
+            self.groups.set_online(change.device_id, change.online)
+            if self.on_status_change is not None:
+                self.on_status_change(change)
+
+    def _refresh_view(self, now):
+        """
+        Recompute the cached records of devices that received heartbeats or
+        changed status since the last refresh, plus devices whose record the
+        moving window may have changed by now (see _next_change); every other
+        record is kept. Returns the IDs of the devices whose record changed,
+        or None when every record may have.
+        """
+        settings = (self.heartbeat_interval, self.uptime_window, self.uptime_engine, self.missed_heartbeats)
+        tick = int(now // self.heartbeat_interval)
+        dirty, self._dirty = self._dirty, set()
+        rebuild = settings != self._view_settings
+        if rebuild:
+            self._wakeups.clear()
+            self._wake_at.clear()
+            self._reporting.clear()
+            self._rows.clear()
+            self._outage_cells_by_id.clear()
+            stale = set(self.devices)
+        else:
+            stale = dirty | self._due(now)
+            if tick != self._view_tick:
+                stale |= self._reporting
+                self._reporting = set()
+        self._view_settings, self._view_tick = settings, tick
+        if self.uptime_engine == "vectorized":
+            return self._refresh_fleet(now, stale, rebuild)
+
+        records = []
+        for device_id in stale:
+            row = self.generate_view_row(device_id, now=now)
+            self._rows[device_id] = row
+            records.append(row.to_record())
+            device = self.devices[device_id]
+            if device_id in dirty and (device.last_seen_epoch() or 0) >= now - self.heartbeat_interval:
+                # Likely to report again: look at it next tick, and work out when its record changes once it is silent
+                self._reporting.add(device_id)
+            else:
+                self._schedule(device_id, self._next_change(device_id, device, now), now)
+        if rebuild:
+            self._view.rebuild(records)
+            return None
+        return frozenset(record['device_id'] for record in records if self._view.update(record))
+
+    def _refresh_fleet(self, now, stale, rebuild):
+        """
+        _refresh_view for the vectorized engine: every uptime is computed in
+        one pass, but records are only rebuilt for rows whose uptime moved,
+        new rows and the stale devices, and updated in the ViewIndex one by one.
+        """
+        for device_id in stale:
+            self._outage_cells_by_id[device_id] = self._outage_cells(device_id, now)
+            self._schedule(device_id, self._outage_expires(device_id, self.devices[device_id], now), now)
+        fleet = self._fleet_arrays(now)
+        uptimes = fleet.uptimes(now)
+        previous = self._fleet_uptimes
+        if fleet is not self._view_fleet:
+            rebuild = True  # rows are numbered afresh
+        if rebuild:
+            rows = range(len(fleet.device_ids))
+        else:
+            rows = set(np.flatnonzero(uptimes[:len(previous)] != previous).tolist())
+            rows.update(range(len(previous), len(uptimes)))
+            rows.update(fleet.rows[device_id] for device_id in stale if device_id in fleet.rows)
+            rows = sorted(rows)
+        self._view_fleet, self._fleet_uptimes = fleet, uptimes
+        cells = self._outage_cells_by_id
+        records = fleet.records_for(rows, uptimes, self.staleness.offline, self.groups.name_of,
+                                    lambda device_id: cells.get(device_id, ("", 0)))
+        if rebuild:
+            self._view.rebuild(records)
+            return None
+        return frozenset(record['device_id'] for record in records if self._view.update(record))
+
+    def _schedule(self, device_id, epoch, now):
+        """
+        Wake a device's record up for a recompute at `epoch`, at the earliest
+        in the next tick: like every record, it is kept for the rest of the
+        tick it was computed in. A wake-up due earlier is kept.
+        """
+        if epoch is None:
+            return
+        epoch = max(epoch, (now // self.heartbeat_interval + 1) * self.heartbeat_interval)
+        scheduled = self._wake_at.get(device_id)
+        if scheduled is None or epoch < scheduled:
+            self._wake_at[device_id] = epoch
+            heapq.heappush(self._wakeups, (epoch, device_id))
+
+    def _due(self, now):
+        """Devices whose wake-up is due by `now`."""
+        due = set()
+        while self._wakeups and self._wakeups[0][0] <= now:
+            epoch, device_id = heapq.heappop(self._wakeups)
+            if self._wake_at.get(device_id) == epoch:
+                del self._wake_at[device_id]
+                due.add(device_id)
+        return due
+
+    def _next_change(self, device_id, device, now):
+        """
+        Earliest epoch by which a device's record may change without a
+        heartbeat (heartbeats and status changes make it dirty anyway), or
+        None: when its oldest outage leaves the window, or its uptime drops.
+        """
+        changes = [self._outage_expires(device_id, device, now)]
+        if self.uptime_engine == "index":
+            changes.append(self._uptime_drops_at(device, now))
+        elif (device.last_seen_epoch() or 0) >= now - self.uptime_window:
+            changes.append(now)  # the count and slot engines recompute every tick while the device has data in the window
+        changes = [change for change in changes if change is not None]
+        return min(changes) if changes else None
+
+    def _uptime_drops_at(self, device, now):
+        """
+        When the index engine's uptime of a device that stays silent next
+        drops, or None if it cannot. As the window's start moves past the
+        heartbeats it counts, the percentage falls once enough of them have
+        left, found with count_drops_after; a device younger than the window
+        drops as its expected heartbeats grow instead.
+        """
+        last_seen = device.last_seen_epoch()
+        if last_seen is None:
+            return None
+        now = max(now, int(last_seen) + 1)  # a device whose clock runs ahead is measured up to its latest heartbeat
+        interval, window = self.heartbeat_interval, self.uptime_window
+        first_slot = device.first_seen_epoch - device.first_seen_epoch % interval
+        start = max(now - window, first_slot)
+        expected = (now - start) / interval
+        received = device.count_between(start, now)
+        uptime = _percentage(received, expected)
+        if uptime == 0:
+            return None
+        if start == first_slot:
+            return min(first_slot + interval * received * 100 / (uptime - 1e-9), first_slot + window)
+        drop = max(int(received - (uptime - 1e-9) * expected / 100) + 1, 1)
+        while drop > 1 and _percentage(received - drop + 1, expected) < uptime:
+            drop -= 1
+        while drop < received and _percentage(received - drop, expected) >= uptime:
+            drop += 1
+        moved_past = device.count_drops_after(start, drop)
+        if moved_past is None:
+            return now  # prorated rollups: recompute every tick
+        return math.nextafter(moved_past + window, math.inf)  # the start has to pass it
+
+    def _fleet_arrays(self, now):
+        """FleetArrays for the current settings, seeded from each device's rollups when (re)built."""
+        fleet = self.fleet
+        if fleet is not None and (fleet.heartbeat_interval, fleet.uptime_window) == (self.heartbeat_interval, self.uptime_window):
+            return fleet
 
-    def heartbeats_for_device(self, device_id):
+        resolution = None
+        fleet = None
+        for device_id, device in self.devices.items():
+            if fleet is None:
+                resolution = FleetArrays.column_resolution(self.uptime_window, device.resolution_for(self.uptime_window))
+                fleet = FleetArrays(self.heartbeat_interval, self.uptime_window, resolution, capacity=max(len(self.devices), 1))
+                fleet.advance(int(now // resolution))
+            start_column = fleet.head - fleet.columns + 1
+            fleet.seed(device_id, device.first_seen_epoch, device.last_seen_epoch(), start_column,
+                       device.histogram(start_column * resolution, resolution, fleet.columns))
+        if fleet is None:
+            resolution = FleetArrays.column_resolution(self.uptime_window, self.heartbeat_interval)
+            fleet = FleetArrays(self.heartbeat_interval, self.uptime_window, resolution)
+        self.fleet = fleet
+        return fleet
+
+    def _restore_staleness(self):
+        """Offline detection for devices the storage backend already held, e.g. a reopened SQLite database."""
+        for device_id, device in self.devices.items():
+            last_seen = device.last_seen_epoch()
+            if last_seen is not None:
+                self.staleness.touch(device_id, last_seen)
+
+    def _group_index(self, now):
+        """
+        GroupIndex for the current settings, recounted from each device's
+        rollups when they changed, or when the storage backend held devices
+        this dashboard has not counted yet.
+        """
+        groups = self.groups
+        if self._groups_restored and \
+                (groups.heartbeat_interval, groups.uptime_window) == (self.heartbeat_interval, self.uptime_window):
+            return groups
+
+        groups = GroupIndex(self.heartbeat_interval, self.uptime_window)
+        groups.advance(now)
+        column = groups.column
+        start_column = int((now - self.uptime_window) // column) + 1
+        columns = int(now // column) - start_column + 1
+        slots_per_column = max(column // self.heartbeat_interval, 1)
+        for device_id, device in self.devices.items():
+            if device.first_seen_epoch is None:
+                continue
+            groups.add_device(device_id, device.group or (), device.first_seen_epoch,
+                              device.last_seen_epoch(), self.staleness.is_online(device_id))
+            counts = device.histogram(start_column * column, column, columns)
+            for offset, count in enumerate(counts):
+                if count:
+                    groups.count_column(device_id, start_column + offset, min(int(count), slots_per_column))
+        self.groups = groups
+        self._groups_restored = True
+        return groups
+
+    def uptime(self, device_id, start, end):
+        """
+        Uptime percentage of a device between start and end.
+
+        start and end are datetimes or epoch seconds. The answer costs
+        O(log n) for any window, so the window and the "as of" time can
+        be moved freely.
+        """
+        start, end = _epoch(start), _epoch(end)
+        expected_heartbeats = (end - start) / self.heartbeat_interval
+        device = self.devices.get(device_id)
+        if device is None or expected_heartbeats <= 0:
+            return 0
+        received = device.count_between(start, end)
+        return _percentage(received, expected_heartbeats)
+
+    def outage_report(self, device_id, start, end):
+        """
+        A device's outages overlapping [start, end) (datetimes or epoch
+        seconds) as (start, end) epoch pairs, gaps of more than the offline
+        timeout between two heartbeats, with the downtime, mean time to repair
+        and mean time between failures in seconds (None without outages).
+        Found with binary searches in the device's OutageIndex.
+        """
+        start, end = _epoch(start), _epoch(end)
+        outages = self._reader_outages(device_id)
+        if outages is None:
+            return None
+        return {'outages': outages.between(start, end), 'downtime': outages.downtime(start, end),
+                'mttr': outages.mttr(start, end), 'mtbf': outages.mtbf(start, end)}
+
+    def _device_outages(self, device_id, device, now=None):
+        """Start of the latest outage and the outages in the window; an offline device is in one until it reports."""
+        outages = self._outage_index(device_id, device)
+        end = self._as_of(device, now)
+        count = outages.count(end - self.uptime_window, end)
+        latest = outages.latest()
+        start = latest[0] if latest else None
+        if device_id in self.staleness.offline:
+            count += 1
+            start = device.last_seen_epoch()
+        return {'outages': count,
+                'last_outage': datetime.fromtimestamp(start, tz=timezone.utc) if start is not None else None}
+
+    def _outage_cells(self, device_id, now):
+        outages = self._device_outages(device_id, self.devices[device_id], now)
+        last_outage = outages['last_outage']
+        return last_outage.strftime(LAST_SEEN_FORMAT) if last_outage else "", outages['outages']
+
+    def _outage_expires(self, device_id, device, now):
+        """When the oldest outage in the window leaves it, the only way the outage count drops, or None."""
+        oldest_end = self._outage_index(device_id, device).next_end(self._as_of(device, now) - self.uptime_window)
+        return oldest_end + self.uptime_window if oldest_end is not None else None
+
+    def _outage_index(self, device_id, device):
+        """Writer side: the device's OutageIndex, with a frozen copy kept up to date for the next snapshot."""
+        outages = device.outages(self.heartbeat_interval * self.missed_heartbeats)
+        published = self._outage_views.get(device_id)
+        if published is None or (published.version, published.timeout, published.first, published.last) != \
+                (outages.version, outages.timeout, outages.first, outages.last):
+            self._outage_views[device_id] = outages.freeze(published)
+        return outages
+
+    def _reader_outages(self, device_id):
+        # Readers on other threads use the published frozen copies, never the device's own OutageIndex
+        if self.background_publishing:
+            return self._snapshot.outages.get(device_id)
         device = self.devices.get(device_id)
-        return device.get_heartbeats() if device else []
+        return self._outage_index(device_id, device) if device is not None else None
+
+    def _as_of(self, device, now=None):
+        # A device whose clock runs ahead is measured up to its own latest heartbeat
+        if now is None:
+            now = datetime.now(tz=timezone.utc).timestamp()
+        return max(now, device.last_seen_epoch() or now)
+
+    def _device_uptime(self, device, uptime_engine, now=None):
+        if uptime_engine in ("index", "vectorized"):
+            if now is None:
+                now = datetime.now(tz=timezone.utc).timestamp()
+            end = max(now, int(device.last_seen_epoch()) + 1)
+            # Devices are not expected to report before their first heartbeat
+            first_slot = device.first_seen_epoch - device.first_seen_epoch % self.heartbeat_interval
+            return self.uptime(device.device_id, max(end - self.uptime_window, first_slot), end)
+        if uptime_engine == "count":
+            return device.calculate_uptime(self.heartbeat_interval, self.uptime_window)
+        if uptime_engine == "slots":
+            as_of = datetime.fromtimestamp(self._as_of(device, now), tz=timezone.utc)
+            return device.calculate_slot_uptime(self.heartbeat_interval, self.uptime_window, as_of)
+        raise ValueError(f"Unknown uptime engine {uptime_engine}, expected one of {UPTIME_ENGINES}")
+
+    @VIEW_FRAME_SECONDS.timed
+    def generateViewFrame(self):
+        import pandas as pd  # only needed here; view_records() is the pandas-free path
+
+        snapshot = self.snapshot()
+        if snapshot.rows is not None:
+            return pd.DataFrame(list(snapshot.rows))
+        frame = pd.DataFrame(list(snapshot.records))
+        if not frame.empty:
+            frame['last_seen'] = pd.to_datetime(frame['last_seen'], format=LAST_SEEN_FORMAT, utc=True)
+        return frame
+
+    def storage_stats(self):
+        """Device count, raw heartbeats stored and estimated bytes of their stores and indexes."""
+        devices = list(self._reader_devices().values())
+        stats = {'devices': len(devices), **self.devices.stats(devices)}
+        stats['store_bytes'] += self.fleet.nbytes if self.fleet is not None else 0
+        return stats
+
+    def heartbeats_for_device(self, device_id, start=None, end=None, limit=None, cursor=None):
+        """
+        A HeartbeatPage of the device's raw heartbeats in [start, end) (datetimes
+        or epoch seconds), oldest first, found by binary search and returned
+        as a view rather than a copy. With `limit`, pass the page's next_cursor
+        back to read the following page. In memory, raw heartbeats are kept for
+        raw_window; SQLiteStorage keeps them for the retention period.
+        """
+        device = self._reader_devices().get(device_id)
+        if device is None:
+            return HeartbeatPage(device_id)
+        return device.heartbeat_page(_epoch(start), _epoch(end), limit, cursor)
+
+    def heartbeat_timeline(self, device_id, start, end, buckets=DEFAULT_TIMELINE_BUCKETS):
+        """
+        Heartbeat counts per bucket over [start, end), read from the rollup
+        tiers, so it covers the whole retention period at the cost of at most
+        `buckets` counts. Returns (first bucket start, bucket seconds, counts);
+        the first bucket starts at or before `start`.
+        """
+        start, end = _epoch(start), _epoch(end)
+        device = self._reader_devices().get(device_id)
+        window = max(int(end - start), 1)
+        tier_resolution = device.resolution_for(window) if device else self.heartbeat_interval
+        resolution = FleetArrays.column_resolution(window, tier_resolution, buckets)
+        first = int(start // resolution) * resolution
+        columns = -(-int(end - first) // resolution)
+        if device is None:
+            return first, resolution, [0] * columns
+        return first, resolution, device.histogram(first, resolution, columns)
+
+    def _reader_devices(self):
+        # Readers on other threads use the published devices while the ingest worker adds new ones
+        return self._snapshot.devices if self.background_publishing else self.devices
+
+
+def _percentage(received, expected):
+    return int(min(received / expected, 1) * 100 + 1e-9)  # rollups may prorate
+
+
+def _epoch(moment):
+    return moment.timestamp() if isinstance(moment, datetime) else moment
+
+
+def _group_by_device(device_ids, epochs):
+    """(device_id, ascending epochs) for every device in parallel columns."""
+    if np is None:
+        grouped = {}
+        for device_id, epoch in zip(device_ids, epochs):
+            grouped.setdefault(device_id, []).append(int(epoch))
+        return [(device_id, sorted(device_epochs)) for device_id, device_epochs in grouped.items()]
+
+    # Number the devices in a dict (cheaper than sorting strings), then sort by number and epoch
+    numbers = {}
+    if isinstance(device_ids, np.ndarray):
+        device_ids = device_ids.tolist()
+    codes = np.fromiter((numbers.setdefault(device_id, len(numbers)) for device_id in device_ids),
+                        dtype=np.int64, count=len(device_ids))
+    epochs = np.asarray(epochs).astype(np.int64)
+    order = np.lexsort((epochs, codes))
+    codes, epochs = codes[order], epochs[order]
+    starts = np.flatnonzero(np.diff(codes, prepend=-1))
+    stops = np.append(starts[1:], len(codes))
+    names = list(numbers)
+    return [(names[code], epochs[start:stop]) for code, start, stop in zip(codes[starts].tolist(), starts, stops)]
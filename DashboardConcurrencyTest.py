@@ -0,0 +1,77 @@
+import json
+import threading
+import time
+import unittest
+
+from assertpy import assert_that
+
+from Dashboard import DashBoard
+from ingest_pipeline import IngestPipeline
+
+START = 1_700_000_000
+
+
+def payload(device_id, timestamp):
+    return json.dumps({"device_id": device_id, "timestamp": timestamp}).encode()
+
+
+class DashboardConcurrencyTest(unittest.TestCase):
+    def test_readers_run_concurrently_with_ingest(self):
+        dashboard = DashBoard(heartbeat_interval=10, uptime_window=600, raw_window=600)
+        pipeline = IngestPipeline(dashboard, batch_size=200, flush_interval=0.005, max_queue=100_000,
+                                  full_policy="block", snapshot_interval=0.001)
+        errors = []
+        versions = []
+        stop_reading = threading.Event()
+
+        def read():
+            try:
+                while not stop_reading.is_set():
+                    snapshot = dashboard.snapshot()
+                    versions.append(snapshot.version)
+                    assert_that(snapshot.records).is_length(len(snapshot.devices))
+                    dashboard.view_records()
+                    for device_id in list(snapshot.devices)[:5]:
+                        heartbeats = dashboard.heartbeats_for_device(device_id)
+                        assert_that(all(hb.device_id == device_id for hb in heartbeats)).is_true()
+                    dashboard.generateViewFrame()
+            except Exception as error:  # surfaced in the main thread below
+                errors.append(error)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        pipeline.start()
+        for reader in readers:
+            reader.start()
+        # Long enough to push every device's raw store through several trims
+        for step in range(300):
+            for device in range(20):
+                pipeline.submit(payload(f"device_{device}", START + 10 * step))
+        deadline = time.monotonic() + 10
+        while pipeline.backlog() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stop_reading.set()
+        for reader in readers:
+            reader.join()
+        pipeline.stop()
+
+        assert_that(errors).is_empty()
+        assert_that(pipeline.stats.parsed).is_equal_to(6000)
+        assert_that(max(versions)).is_greater_than(1)
+        assert_that(dashboard.view_records()).is_length(20)
+        assert_that(dashboard.heartbeats_for_device("device_0")[-1].timestamp.timestamp()).is_equal_to(START + 2990)
+
+    def test_snapshots_are_immutable_and_versioned(self):
+        dashboard = DashBoard()
+        dashboard.addHeartBeats([])
+        first = dashboard.publish_snapshot(now=START)
+        pipeline = IngestPipeline(dashboard, flush_interval=0.01)
+        pipeline.apply([payload("a", START)])
+
+        assert_that(dashboard.snapshot().version).is_greater_than(first.version)
+        assert_that(first.records).is_empty()
+        with self.assertRaises(AttributeError):
+            first.version = 10
+
+
+if __name__ == '__main__':
+    unittest.main()
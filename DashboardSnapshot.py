@@ -0,0 +1,48 @@
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Collection, Mapping, Optional
+
+RECENT_CHANGES = 32  # versions whose changed device IDs a snapshot remembers
+
+
+@dataclass(frozen=True)
+class DashboardSnapshot:
+    """
+    Immutable view of the dashboard. The ingest worker publishes a new one at
+    batch boundaries; Dash callbacks read the latest without taking any lock.
+    Records and rows are never mutated once published. Consecutive snapshots
+    share the chunks of records, orders and rows that did not change between
+    them (see ViewIndex), so publishing costs about the same at any fleet size.
+    """
+    version: int = 0
+    published_at: float = 0.0
+    records: Collection = ()  # formatted table records, the values of records_by_id
+    rows: Optional[Collection] = ()  # DeviceDashboardViewRow per device, None for the vectorized engine
+    devices: Mapping = field(default_factory=lambda: MappingProxyType({}))  # device_id -> Device
+    settings: tuple = ()  # (heartbeat_interval, uptime_window) the records were computed with
+    records_by_id: Mapping = field(default_factory=lambda: MappingProxyType({}))  # device_id -> record
+    orders: Mapping = field(default_factory=lambda: MappingProxyType({}))  # column -> sorted (value, device_id) keys, see ViewIndex
+    changes: tuple = ()  # (version, frozenset of changed device_ids, or None for all) of recent versions
+    groups: tuple = ()  # health record per group of devices, see GroupIndex.records
+    outages: Mapping = field(default_factory=lambda: MappingProxyType({}))  # device_id -> frozen OutageIndex
+
+    def recent_changes(self, version, changed):
+        """Change log for the snapshot that follows this one as `version`."""
+        return (self.changes + ((version, changed),))[-RECENT_CHANGES:]
+
+    def changed_since(self, version):
+        """
+        IDs of the devices whose records changed after `version`, or None
+        when that is not known (too old, or every record may have changed).
+        """
+        if version >= self.version:
+            return frozenset()
+        if not self.changes or self.changes[0][0] > version + 1:
+            return None
+        changed = set()
+        for change_version, device_ids in self.changes:
+            if change_version > version:
+                if device_ids is None:
+                    return None
+                changed |= device_ids
+        return changed
@@ -1,12 +1,17 @@
+import os
+import tempfile
 import unittest
 from datetime import datetime, timezone, timedelta
 
 import pandas as pd
 from assertpy import assert_that
 
+from ChunkedMap import CHUNK_SIZE
 from Dashboard import DashBoard
 from DeviceDashboardViewRow import DeviceDashboardViewRow
 from Heartbeat import HeartBeat
+from SortedBlocks import BLOCK_SIZE
+from SQLiteStorage import SQLiteStorage
 
 initial_timestamp = datetime.now()
 
@@ -60,6 +65,9 @@ THE_DEAD_FRAME = pd.DataFrame(data)
 
 
 class MyTestCase(unittest.TestCase):
+    def dashboard(self, **settings):
+        return DashBoard(**settings)
+
     def test_last_seen_defaults_to_beginning_of_time(self):
         device = DeviceDashboardViewRow(' ')
         assert_that(device.last_seen).is_equal_to(datetime.fromtimestamp(0, tz=timezone.utc))  # add assertion here
@@ -70,7 +78,7 @@ class MyTestCase(unittest.TestCase):
         assert_that(device.last_seen).is_equal_to(nownow)
 
     def test_generate_view_frame_with_perfect_uptime(self):
-        dash = DashBoard(heartbeat_interval=10, uptime_window=40)
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=40)
         now = datetime.now(tz=timezone.utc)
         heartbeat = HeartBeat(device_id="Patrick", timestamp=now)
         dash.addHeartBeat(heartbeat)
@@ -90,7 +98,7 @@ class MyTestCase(unittest.TestCase):
         assert_that(record['last_seen'].timestamp()).is_close_to(last_heartbeat.timestamp.timestamp(), tolerance=1)
 
     def test_dashboard_view_generation(self):
-        dash = DashBoard(heartbeat_interval=10, uptime_window=40)
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=40)
         
         # Add heartbeats for two different devices
         now = datetime.now(tz=timezone.utc)
@@ -105,6 +113,411 @@ class MyTestCase(unittest.TestCase):
         devices = {row['device_id'] for row in frame}
         assert_that(devices).contains('Device1', 'Device2')
 
+    def test_slot_engine_does_not_count_replayed_heartbeats(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=40, uptime_engine="slots")
+        heartbeat = HeartBeat(device_id="Patrick", timestamp=datetime.now(tz=timezone.utc))
+        for _ in range(3):
+            dash.addHeartBeat(heartbeat)
+            dash.addHeartBeat(heartbeat.next())
+
+        assert_that(dash.generate_view_row("Patrick").uptime).is_equal_to(50)
+        assert_that(dash.generate_view_row("Patrick", uptime_engine="count").uptime).is_equal_to(150)
+
+    def test_unknown_uptime_engine_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.dashboard(uptime_engine="abacus")
+
+    def test_uptime_over_an_arbitrary_window(self):
+        dash = self.dashboard(heartbeat_interval=10)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in range(0, 1800, 10):
+            dash.addHeartBeat(HeartBeat("Patrick", start + timedelta(seconds=offset)))
+
+        assert_that(dash.uptime("Patrick", start, start + timedelta(hours=1))).is_equal_to(50)
+        assert_that(dash.uptime("Patrick", start, start + timedelta(minutes=30))).is_equal_to(100)
+        assert_that(dash.uptime("Patrick", start.timestamp() + 1800, start.timestamp() + 3600)).is_equal_to(0)
+        assert_that(dash.uptime("Nobody", start, start + timedelta(hours=1))).is_equal_to(0)
+
+    def test_view_records_are_formatted(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=40)
+        last_seen = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+        dash.addHeartBeat(HeartBeat("Patrick", last_seen))
+
+        records = dash.view_records(now=last_seen.timestamp())
+
+        assert_that(records).is_equal_to([{'device_id': 'Patrick', 'last_seen': '2024-01-01 12:00:00 UTC', 'uptime': 100,
+                                             'status': 'online', 'group': '', 'last_outage': '', 'outages': 0}])
+
+    def test_view_records_only_recompute_changed_devices(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=40)
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        dash.addHeartBeat(HeartBeat("Quiet", now - timedelta(hours=1)))
+        dash.addHeartBeat(HeartBeat("Busy", now))
+        dash.view_records(now=now.timestamp())
+
+        recomputed = []
+        generate_view_row = dash.generate_view_row
+        dash.generate_view_row = lambda device_id, **kwargs: recomputed.append(device_id) or generate_view_row(device_id, **kwargs)
+
+        dash.view_records(now=now.timestamp() + 1)
+        assert_that(recomputed).is_empty()
+
+        dash.addHeartBeat(HeartBeat("Busy", now + timedelta(seconds=10)))
+        records = dash.view_records(now=now.timestamp() + 10)
+        assert_that(recomputed).is_equal_to(["Busy"])
+        assert_that(records).is_length(2)
+
+    def test_view_records_recompute_when_the_window_moves_past_heartbeats(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=40)
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        dash.addHeartBeat(HeartBeat("Patrick", now))
+        assert_that(dash.view_records(now=now.timestamp())[0]['uptime']).is_equal_to(100)
+
+        assert_that(dash.view_records(now=now.timestamp() + 60)[0]['uptime']).is_equal_to(0)
+
+    def test_view_records_rebuild_after_settings_change(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=40)
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        dash.addHeartBeat(HeartBeat("Patrick", now - timedelta(seconds=60)))
+        dash.addHeartBeat(HeartBeat("Patrick", now))
+        assert_that(dash.view_records(now=now.timestamp())[0]['uptime']).is_equal_to(25)
+
+        dash.uptime_window = 20
+        assert_that(dash.view_records(now=now.timestamp())[0]['uptime']).is_equal_to(50)
+
+    def test_new_device_is_not_penalized_before_its_first_heartbeat(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=3600)
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in range(0, 600, 10):
+            dash.addHeartBeat(HeartBeat("Newcomer", now + timedelta(seconds=offset)))
+
+        assert_that(dash.view_records(now=now.timestamp() + 600)[0]['uptime']).is_equal_to(100)
+
+    def test_vectorized_engine_matches_the_index_engine(self):
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        dashboards = [self.dashboard(heartbeat_interval=10, uptime_window=3600, uptime_engine=engine)
+                      for engine in ("index", "vectorized")]
+        dashboards[1].view_records(now=now.timestamp())  # build the fleet arrays before ingest
+        for dash in dashboards:
+            for offset in range(-7200, 0, 10):
+                moment = now + timedelta(seconds=offset)
+                dash.addHeartBeat(HeartBeat("Healthy", moment))
+                if offset % 20 == 0:
+                    dash.addHeartBeat(HeartBeat("Flaky", moment))
+                if offset < -3000:
+                    dash.addHeartBeat(HeartBeat("Gone", moment))
+
+        index, vectorized = (sorted(dash.view_records(now=now.timestamp()), key=lambda r: r['device_id']) for dash in dashboards)
+        assert_that([r['uptime'] for r in vectorized]).is_equal_to([r['uptime'] for r in index])
+        assert_that([r['last_seen'] for r in vectorized]).is_equal_to([r['last_seen'] for r in index])
+
+    def test_a_device_that_missed_nothing_reads_100_on_every_window(self):
+        start = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()) + 7  # off the bucket boundaries
+        epochs = list(range(start, start + 31 * 86400, 60))
+        for engine in ("index", "vectorized"):
+            dash = self.dashboard(heartbeat_interval=60, uptime_engine=engine)
+            dash.bulk_load(["Patrick"] * len(epochs), epochs)
+            for window in (3600, 86400, 604800, 1209600, 2592000):  # app.TIME_WINDOWS
+                dash.uptime_window = window
+                for offset in (0.5, 25, 59.5):  # before the next heartbeat is due
+                    record = dash.view_records(now=epochs[-1] + offset)[0]
+                    assert_that(record['uptime']).described_as(f"{engine} {window} {offset}").is_equal_to(100)
+
+    def test_engines_agree_on_a_window_longer_than_the_raw_heartbeats(self):
+        start = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+        # Every other heartbeat for the first half of the day, every one after that
+        epochs = [epoch for epoch in range(start, start + 86400, 10)
+                  if epoch - start >= 43200 or (epoch - start) % 20 == 0]
+        uptimes = {}
+        for engine in ("index", "count", "slots", "vectorized"):
+            dash = self.dashboard(heartbeat_interval=10, uptime_window=86400, uptime_engine=engine, raw_window=3600)
+            dash.bulk_load(["Patrick"] * len(epochs), epochs)
+            uptimes[engine] = dash.view_records(now=epochs[-1] + 5)[0]['uptime']
+
+        assert_that(uptimes).is_equal_to({"index": 75, "count": 75, "slots": 75, "vectorized": 75})
+
+    def test_vectorized_engine_seeds_from_existing_history(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=86400)
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in range(-2 * 86400, 0, 20):
+            dash.addHeartBeat(HeartBeat("Patrick", now + timedelta(seconds=offset)))
+        expected = dash.view_records(now=now.timestamp())[0]['uptime']
+
+        dash.uptime_engine = "vectorized"
+        assert_that(dash.view_records(now=now.timestamp())[0]['uptime']).is_close_to(expected, tolerance=1)
+
+    def test_bulk_load_matches_adding_heartbeats(self):
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+        columns = [(device_id, int(now) + offset) for offset in range(-3 * 86400, 0, 10)
+                   for device_id in ("Healthy", "Flaky") if device_id == "Healthy" or offset % 30]
+        columns.reverse()  # bulk_load sorts each device's epochs itself
+        added, loaded = self.dashboard(), self.dashboard()
+        for device_id, epoch in sorted(columns, key=lambda column: column[1]):
+            added.addHeartBeat(HeartBeat(device_id, datetime.fromtimestamp(epoch, tz=timezone.utc)))
+
+        device_ids, epochs = zip(*columns)
+        assert_that(loaded.bulk_load(device_ids, epochs)).is_equal_to(len(columns))
+
+        for window in (3600, 86400):
+            for device_id in ("Healthy", "Flaky"):
+                assert_that(loaded.uptime(device_id, now - window, now)).is_equal_to(added.uptime(device_id, now - window, now))
+        by_device = lambda record: record['device_id']
+        assert_that(sorted(loaded.view_records(now=now), key=by_device)).is_equal_to(
+            sorted(added.view_records(now=now), key=by_device))
+
+    def test_bulk_load_accepts_batches_on_top_of_existing_history(self):
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+        dash = self.dashboard()
+        dash.addHeartBeat(HeartBeat("Patrick", datetime.fromtimestamp(now - 7200, tz=timezone.utc)))
+        batches = ((["Patrick"] * 180, range(int(now) - start, int(now) - start + 1800, 10)) for start in (3600, 1800))
+
+        assert_that(dash.bulk_load(batches)).is_equal_to(360)
+        assert_that(dash.uptime("Patrick", now - 3600, now)).is_equal_to(100)
+        assert_that(dash.devices["Patrick"].first_seen_epoch).is_equal_to(now - 7200)
+        assert_that(dash.devices["Patrick"].last_seen_epoch()).is_equal_to(now - 10)
+
+    def test_view_page_sorts_the_whole_fleet(self):
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=600)
+        for device in range(30):
+            epochs = range(int(now) - 600, int(now), 10 * (1 + device % 3))
+            dash.bulk_load([f"device_{device:02d}"] * len(epochs), epochs)
+
+        worst, total = dash.view_page(0, 5, [{'column_id': 'uptime', 'direction': 'asc'}], now=now)
+        assert_that(total).is_equal_to(30)
+        assert_that([r['uptime'] for r in worst]).is_equal_to([33] * 5)
+        assert_that(dash.view_page(0, 50, None, "{uptime} = 100", now=now)[1]).is_equal_to(10)
+
+    def test_a_moving_window_only_recomputes_records_that_change(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=3600)
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+        epochs = range(int(now) - 3600, int(now), 10)
+        dash.bulk_load(["Patrick"] * len(epochs), epochs)
+        dash.view_records(now=now)
+        dash.view_records(now=now + 10)  # it had just reported, so it is looked at once more
+
+        recomputed = []
+        generate_view_row = dash.generate_view_row
+        dash.generate_view_row = lambda device_id, **kwargs: recomputed.append(device_id) or generate_view_row(device_id, **kwargs)
+        records = [dash.view_records(now=now + tick * 10)[0] for tick in range(2, 38)]
+
+        changes = sum(1 for before, after in zip(records, records[1:]) if before != after)
+        assert_that(changes).is_greater_than(5)
+        assert_that(len(recomputed)).is_less_than_or_equal_to(changes + 1)
+        assert_that(records[-1]).is_equal_to(generate_view_row("Patrick", now=now + 370).to_record())
+
+    def test_publishing_one_change_copies_as_much_at_any_fleet_size(self):
+        def copied(old, new):
+            return sum(len(chunk) for chunk in new if not any(chunk is kept for kept in old))
+
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for fleet_size in (2000, 8000):
+            dash = self.dashboard(heartbeat_interval=10, uptime_window=600)
+            dash.bulk_load([f"device_{device:05d}" for device in range(fleet_size)], [now.timestamp()] * fleet_size)
+            first = dash.snapshot(now.timestamp() + 1)
+            dash.addHeartBeat(HeartBeat("device_00042", now + timedelta(seconds=5)))
+            second = dash.snapshot(now.timestamp() + 6)
+
+            assert_that(second.changed_since(first.version)).is_equal_to({"device_00042"})
+            assert_that(list(second.records)).is_length(fleet_size)
+            # The record's chunk, and the one or two blocks of each order it left and joined
+            assert_that(copied(first.records_by_id._chunks, second.records_by_id._chunks)) \
+                .is_less_than_or_equal_to(CHUNK_SIZE)
+            for column in second.orders:
+                assert_that(copied(first.orders[column]._blocks, second.orders[column]._blocks)) \
+                    .is_less_than_or_equal_to(4 * BLOCK_SIZE)
+
+    def test_vectorized_publish_only_updates_changed_records(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=600, uptime_engine="vectorized")
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        dash.addHeartBeat(HeartBeat("Gone", now - timedelta(hours=1)))
+        dash.addHeartBeat(HeartBeat("Busy", now))
+        first = dash.snapshot(now.timestamp())
+
+        dash.addHeartBeat(HeartBeat("Busy", now + timedelta(seconds=5)))
+        second = dash.snapshot(now.timestamp() + 5)
+
+        assert_that(second.changed_since(first.version)).is_equal_to({"Busy"})
+        assert_that(second.records_by_id["Busy"]['last_seen']).is_equal_to('2024-01-01 00:00:05 UTC')
+
+    def test_page_delta_sends_only_changed_rows(self):
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=600)
+        for device in range(10):
+            epochs = range(int(now) - 600, int(now), 10)
+            dash.bulk_load([f"device_{device:02d}"] * len(epochs), epochs)
+
+        first, _ = dash.page_delta(0, (), 0, 5, now=now)
+        assert_that(first['rows']).is_length(5)
+        assert_that(dash.snapshot(now).version).is_equal_to(first['version'])  # nothing changed
+
+        dash.addHeartBeat(HeartBeat("device_03", datetime.fromtimestamp(now + 1, tz=timezone.utc)))
+        delta, total = dash.page_delta(first['version'], first['ids'], 0, 5, now=now + 1)
+        assert_that(delta['version']).is_greater_than(first['version'])
+        assert_that(delta['ids']).is_equal_to(first['ids'])
+        assert_that(list(delta['rows'])).is_equal_to(["device_03"])
+        assert_that(total).is_equal_to(10)
+
+    def test_missed_heartbeats_raise_status_changes(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=600, missed_heartbeats=3)
+        changes = []
+        dash.on_status_change = changes.append
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        dash.addHeartBeat(HeartBeat("Patrick", start))
+        dash.addHeartBeat(HeartBeat("Quiet", start - timedelta(seconds=25)))
+
+        records = dash.view_records(now=start.timestamp() + 10)
+        assert_that({r['device_id']: r['status'] for r in records}).is_equal_to({"Patrick": "online", "Quiet": "offline"})
+        assert_that(changes).is_length(1)
+
+        dash.addHeartBeat(HeartBeat("Quiet", start + timedelta(seconds=20)))
+        records = dash.view_records(now=start.timestamp() + 30)
+        assert_that({r['device_id']: r['status'] for r in records}).is_equal_to({"Patrick": "offline", "Quiet": "online"})
+        assert_that([(c.device_id, c.online) for c in changes]).is_equal_to(
+            [("Quiet", False), ("Quiet", True), ("Patrick", False)])
+
+    def test_heartbeats_for_device_pages_through_a_time_range(self):
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        dash = self.dashboard()
+        dash.bulk_load(["Patrick"] * 60, [int(start.timestamp()) + 10 * (i // 2) for i in range(60)])  # every epoch twice
+
+        pages, cursor = [], None
+        while True:
+            page = dash.heartbeats_for_device("Patrick", start + timedelta(seconds=50), start + timedelta(seconds=250),
+                                              limit=7, cursor=cursor)
+            pages.append([int(epoch) for epoch in page.epochs])
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        epochs = [epoch for page in pages for epoch in page]
+        first = int(start.timestamp())
+        assert_that(epochs).is_equal_to([first + 10 * (i // 2) for i in range(10, 50)])
+        assert_that(pages[0]).is_length(7)
+        assert_that(dash.heartbeats_for_device("Nobody")).is_empty()
+
+    def test_heartbeat_timeline_counts_per_bucket(self):
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+        dash = self.dashboard(heartbeat_interval=10)
+        dash.bulk_load(["Patrick"] * 180, range(int(start), int(start) + 1800, 10))
+
+        first, resolution, counts = dash.heartbeat_timeline("Patrick", start, start + 3600, buckets=12)
+
+        assert_that((first, resolution)).is_equal_to((start, 300))
+        assert_that(counts).is_equal_to([30] * 6 + [0] * 6)
+
+    def test_view_groups_add_up_the_devices_below_them(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=600)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in range(0, 600, 10):
+            dash.addHeartBeat(HeartBeat("Patrick", start + timedelta(seconds=offset), group=("north", "rack1")))
+            if offset < 300:
+                dash.addHeartBeat(HeartBeat("Quiet", start + timedelta(seconds=offset), group=("north", "rack2")))
+        dash.addHeartBeat(HeartBeat("Lone", start + timedelta(seconds=590), group=("south",)))
+
+        groups = {g['group']: g for g in dash.view_groups(now=start.timestamp() + 599)}
+
+        assert_that(list(groups)).is_equal_to(["", "north", "north/rack1", "north/rack2", "south"])
+        assert_that(groups[""]).contains_entry({'devices': 3}, {'online': 2}, {'received': 91})
+        assert_that(groups["north"]).contains_entry({'expected': 120}, {'received': 90}, {'uptime': 75})
+        assert_that(groups["north/rack2"]).contains_entry({'online': 0}, {'uptime': 50})
+        records = dash.view_records(now=start.timestamp() + 599)
+        assert_that({r['device_id']: r['group'] for r in records}).contains_entry({"Patrick": "north/rack1"})
+
+    def test_view_groups_recount_after_settings_change(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=600)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in range(0, 600, 20):
+            dash.addHeartBeat(HeartBeat("Patrick", start + timedelta(seconds=offset), group=("north",)))
+
+        dash.uptime_window = 300
+        north = dash.view_groups(now=start.timestamp() + 599)[1]
+
+        assert_that(north).contains_entry({'group': "north"}, {'expected': 30}, {'received': 15})
+
+    def test_outages_in_the_window_and_the_last_one(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=3600)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+        epochs = [epoch for epoch in range(int(start), int(start) + 3600, 10)
+                  if not 600 <= epoch - start < 900 and not 1800 <= epoch - start < 1900]
+        dash.bulk_load(["Patrick"] * len(epochs), epochs)
+        dash.bulk_load(["Quiet"], [start])
+
+        records = {r['device_id']: r for r in dash.view_records(now=start + 3599)}
+        report = dash.outage_report("Patrick", start, start + 3600)
+
+        assert_that(records["Patrick"]).contains_entry({'outages': 2}, {'last_outage': '2024-01-01 00:29:50 UTC'})
+        assert_that(records["Quiet"]).contains_entry({'outages': 1}, {'last_outage': '2024-01-01 00:00:00 UTC'})
+        assert_that(report['outages']).is_equal_to([(start + 590, start + 900), (start + 1790, start + 1900)])
+        assert_that(report).contains_entry({'downtime': 420}, {'mttr': 210})
+        assert_that(report['mtbf']).is_equal_to((3590 - 420) / 2)
+
+    def test_outages_older_than_the_raw_window_are_kept(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=86400)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+        gap = (start + 13 * 3600, start + 16 * 3600)  # ended eight hours before the newest heartbeat
+        epochs = [epoch for epoch in range(int(start), int(start) + 86400, 10) if not gap[0] < epoch < gap[1]]
+        dash.bulk_load(["Patrick"] * len(epochs), epochs)
+        now = start + 86399
+
+        assert_that(dash.view_records(now=now)[0]).contains_entry({'outages': 1},
+                                                                   {'last_outage': '2024-01-01 13:00:00 UTC'})
+        assert_that(dash.outage_report("Patrick", start, now)['outages']).is_equal_to([gap])
+
+        dash.heartbeat_interval = 20  # a longer timeout keeps it, a shorter one too
+        assert_that(dash.view_records(now=now)[0]).contains_entry({'outages': 1})
+        dash.heartbeat_interval = 5
+        assert_that(dash.outage_report("Patrick", start, now)['outages']).is_equal_to([gap])
+
+    def test_vectorized_outage_cells_follow_the_window_without_heartbeats(self):
+        dash = self.dashboard(heartbeat_interval=10, uptime_window=600, uptime_engine="vectorized")
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+        epochs = [start + offset for offset in range(0, 1000, 10) if not 100 <= offset < 400]
+        dash.bulk_load(["Patrick"] * len(epochs), epochs)
+
+        before = dash.view_records(now=start + 995)[0]
+        after = dash.view_records(now=start + 1005)[0]  # the outage ending at +400 has left the window
+
+        assert_that(before).contains_entry({'outages': 1}, {'last_outage': '2024-01-01 00:01:30 UTC'})
+        assert_that(after).contains_entry({'outages': 0}, {'last_outage': '2024-01-01 00:01:30 UTC'})
+
+    def test_outage_report_reads_the_published_snapshot(self):
+        dash = self.dashboard(heartbeat_interval=10)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in (0, 10, 200):
+            dash.addHeartBeat(HeartBeat("Patrick", start + timedelta(seconds=offset)))
+        dash.background_publishing = True
+        dash.publish_snapshot(now=start.timestamp() + 200)
+
+        dash.addHeartBeat(HeartBeat("Patrick", start + timedelta(seconds=400)))  # not published yet
+
+        assert_that(dash.outage_report("Patrick", start, start + timedelta(hours=1))['outages']).is_length(1)
+        dash.publish_snapshot(now=start.timestamp() + 400)
+        assert_that(dash.outage_report("Patrick", start, start + timedelta(hours=1))['outages']).is_length(2)
+
+    def test_storage_stats_count_late_and_rejected_heartbeats(self):
+        dash = self.dashboard(retention=3600)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in (0, 100, 90, 200, 20, 7200, 100):
+            dash.addHeartBeats([HeartBeat("Patrick", start + timedelta(seconds=offset))])
+
+        assert_that(dash.storage_stats()).contains_entry({'late_heartbeats': 1}, {'rejected_heartbeats': 1})
+
+    def test_bulk_load_rejects_uneven_columns(self):
+        with self.assertRaises(ValueError):
+            self.dashboard().bulk_load(["Patrick", "Patrick"], [1])
+
+
+class SQLiteDashboardTest(MyTestCase):
+    """The same tests against the SQLite storage backend."""
+
+    def dashboard(self, **settings):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        storage = SQLiteStorage(os.path.join(directory.name, "heartbeats.db"))
+        self.addCleanup(storage.close)
+        return DashBoard(storage=storage, **settings)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,28 +1,201 @@
-from datetime import datetime
+from datetime import datetime, timezone
+
+from Heartbeat import HeartBeat
+from HeartbeatPage import HeartbeatPage
+from HeartbeatStore import DEFAULT_LATENESS, HeartbeatStore
+from OutageIndex import OutageIndex
+from RollupIndex import RollupIndex, DEFAULT_RAW_WINDOW, DEFAULT_RETENTION, epochs_since
+from SlotBitmap import SlotBitmap
+from StalenessIndex import DEFAULT_MISSED_HEARTBEATS
 
 
 class Device:
-    def __init__(self, device_id):
+    def __init__(self, device_id, use_numpy=None, index_resolution=10,
+                 raw_window=DEFAULT_RAW_WINDOW, retention=DEFAULT_RETENTION, lateness=DEFAULT_LATENESS,
+                 outage_timeout=None):
         self.device_id = device_id
-        self.heartbeats = []
+        self.raw_window = raw_window
+        # Raw epoch seconds for the last raw_window in time order; up to `lateness` seconds out of order is reordered
+        self.timestamps = HeartbeatStore(use_numpy=use_numpy, lateness=lateness)
+        self.index = RollupIndex(index_resolution, raw_window, retention)  # counts for windowed queries
         self.most_recent_heartbeat = None
+        self.first_seen_epoch = None
+        self.group = None  # group path named by the latest heartbeat that named one, see GroupIndex
+        self.slots = None  # SlotBitmap, built on the first slot uptime query
+        # Outages are kept up to date from the first heartbeat, as raw heartbeats only cover raw_window
+        if outage_timeout is None:
+            outage_timeout = index_resolution * DEFAULT_MISSED_HEARTBEATS
+        self.outage_index = OutageIndex(outage_timeout)
+        self._next_raw_trim = None
+        self.rejected = 0  # heartbeats older than the retention period, dropped
 
     def add_heartbeat(self, heartbeat):
         if heartbeat.device_id != self.device_id:
             raise ValueError(f"Heartbeat device_id {heartbeat.device_id} does not match device {self.device_id}")
-        self.heartbeats.append(heartbeat)
+        epoch = int(heartbeat.timestamp.timestamp())
+        if not self.index.add(epoch):
+            self.rejected += 1  # older than the retention period
+            return
+        if epoch > self.index.newest - self.raw_window:
+            self.timestamps.append(epoch)
+        if self.slots is not None:
+            self.slots.add(epoch)
+        self.outage_index.add(epoch)
+        if self.first_seen_epoch is None or epoch < self.first_seen_epoch:
+            self.first_seen_epoch = epoch
         if self.most_recent_heartbeat is None or heartbeat.timestamp > self.most_recent_heartbeat.timestamp:
             self.most_recent_heartbeat = heartbeat
+        self._evict_raw()
+
+    def load_epochs(self, epochs):
+        """
+        Add ascending epoch seconds in one step, e.g. replayed from a
+        HeartbeatLog or bulk loaded: each tier counts them per bucket rather
+        than per heartbeat, and a fresh device builds its tiers directly.
+        """
+        if len(epochs) == 0:
+            return
+        fresh = self.index.newest is None
+        kept = self.index.load(epochs) if fresh else self.index.extend(epochs)
+        self.rejected += len(epochs) - kept
+        if not kept:
+            return
+        epochs = epochs[len(epochs) - kept:]
+        newest = self.index.newest
+        self.timestamps.extend(epochs_since(epochs, newest - self.raw_window + 1))
+        if self.slots is not None:
+            for epoch in epochs:
+                self.slots.add(int(epoch))
+        self.outage_index.extend(epochs)
+        if self.first_seen_epoch is None or epochs[0] < self.first_seen_epoch:
+            self.first_seen_epoch = int(epochs[0])
+        if self.most_recent_heartbeat is None or epochs[-1] > self.last_seen_epoch():
+            self.most_recent_heartbeat = HeartBeat(self.device_id, datetime.fromtimestamp(int(epochs[-1]), tz=timezone.utc))
+        if fresh:
+            self._next_raw_trim = newest + self.raw_window // 2
+        else:
+            self._evict_raw()
+
+    def _evict_raw(self):
+        # Raw timestamps are trimmed every half raw_window, so eviction is amortized O(1)
+        newest = self.index.newest
+        if self._next_raw_trim is None:
+            self._next_raw_trim = newest + self.raw_window // 2
+        elif newest >= self._next_raw_trim:
+            self.timestamps.trim(newest - self.raw_window)
+            if self.slots is not None:
+                self.slots.trim(self.slots.slot_for(newest - self.index.retention))
+            self.outage_index.trim(newest - self.index.retention)
+            self._next_raw_trim = newest + self.raw_window // 2
 
     def get_heartbeats(self):
-        return self.heartbeats.copy()  # Return a copy to prevent external modification
+        # HeartBeat objects are only materialized on request
+        return [HeartBeat(self.device_id, datetime.fromtimestamp(ts, tz=timezone.utc)) for ts in self.timestamps.values()]
+
+    def heartbeat_page(self, start=None, end=None, limit=None, cursor=None):
+        """
+        Raw heartbeats with epochs in [start, end), oldest first, at most
+        `limit` of them. `cursor` is a previous page's next_cursor, an
+        (epoch, already returned at that epoch) pair, and replaces start.
+        """
+        skip = 0
+        if cursor is not None:
+            start, skip = cursor
+        return HeartbeatPage.of(self.device_id, self.timestamps.between(start, end)[skip:], limit, cursor)
+
+    def heartbeat_count(self):
+        return len(self.timestamps)
+
+    @property
+    def late(self):
+        """Heartbeats that arrived behind the reorder watermark and were merged into place."""
+        return self.timestamps.late
+
+    def count_between(self, start, end):
+        """
+        Heartbeats between two epochs: exact while the raw heartbeats reach
+        back to `start`, estimated from the rollup tiers for older data.
+        """
+        if self._raw_covers(start):
+            return len(self.timestamps.between(start, end))
+        return self.index.count(start, end)
+
+    def count_drops_after(self, start, heartbeats):
+        """Latest window start still counting the `heartbeats`-th heartbeat from `start`, see RollupIndex.count_drops_after."""
+        if self._raw_covers(start):
+            epochs = self.timestamps.between(start)
+            return int(epochs[heartbeats - 1]) if len(epochs) >= heartbeats else None
+        return self.index.count_drops_after(start, heartbeats)
+
+    def _raw_covers(self, start):
+        # Every heartbeat newer than raw_window before the newest one is kept raw
+        return self.index.newest is not None and start > self.index.newest - self.raw_window
+
+    def histogram(self, start, resolution, columns):
+        """Heartbeat counts for `columns` consecutive ranges of `resolution` seconds from `start`."""
+        return self.index.histogram(start, resolution, columns)
+
+    def resolution_for(self, window):
+        """Finest resolution counts are kept at for a whole window."""
+        return self.index.resolution_for(window)
+
+    def outages(self, timeout):
+        """
+        OutageIndex of the gaps longer than `timeout`. When the timeout
+        changed, the outages kept so far are carried over; a shorter timeout
+        only finds its shorter gaps among the raw heartbeats.
+        """
+        if self.outage_index.timeout != timeout:
+            self.outage_index = self.outage_index.with_timeout(timeout, self.timestamps.values())
+        return self.outage_index
+
+    @property
+    def nbytes(self):
+        return self.timestamps.nbytes + self.index.nbytes + self.outage_index.nbytes
+
+    def last_seen_epoch(self):
+        return self.most_recent_heartbeat.timestamp.timestamp() if self.most_recent_heartbeat else None
 
     def get_last_seen(self):
         return self.most_recent_heartbeat.timestamp if self.most_recent_heartbeat else datetime.fromtimestamp(0, tz=datetime.utcnow().astimezone().tzinfo)
 
-    def calculate_uptime(self, heartbeat_interval, uptime_window, now=datetime.now()):
-        expected_heartbeats = uptime_window / heartbeat_interval
-        if not self.heartbeats:
+    def calculate_uptime(self, heartbeat_interval, uptime_window, now=None):
+        """
+        Heartbeats received in the uptime window up to the latest one, as a
+        percentage of those expected. Counted with count_between, so windows
+        longer than raw_window are read from the rollup tiers.
+        """
+        if self.index.newest is None:
+            return 0
+        end = self.index.newest + 1
+        received = self.count_between(end - uptime_window, end)
+        return int(received / (uptime_window / heartbeat_interval) * 100)
+
+    def calculate_slot_uptime(self, heartbeat_interval, uptime_window, now=None):
+        """
+        Percentage of the window's heartbeat slots that saw at least one
+        heartbeat. Slots the raw heartbeats reach back to are read from a
+        SlotBitmap; older ones are counted from the rollup tiers, where
+        duplicates cannot be told apart, so they count at most one heartbeat
+        per slot over that span.
+        """
+        expected_slots = uptime_window // heartbeat_interval
+        if self.index.newest is None or expected_slots <= 0:
             return 0
-        calculated_uptime = len(self.heartbeats) / expected_heartbeats
-        return int(calculated_uptime * 100)
+        if now is None:
+            now = datetime.now(tz=timezone.utc)
+        stop_slot = int(now.timestamp()) // heartbeat_interval + 1
+        start_slot = stop_slot - expected_slots
+        raw_slot = max(start_slot, (self.index.newest - self.raw_window) // heartbeat_interval + 1)
+        received = self._slot_bitmap(heartbeat_interval).count(raw_slot, stop_slot)
+        if start_slot < raw_slot:
+            older = self.count_between(start_slot * heartbeat_interval, raw_slot * heartbeat_interval)
+            received += min(int(older), raw_slot - start_slot)
+        return int(received / expected_slots * 100)
+
+    def _slot_bitmap(self, heartbeat_interval):
+        if self.slots is None or self.slots.heartbeat_interval != heartbeat_interval:
+            self.slots = SlotBitmap(heartbeat_interval)
+            for epoch in self.timestamps.values():
+                self.slots.add(epoch)
+        return self.slots
@@ -1,9 +1,22 @@
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
+from typing import Optional
 
+LAST_SEEN_FORMAT = '%Y-%m-%d %H:%M:%S %Z'
 
 @dataclass
 class DeviceDashboardViewRow:
     device_id: str
     last_seen: datetime = field(default_factory=lambda: datetime.fromtimestamp(0, tz=timezone.utc))
     uptime: int = 100
+    status: str = "online"  # "offline" once the device missed too many heartbeats, see StalenessIndex
+    group: str = ""  # site/rack/... path from the device's topic, see GroupIndex
+    last_outage: Optional[datetime] = None  # start of the latest gap longer than the offline timeout, see OutageIndex
+    outages: int = 0  # outages overlapping the uptime window, an ongoing one included
+
+    def to_record(self):
+        """Table record with last_seen already formatted for display."""
+        return {'device_id': self.device_id, 'last_seen': self.last_seen.strftime(LAST_SEEN_FORMAT), 'uptime': self.uptime,
+                'status': self.status, 'group': self.group,
+                'last_outage': self.last_outage.strftime(LAST_SEEN_FORMAT) if self.last_outage else "",
+                'outages': self.outages}
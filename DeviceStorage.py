@@ -0,0 +1,43 @@
+from Device import Device
+from HeartbeatStore import DEFAULT_LATENESS
+
+
+class MemoryStorage(dict):
+    """
+    Where DashBoard keeps its devices: a mapping of device_id to device,
+    plus create(), commit(), stats() and close(). This backend holds Device
+    objects in memory; SQLiteStorage keeps the heartbeats on disk.
+
+    Devices answer the queries DashBoard makes (last seen, counts over a
+    range, histograms, pages of raw heartbeats); see Device for the methods.
+    Each device reorders heartbeats up to `lateness` seconds out of order
+    before storing them, see HeartbeatStore.
+    """
+
+    def __init__(self, lateness=DEFAULT_LATENESS):
+        super().__init__()
+        self.lateness = lateness
+
+    def create(self, device_id, index_resolution, raw_window, retention, outage_timeout=None):
+        """Add and return a device that has no heartbeats yet."""
+        device = self[device_id] = Device(device_id, index_resolution=index_resolution, raw_window=raw_window,
+                                          retention=retention, lateness=self.lateness, outage_timeout=outage_timeout)
+        return device
+
+    def commit(self):
+        """End of a batch: heartbeats added so far become visible to readers on other threads."""
+
+    def stats(self, devices):
+        """
+        Raw heartbeats held by `devices`, the estimated bytes of their stores
+        and indexes, and the heartbeats that arrived behind the reorder
+        watermark (late) or after the retention period (rejected).
+        """
+        devices = list(devices)
+        return {'stored_heartbeats': sum(device.heartbeat_count() for device in devices),
+                'store_bytes': sum(device.nbytes for device in devices),
+                'late_heartbeats': sum(device.late for device in devices),
+                'rejected_heartbeats': sum(device.rejected for device in devices)}
+
+    def close(self):
+        pass
@@ -48,6 +48,15 @@ class DeviceTest(unittest.TestCase):
         uptime = device.calculate_uptime(interval, window, now)
         assert_that(uptime).is_equal_to(0)
 
+    def test_calc_uptime_over_a_window_longer_than_the_raw_heartbeats(self):
+        device = Device("Patrick", raw_window=3600)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in range(0, 86400, 10):
+            device.add_heartbeat(HeartBeat("Patrick", start + timedelta(seconds=offset)))
+
+        assert_that(device.calculate_uptime(10, 86400)).is_equal_to(100)
+        assert_that(device.calculate_uptime(10, 2 * 86400)).is_equal_to(50)
+
     def test_add_heartbeat_validation(self):
         device = Device("Patrick")
         wrong_heartbeat = HeartBeat("WrongDevice", datetime.now(tz=timezone.utc))
@@ -90,6 +99,79 @@ class DeviceTest(unittest.TestCase):
         # Should still be second_time as it's the most recent
         assert_that(device.get_last_seen()).is_equal_to(second_time)
 
+    def test_get_heartbeats_materializes_stored_timestamps(self):
+        device = Device("test_device")
+        now = datetime.now(tz=timezone.utc).replace(microsecond=0)
+        device.add_heartbeat(HeartBeat("test_device", now))
+        device.add_heartbeat(HeartBeat("test_device", now + timedelta(seconds=10)))
+
+        heartbeats = device.get_heartbeats()
+
+        assert_that(heartbeats).is_length(2)
+        assert_that(heartbeats[0].device_id).is_equal_to("test_device")
+        assert_that(heartbeats[1].timestamp).is_equal_to(now + timedelta(seconds=10))
+
+    def test_get_heartbeats_returns_fresh_list(self):
+        device = Device("test_device")
+        device.add_heartbeat(HeartBeat("test_device", datetime.now(tz=timezone.utc)))
+
+        device.get_heartbeats().clear()
+
+        assert_that(device.heartbeat_count()).is_equal_to(1)
+
+    def test_slot_uptime_ignores_duplicate_heartbeats(self):
+        device = Device("Patrick")
+        now = datetime.now(tz=timezone.utc)
+
+        # Each heartbeat is delivered twice, as a QoS redelivery would
+        for offset in (0, 10, 20):
+            device.add_heartbeat(HeartBeat("Patrick", now + timedelta(seconds=offset)))
+            device.add_heartbeat(HeartBeat("Patrick", now + timedelta(seconds=offset)))
+
+        assert_that(device.calculate_slot_uptime(10, 60, now + timedelta(seconds=20))).is_equal_to(50)
+
+    def test_slot_uptime_only_counts_the_window(self):
+        device = Device("Patrick")
+        now = datetime.now(tz=timezone.utc)
+        for offset in range(0, 600, 10):
+            device.add_heartbeat(HeartBeat("Patrick", now + timedelta(seconds=offset)))
+
+        uptime = device.calculate_slot_uptime(10, 60, now + timedelta(seconds=590))
+        assert_that(uptime).is_equal_to(100)
+        assert_that(device.calculate_slot_uptime(10, 60, now + timedelta(seconds=650))).is_equal_to(0)
+
+    def test_raw_heartbeats_are_evicted_after_the_raw_window(self):
+        device = Device("Patrick", raw_window=600, retention=3600)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in range(0, 7200, 10):
+            device.add_heartbeat(HeartBeat("Patrick", start + timedelta(seconds=offset)))
+
+        assert_that(device.heartbeat_count()).is_between(60, 90)
+        newest = (start + timedelta(seconds=7190)).timestamp()
+        assert_that(device.count_between(newest - 3000, newest + 1)).is_close_to(300, tolerance=1)
+
+
+    def test_outages_are_kept_up_to_date_once_queried(self):
+        device = Device("Patrick")
+        start = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+        device.load_epochs(list(range(start, start + 300, 10)) + list(range(start + 600, start + 900, 10)))
+
+        outages = device.outages(30)
+        device.add_heartbeat(HeartBeat("Patrick", datetime.fromtimestamp(start + 1000, tz=timezone.utc)))
+        device.add_heartbeat(HeartBeat("Patrick", datetime.fromtimestamp(start + 450, tz=timezone.utc)))
+
+        assert_that(outages.between(start, start + 1000)).is_equal_to(
+            [(start + 290, start + 450), (start + 450, start + 600), (start + 890, start + 1000)])
+        assert_that(device.outages(200).between(start, start + 1000)).is_empty()
+
+    def test_late_and_rejected_heartbeats_are_counted(self):
+        device = Device("Patrick", retention=3600, lateness=30)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for offset in (0, 100, 90, 200, 20, 7200, 100):
+            device.add_heartbeat(HeartBeat("Patrick", start + timedelta(seconds=offset)))
+
+        assert_that(device.late).is_equal_to(1)  # 20s, 180s behind; 90s was within the watermark
+        assert_that(device.rejected).is_equal_to(1)  # 100s, older than an hour before 7200s
 
 if __name__ == '__main__':
     unittest.main()
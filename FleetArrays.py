@@ -0,0 +1,145 @@
+try:
+    import numpy as np
+except ImportError:  # the vectorized engine is only available with numpy
+    np = None
+
+DEFAULT_COLUMNS = 180
+
+
+class FleetArrays:
+    """
+    Fleet-wide NumPy columns (last seen, first seen, windowed counts) so
+    every device's uptime is computed in one vectorized pass.
+
+    Windowed counts live in a ring of `columns` time columns per device.
+    Each heartbeat increments one cell and the device's running total; when
+    time moves on, expiring columns are subtracted from every total at once.
+    """
+
+    def __init__(self, heartbeat_interval, uptime_window, column_resolution, capacity=1024):
+        if np is None:
+            raise ImportError("the vectorized uptime engine needs numpy")
+        self.heartbeat_interval = heartbeat_interval
+        self.uptime_window = uptime_window
+        self.resolution = column_resolution
+        self.columns = -(-uptime_window // column_resolution) + 1  # +1 for the partially elapsed column
+        self.head = None  # newest column held by the ring
+        self.device_ids = []
+        self.rows = {}  # device_id -> row
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+        self.first_seen = np.zeros(capacity, dtype=np.float64)
+        self.totals = np.zeros(capacity, dtype=np.int64)
+        self.counts = np.zeros((capacity, self.columns), dtype=np.uint32)
+
+    @classmethod
+    def column_resolution(cls, uptime_window, tier_resolution, columns=DEFAULT_COLUMNS):
+        """Smallest multiple of tier_resolution giving at most `columns` columns per window."""
+        per_column = -(-uptime_window // columns)
+        return -(-per_column // tier_resolution) * tier_resolution
+
+    def _row(self, device_id):
+        row = self.rows.get(device_id)
+        if row is None:
+            row = len(self.device_ids)
+            if row == len(self.totals):
+                self._grow()
+            self.rows[device_id] = row
+            self.device_ids.append(device_id)
+            self.first_seen[row] = np.inf
+        return row
+
+    def _grow(self):
+        capacity = 2 * len(self.totals)
+        for name in ("last_seen", "first_seen", "totals"):
+            grown = np.zeros(capacity, dtype=getattr(self, name).dtype)
+            grown[:len(self.totals)] = getattr(self, name)
+            setattr(self, name, grown)
+        counts = np.zeros((capacity, self.columns), dtype=np.uint32)
+        counts[:len(self.counts)] = self.counts
+        self.counts = counts
+
+    def record(self, device_id, epoch, count=1):
+        row = self._row(device_id)
+        if epoch > self.last_seen[row]:
+            self.last_seen[row] = epoch
+        if epoch < self.first_seen[row]:
+            self.first_seen[row] = epoch
+
+        column = int(epoch // self.resolution)
+        if self.head is None or column > self.head:
+            self.advance(column)
+        elif column <= self.head - self.columns:
+            return  # older than the ring
+        self.counts[row, column % self.columns] += count
+        self.totals[row] += count
+
+    def seed(self, device_id, first_seen, last_seen, start_column, column_counts):
+        """Load one device's history; column_counts start at start_column."""
+        row = self._row(device_id)
+        self.first_seen[row] = first_seen
+        self.last_seen[row] = last_seen
+        if self.head is None or start_column + len(column_counts) - 1 > self.head:
+            self.advance(start_column + len(column_counts) - 1)
+        for column, count in enumerate(column_counts, start=start_column):
+            if count and self.head - self.columns < column <= self.head:
+                self.counts[row, column % self.columns] += count
+                self.totals[row] += count
+
+    def advance(self, column):
+        """Move the ring head forward, expiring the columns that fall out of it."""
+        if self.head is not None:
+            expiring = column - self.head
+            if expiring <= 0:
+                return
+            if expiring >= self.columns:
+                self.counts[:] = 0
+                self.totals[:] = 0
+            else:
+                for expired in range(self.head + 1, column + 1):
+                    slot = expired % self.columns
+                    self.totals -= self.counts[:, slot]
+                    self.counts[:, slot] = 0
+        self.head = column
+
+    def uptimes(self, now):
+        """Uptime percentage of every device, clipped to 0-100, in row order."""
+        n = len(self.device_ids)
+        self.advance(int(now // self.resolution))
+        window_start = now - self.uptime_window
+        oldest = self.head - self.columns + 1
+        outside = min(max((window_start - oldest * self.resolution) / self.resolution, 0.0), 1.0)
+        # The oldest column is prorated, rounded up as RollupIndex.count does
+        received = self.totals[:n] - np.floor(self.counts[:n, oldest % self.columns] * outside + 1e-9)
+
+        # Devices are not expected to report before their first heartbeat
+        first_slot = self.first_seen[:n] - self.first_seen[:n] % self.heartbeat_interval
+        observed = now - np.maximum(window_start, first_slot)
+        expected = np.maximum(observed / self.heartbeat_interval, 1.0)
+        return np.clip(np.floor(received / expected * 100 + 1e-9), 0, 100).astype(np.int64)
+
+    def records(self, now, offline=(), group_of=None, outages_of=None):
+        """
+        Formatted table records for every device; `offline` holds the IDs of
+        the offline ones, `group_of(device_id)` names a device's group and
+        `outages_of(device_id)` gives its (last outage text, outages in window).
+        """
+        return self.records_for(range(len(self.device_ids)), self.uptimes(now), offline, group_of, outages_of)
+
+    def records_for(self, rows, uptimes, offline=(), group_of=None, outages_of=None):
+        """Formatted records of the given rows only, with uptimes() computed beforehand; see records()."""
+        rows = np.asarray(rows, dtype=np.int64)
+        # Same text as LAST_SEEN_FORMAT gives for UTC timestamps
+        last_seen = np.datetime_as_string(self.last_seen[rows].astype('datetime64[s]'), unit='s')
+        device_ids = self.device_ids
+        records = [{'device_id': device_ids[row], 'last_seen': seen.replace('T', ' ') + ' UTC', 'uptime': uptime,
+                    'status': "offline" if device_ids[row] in offline else "online",
+                    'group': group_of(device_ids[row]) if group_of is not None else "", 'last_outage': "", 'outages': 0}
+                   for row, seen, uptime in zip(rows.tolist(), last_seen.tolist(), uptimes[rows].tolist())]
+        if outages_of is not None:
+            for record in records:
+                record['last_outage'], record['outages'] = outages_of(record['device_id'])
+        return records
+
+    @property
+    def nbytes(self):
+        return self.last_seen.nbytes + self.first_seen.nbytes + self.totals.nbytes + self.counts.nbytes
@@ -0,0 +1,271 @@
+"""
+Fleet health per group of devices (site, rack, ...), kept up to date
+incrementally instead of being computed from every device's row.
+
+A device's group path comes from its topic: device/heartbeat/<site>/<rack>/<device_id>
+puts it in ("site", "rack"). Every group counts its own devices and those
+of the groups below it; the root group () counts the whole fleet.
+
+Per group there are four counters: devices, devices online, and the
+heartbeat slots expected and received within the uptime window, as in the
+slots engine. A heartbeat in a new slot of its device adds one received
+slot to every group above the device. Like FleetArrays, received slots are
+bucketed into columns of at most DEFAULT_COLUMNS per window, and when the
+window moves on, the columns that leave it are subtracted; the groups
+themselves are not visited. Expected slots grow by one
+per slot for every device first seen less than a window ago, and stay at
+a full window once it is older.
+"""
+import heapq
+from bisect import bisect_left
+
+from FleetArrays import FleetArrays
+
+SEPARATOR = "/"
+
+
+def group_name(path):
+    return SEPARATOR.join(path)
+
+
+def group_path(name):
+    return tuple(name.split(SEPARATOR)) if name else ()
+
+
+def topic_group(topic, topic_prefix="device/heartbeat/"):
+    """
+    Group path named by a heartbeat topic: the levels between the prefix and
+    the last one, which is the device ID (or the binary batch suffix). None
+    when the topic does not start with the prefix.
+    """
+    if not topic or not topic.startswith(topic_prefix):
+        return None
+    return tuple(level for level in topic[len(topic_prefix):].split(SEPARATOR)[:-1] if level)
+
+
+class GroupTotals:
+    """Counters of one group, including every group below it."""
+
+    __slots__ = ("devices", "online", "received", "mature", "young", "young_first_slots")
+
+    def __init__(self):
+        self.devices = 0
+        self.online = 0
+        self.received = 0  # slots with a heartbeat inside the window
+        self.mature = 0  # devices first seen at least a window ago
+        self.young = 0  # the others
+        self.young_first_slots = 0  # sum of the young devices' first slots
+
+    def expected(self, now_slot, window_slots):
+        return self.mature * window_slots + self.young * (now_slot + 1) - self.young_first_slots
+
+
+class _Device:
+    __slots__ = ("path", "first_slot", "last_slot", "online")
+
+    def __init__(self, path, first_slot, online):
+        self.path = path
+        self.first_slot = first_slot
+        self.last_slot = None
+        self.online = online
+
+
+class GroupIndex:
+    def __init__(self, heartbeat_interval, uptime_window):
+        self.heartbeat_interval = heartbeat_interval
+        self.uptime_window = uptime_window
+        self.window_slots = max(uptime_window // heartbeat_interval, 1)
+        self.column = FleetArrays.column_resolution(uptime_window, heartbeat_interval)  # seconds per column
+        self.groups = {(): GroupTotals()}
+        self._devices = {}
+        self._expiring = {}  # column -> {path: received slots it holds}
+        self._young = {}  # first slot -> {path: devices first seen in it}, until they are a window old
+        self._young_slots = []  # heap of the keys of _young
+        self._now_slot = None
+
+    def __len__(self):
+        return len(self._devices)
+
+    def path_of(self, device_id):
+        device = self._devices.get(device_id)
+        return device.path if device is not None else ()
+
+    def name_of(self, device_id):
+        return group_name(self.path_of(device_id))
+
+    def _window_start(self, newest_slot):
+        """First slot that can still be inside the window."""
+        newest = newest_slot if self._now_slot is None else max(newest_slot, self._now_slot)
+        return newest - self.window_slots + 1
+
+    def heartbeat(self, device_id, epoch, path=None, count_between=None):
+        """
+        Count one heartbeat, before it is added to the device. `path` moves
+        the device to that group (None keeps its group); `count_between`
+        (start, end) -> heartbeats is only asked about late heartbeats,
+        whose slot may already have been counted.
+        """
+        slot = int(epoch // self.heartbeat_interval)
+        device = self._device(device_id, path, slot)
+        if device.last_slot is None or slot > device.last_slot:
+            device.last_slot = slot
+        elif slot == device.last_slot or count_between is None or slot < self._window_start(device.last_slot):
+            return
+        elif count_between(slot * self.heartbeat_interval, (slot + 1) * self.heartbeat_interval) >= 1:
+            return
+        if slot >= self._window_start(slot):
+            self._count(device.path, slot * self.heartbeat_interval // self.column)
+
+    def load(self, device_id, epochs, path=None, count_between=None):
+        """Count ascending epoch seconds at once; only their last window can be inside it."""
+        if len(epochs) == 0:
+            return
+        interval = self.heartbeat_interval
+        newest = int(epochs[-1] // interval)
+        device = self._device(device_id, path, int(epochs[0] // interval))
+        start = self._window_start(newest)
+        if device.last_slot is not None and device.last_slot >= start:
+            # Slots up to the device's last one may have been counted already
+            late = epochs[bisect_left(epochs, start * interval):bisect_left(epochs, (device.last_slot + 1) * interval)]
+            for slot in sorted({int(epoch // interval) for epoch in late}):
+                self.heartbeat(device_id, slot * interval, None, count_between)
+            start = device.last_slot + 1
+        for slot in sorted({int(epoch // interval) for epoch in epochs[bisect_left(epochs, start * interval):]}):
+            self._count(device.path, slot * interval // self.column)
+        device.last_slot = newest if device.last_slot is None else max(newest, device.last_slot)
+
+    def set_online(self, device_id, online):
+        device = self._devices.get(device_id)
+        if device is None or device.online == online:
+            return
+        device.online = online
+        for path in _ancestors(device.path):
+            self.groups[path].online += 1 if online else -1
+
+    def advance(self, now):
+        """Move the window to end at `now`: expire the columns and mature the devices it left behind."""
+        now_slot = int(now // self.heartbeat_interval)
+        if self._now_slot is not None and now_slot <= self._now_slot:
+            return
+        self._now_slot = now_slot
+        start_slot = now_slot - self.window_slots + 1
+        start_column = start_slot * self.heartbeat_interval // self.column
+        for column in [column for column in self._expiring if column < start_column]:
+            for path, slots in self._expiring.pop(column).items():
+                self.groups[path].received -= slots
+        while self._young_slots and self._young_slots[0] <= start_slot:
+            first_slot = heapq.heappop(self._young_slots)
+            for path, devices in self._young.pop(first_slot).items():
+                totals = self.groups[path]
+                totals.young -= devices
+                totals.young_first_slots -= first_slot * devices
+                totals.mature += devices
+
+    def records(self, now=None):
+        """One record per group, parents before their children; see merge_records."""
+        if now is not None:
+            self.advance(now)
+        now_slot = self._now_slot if self._now_slot is not None else 0
+        records = []
+        for path in sorted(self.groups):
+            totals = self.groups[path]
+            if not totals.devices and path:
+                continue
+            records.append(_record(path, totals.devices, totals.online,
+                                   totals.expected(now_slot, self.window_slots), totals.received))
+        return records
+
+    def _device(self, device_id, path, slot):
+        device = self._devices.get(device_id)
+        if device is None:
+            device = self._devices[device_id] = _Device(path or (), slot, True)
+            self._join(device)
+        elif path is not None and path != device.path:
+            # Slots already counted stay with the old group until they expire
+            self._leave(device)
+            device.path = path
+            self._join(device)
+        elif slot < device.first_slot:
+            self._leave(device)
+            device.first_slot = slot
+            self._join(device)
+        return device
+
+    def _join(self, device):
+        mature = self._now_slot is not None and device.first_slot <= self._now_slot - self.window_slots + 1
+        for path in _ancestors(device.path):
+            totals = self.groups.get(path)
+            if totals is None:
+                totals = self.groups[path] = GroupTotals()
+            totals.devices += 1
+            totals.online += device.online
+            if mature:
+                totals.mature += 1
+            else:
+                totals.young += 1
+                totals.young_first_slots += device.first_slot
+                self._add_young(device.first_slot, path, 1)
+
+    def _leave(self, device):
+        for path in _ancestors(device.path):
+            totals = self.groups[path]
+            totals.devices -= 1
+            totals.online -= device.online
+            if self._add_young(device.first_slot, path, -1):
+                totals.young -= 1
+                totals.young_first_slots -= device.first_slot
+            else:
+                totals.mature -= 1
+
+    def _add_young(self, first_slot, path, devices):
+        """Change the young devices of `path` first seen in `first_slot`; False if there are none."""
+        young = self._young.get(first_slot)
+        if young is None:
+            if devices < 0:
+                return False
+            young = self._young[first_slot] = {}
+            heapq.heappush(self._young_slots, first_slot)
+        if devices < 0 and not young.get(path):
+            return False
+        young[path] = young.get(path, 0) + devices
+        return True
+
+    def _count(self, path, column, slots=1):
+        expiring = self._expiring.setdefault(column, {})
+        for ancestor in _ancestors(path):
+            self.groups[ancestor].received += slots
+            expiring[ancestor] = expiring.get(ancestor, 0) + slots
+
+    def count_column(self, device_id, column, slots):
+        """Count `slots` received slots of a device in one column at once, e.g. when rebuilding."""
+        self._count(self.path_of(device_id), column, slots)
+
+    def add_device(self, device_id, path, first_epoch, last_epoch=None, online=True):
+        """Add a device without counting any heartbeat, e.g. when rebuilding; see count_column."""
+        device = self._device(device_id, path, int(first_epoch // self.heartbeat_interval))
+        if last_epoch is not None:
+            device.last_slot = int(last_epoch // self.heartbeat_interval)
+        self.set_online(device_id, online)
+        return device
+
+
+def _ancestors(path):
+    return [path[:depth] for depth in range(len(path) + 1)]
+
+
+def _record(path, devices, online, expected, received):
+    return {'group': group_name(path), 'depth': len(path), 'devices': devices, 'online': online,
+            'offline': devices - online, 'expected': expected, 'received': received,
+            'uptime': int(min(received / expected, 1) * 100) if expected > 0 else 0}
+
+
+def merge_records(record_sets):
+    """Group records of disjoint sets of devices (e.g. one per shard) added up."""
+    merged = {}
+    for records in record_sets:
+        for record in records:
+            totals = merged.setdefault(record['group'], [0, 0, 0, 0])
+            for i, key in enumerate(('devices', 'online', 'expected', 'received')):
+                totals[i] += record[key]
+    return [_record(path, *merged[group_name(path)])
+            for path in sorted(group_path(name) for name in merged)]
@@ -0,0 +1,92 @@
+import unittest
+
+from assertpy import assert_that
+
+from GroupIndex import GroupIndex, merge_records, topic_group
+
+START = 1_700_000_000
+NORTH = ("north", "rack1")
+
+
+def by_name(records):
+    return {record['group']: record for record in records}
+
+
+class GroupIndexTest(unittest.TestCase):
+    def test_topic_group_is_the_levels_between_prefix_and_device(self):
+        assert_that(topic_group("device/heartbeat/north/rack1/a")).is_equal_to(NORTH)
+        assert_that(topic_group("device/heartbeat/a")).is_equal_to(())
+        assert_that(topic_group("sensors/a")).is_none()
+
+    def test_counters_follow_every_heartbeat(self):
+        groups = GroupIndex(heartbeat_interval=10, uptime_window=100)
+        for epoch in range(START, START + 100, 10):
+            groups.heartbeat("a", epoch, NORTH)
+            groups.heartbeat("a", epoch + 1)  # same slot, counted once
+        groups.heartbeat("b", START + 50, ("north", "rack2"))
+
+        records = by_name(groups.records(now=START + 99))
+
+        assert_that(list(records)).is_equal_to(["", "north", "north/rack1", "north/rack2"])
+        assert_that(records["north/rack1"]).contains_entry({'expected': 10}, {'received': 10}, {'uptime': 100})
+        assert_that(records["north/rack2"]).contains_entry({'expected': 5}, {'received': 1}, {'uptime': 20})
+        assert_that(records["north"]).contains_entry({'devices': 2}, {'expected': 15}, {'received': 11})
+
+    def test_received_slots_expire_with_the_window(self):
+        groups = GroupIndex(heartbeat_interval=10, uptime_window=100)
+        for epoch in range(START, START + 100, 10):
+            groups.heartbeat("a", epoch, NORTH)
+
+        north = by_name(groups.records(now=START + 149))["north"]
+
+        assert_that(north).contains_entry({'expected': 10}, {'received': 5}, {'uptime': 50})
+
+    def test_late_heartbeats_are_counted_once(self):
+        groups = GroupIndex(heartbeat_interval=10, uptime_window=100)
+        seen = set()
+
+        def count_between(start, end):
+            return sum(start <= epoch < end for epoch in seen)
+
+        for epoch in (START + 50, START + 20, START + 20, START):
+            groups.heartbeat("a", epoch, NORTH, count_between)
+            seen.add(epoch)
+
+        assert_that(by_name(groups.records(now=START + 99))["north"]['received']).is_equal_to(3)
+
+    def test_online_and_moving_devices(self):
+        groups = GroupIndex(heartbeat_interval=10, uptime_window=100)
+        groups.heartbeat("a", START, NORTH)
+        groups.heartbeat("b", START, NORTH)
+        groups.set_online("a", False)
+        groups.heartbeat("b", START + 10, ("south",))
+
+        records = by_name(groups.records(now=START + 10))
+
+        assert_that(records["north/rack1"]).contains_entry({'devices': 1}, {'online': 0}, {'offline': 1})
+        assert_that(records["south"]).contains_entry({'devices': 1}, {'online': 1})
+        assert_that(records[""]).contains_entry({'devices': 2}, {'online': 1})
+
+    def test_load_counts_a_device_history_at_once(self):
+        loaded = GroupIndex(heartbeat_interval=10, uptime_window=100)
+        added = GroupIndex(heartbeat_interval=10, uptime_window=100)
+        epochs = list(range(START, START + 300, 10))
+        loaded.load("a", epochs, NORTH)
+        for epoch in epochs:
+            added.heartbeat("a", epoch, NORTH)
+
+        assert_that(loaded.records(now=START + 299)).is_equal_to(added.records(now=START + 299))
+
+    def test_merge_records_adds_up_shards(self):
+        shards = [GroupIndex(heartbeat_interval=10, uptime_window=100) for _ in range(2)]
+        shards[0].heartbeat("a", START, NORTH)
+        shards[1].heartbeat("b", START, ("south",))
+
+        merged = by_name(merge_records(shard.records(now=START + 9) for shard in shards))
+
+        assert_that(list(merged)).is_equal_to(["", "north", "north/rack1", "south"])
+        assert_that(merged[""]).contains_entry({'devices': 2}, {'expected': 2}, {'received': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
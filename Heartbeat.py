@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta
 from time import gmtime, mktime
 
@@ -7,8 +7,9 @@ from time import gmtime, mktime
 class HeartBeat:
     device_id: str
     timestamp: datetime
+    group: tuple = field(default=None, compare=False)  # group path from the topic, None when not known
 
-    def __init__(self, device_id=None, timestamp=None):
+    def __init__(self, device_id=None, timestamp=None, group=None):
         if device_id is None:
             self.device_id = f"device_{gmtime()}"
         else:
@@ -18,7 +19,8 @@ class HeartBeat:
             self.timestamp = datetime.now(tz=timezone.utc)
         else:
             self.timestamp = timestamp if isinstance(timestamp, datetime) else datetime.fromtimestamp(timestamp, tz=timezone.utc)
+        self.group = group
 
     def next(self):
         new_time = self.timestamp + timedelta(seconds=10)
-        return HeartBeat(device_id=self.device_id, timestamp=new_time)
+        return HeartBeat(device_id=self.device_id, timestamp=new_time, group=self.group)
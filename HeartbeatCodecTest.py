@@ -0,0 +1,47 @@
+import json
+import unittest
+
+from assertpy import assert_that
+
+import heartbeat_codec
+from Dashboard import DashBoard
+from ingest_pipeline import IngestPipeline
+
+
+class HeartbeatCodecTest(unittest.TestCase):
+    def test_batch_round_trip(self):
+        heartbeats = [("device_001", 1_700_000_000.5), ("device_002", 1_700_000_010.0)]
+
+        payload = heartbeat_codec.encode_batch(heartbeats)
+
+        assert_that(len(payload)).is_equal_to(heartbeat_codec.HEADER.size + 2 * heartbeat_codec.RECORD.size)
+        assert_that(heartbeat_codec.decode(payload)).is_equal_to(heartbeats)
+
+    def test_detects_binary_by_magic_byte_or_topic(self):
+        assert_that(heartbeat_codec.is_binary(heartbeat_codec.encode("a", 1.0))).is_true()
+        assert_that(heartbeat_codec.is_binary(b'{"device_id": "a"}')).is_false()
+        assert_that(heartbeat_codec.is_binary(b'', topic="device/heartbeat/a/bin")).is_true()
+
+    def test_rejects_truncated_payload(self):
+        payload = heartbeat_codec.encode("a", 1.0)
+        with self.assertRaises(ValueError):
+            heartbeat_codec.decode(payload[:-1])
+
+    def test_rejects_long_device_id(self):
+        with self.assertRaises(ValueError):
+            heartbeat_codec.encode("d" * 33, 1.0)
+
+    def test_pipeline_accepts_json_and_binary(self):
+        dashboard = DashBoard()
+        pipeline = IngestPipeline(dashboard)
+        binary = heartbeat_codec.encode_batch([("a", 1_700_000_000), ("b", 1_700_000_000)])
+        text = json.dumps({"device_id": "c", "timestamp": 1_700_000_000}).encode()
+
+        pipeline.apply([binary, text], ["device/heartbeat", "device/heartbeat/c"])
+
+        assert_that(sorted(dashboard.devices)).is_equal_to(["a", "b", "c"])
+        assert_that(pipeline.stats.parsed).is_equal_to(3)
+
+
+if __name__ == '__main__':
+    unittest.main()
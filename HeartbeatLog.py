@@ -0,0 +1,254 @@
+"""
+Append-only on-disk heartbeat log, so history survives a restart.
+
+Heartbeats are stored as fixed-size 12-byte records in segment files:
+
+    record:  device number (uint32), timestamp (int64 epoch seconds)
+
+Device IDs are interned: each new ID is appended once, one per line, to
+devices.txt, and its line number is the device number used by records. An
+ID that contains a line break or starts with a double quote is written
+JSON-encoded, so every ID stays on its own line.
+Records are buffered and written by commit() (group commit: the ingest
+pipeline commits once per batch). A segment is closed and a new one
+started once it reaches segment_bytes. Closed segments whose newest
+heartbeat is older than the retention period before the newest logged one
+are deleted when a segment is started and when the log is replayed.
+
+replay() memory-maps every segment and hands each device's epochs to
+DashBoard.load_device_epochs in bulk, which fills the rollup tiers
+directly instead of re-ingesting every heartbeat.
+"""
+import json
+import mmap
+import os
+import struct
+from collections import defaultdict
+
+from RollupIndex import DEFAULT_RETENTION, epochs_since
+
+try:
+    import numpy as np
+except ImportError:  # replay falls back to struct when numpy is missing
+    np = None
+
+RECORD = struct.Struct('<Iq')
+RECORD_DTYPE = np.dtype([('device', '<u4'), ('epoch', '<i8')]) if np is not None else None
+DEVICES_FILE = "devices.txt"
+SEGMENT_PATTERN = "segment-{:08d}.log"
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+DEFAULT_GROUP_SIZE = 4096
+
+
+class HeartbeatLog:
+    def __init__(self, directory, segment_bytes=DEFAULT_SEGMENT_BYTES, group_size=DEFAULT_GROUP_SIZE, fsync=False,
+                 retention=DEFAULT_RETENTION):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.group_size = group_size  # buffered records that force a commit between batches
+        self.fsync = fsync
+        self.retention = retention  # seconds of history kept, before the newest heartbeat; None keeps everything
+        self._newest = {}  # closed segment path -> its newest epoch, read once
+        os.makedirs(directory, exist_ok=True)
+        self.device_ids = self._read_devices()
+        self._numbers = {device_id: number for number, device_id in enumerate(self.device_ids)}
+        self._new_device_ids = []
+        self._pending = bytearray()
+        self._pending_records = 0
+        segments = self.segments()
+        self._segment_number = int(os.path.basename(segments[-1])[8:16]) if segments else 1
+        self._segment = None
+        self._devices_file = None  # opened by the first commit that interns a device
+
+    def _read_devices(self):
+        path = os.path.join(self.directory, DEVICES_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8', newline='\n') as devices:
+            # A line without its newline was cut short by a crash and never referenced
+            return [json.loads(line) if line.startswith('"') else line[:-1] for line in devices if line.endswith('\n')]
+
+    def segments(self):
+        """Segment paths, oldest first."""
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith("segment-") and name.endswith(".log"))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def append(self, device_id, epoch):
+        number = self._numbers.get(device_id)
+        if number is None:
+            number = self._numbers[device_id] = len(self.device_ids)
+            self.device_ids.append(device_id)
+            self._new_device_ids.append(device_id)
+        self._pending += RECORD.pack(number, int(epoch))
+        self._pending_records += 1
+        if self._pending_records >= self.group_size:
+            self.commit()
+
+    def extend(self, device_id, epochs):
+        """Append many heartbeats of one device, packed in one step when numpy is available."""
+        if np is None:
+            for epoch in epochs:
+                self.append(device_id, epoch)
+            return
+        self.append(device_id, epochs[0])
+        records = np.empty(len(epochs) - 1, dtype=RECORD_DTYPE)
+        records['device'] = self._numbers[device_id]
+        records['epoch'] = epochs[1:]
+        self._pending += records.tobytes()
+        self._pending_records += len(records)
+        if self._pending_records >= self.group_size:
+            self.commit()
+
+    def commit(self):
+        """Write everything appended since the last commit."""
+        if not self._pending:
+            return
+        if self._new_device_ids:
+            # IDs reach the disk before any record that refers to them
+            if self._devices_file is None:
+                self._devices_file = open(os.path.join(self.directory, DEVICES_FILE), 'a', encoding='utf-8',
+                                          newline='\n')
+            self._devices_file.write(''.join(f"{_device_line(device_id)}\n" for device_id in self._new_device_ids))
+            self._devices_file.flush()
+            self._new_device_ids = []
+            if self.fsync:
+                os.fsync(self._devices_file.fileno())
+        segment = self._current_segment()
+        segment.write(self._pending)
+        segment.flush()
+        if self.fsync:
+            os.fsync(segment.fileno())
+        self._pending = bytearray()
+        self._pending_records = 0
+
+    def _current_segment(self):
+        if self._segment is None:
+            self._segment = open(self._segment_path(), 'ab')
+        if self._segment.tell() >= self.segment_bytes:
+            self._segment.close()
+            self._segment_number += 1
+            self._segment = open(self._segment_path(), 'ab')
+            self._drop_expired()
+        return self._segment
+
+    def _drop_expired(self):
+        """
+        Delete closed segments that hold nothing within the retention period;
+        returns the epoch older heartbeats are past it at, or None.
+        """
+        segments = self.segments()
+        newest = [(path, self._segment_newest(path)) for path in segments]
+        epochs = [epoch for _, epoch in newest if epoch is not None]
+        if self.retention is None or not epochs:
+            return None
+        cutoff = max(epochs) - self.retention
+        for path, epoch in newest[:-1]:  # the last segment is the one appended to
+            if epoch is not None and epoch < cutoff:
+                os.remove(path)
+                del self._newest[path]
+        return cutoff
+
+    def _segment_newest(self, path):
+        """Newest epoch in a segment, or None when it is empty; remembered once the segment is closed."""
+        if path in self._newest:
+            return self._newest[path]
+        with open(path, 'rb') as segment:
+            data = segment.read()
+        count = len(data) // RECORD.size
+        if not count:
+            newest = None
+        elif np is not None:
+            newest = int(np.frombuffer(data, dtype=RECORD_DTYPE, count=count)['epoch'].max())
+        else:
+            newest = max(epoch for _, epoch in RECORD.iter_unpack(memoryview(data)[:count * RECORD.size]))
+        if int(os.path.basename(path)[8:16]) < self._segment_number:
+            self._newest[path] = newest
+        return newest
+
+    def _segment_path(self):
+        return os.path.join(self.directory, SEGMENT_PATTERN.format(self._segment_number))
+
+    def close(self):
+        self.commit()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        if self._devices_file is not None:
+            self._devices_file.close()
+            self._devices_file = None
+
+    def read(self, since=None):
+        """
+        Every logged heartbeat as {device_id: ascending epochs}. With `since`,
+        segments whose newest heartbeat is older are skipped.
+        """
+        segments = self.segments()
+        if since is not None:
+            segments = [path for path, newest in zip(segments, map(self._segment_newest, segments))
+                        if newest is not None and newest >= since]
+        if np is None:
+            return self._read_with_struct(segments)
+        numbers, epochs = [], []
+        for path in segments:
+            with open(path, 'rb') as segment:
+                size = os.fstat(segment.fileno()).st_size // RECORD.size * RECORD.size
+                if not size:
+                    continue
+                with mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    records = np.frombuffer(mapped, dtype=RECORD_DTYPE, count=size // RECORD.size)
+                    numbers.append(records['device'].copy())
+                    epochs.append(records['epoch'].copy())
+                    del records  # release the buffer before the map closes
+        if not numbers:
+            return {}
+        numbers, epochs = np.concatenate(numbers), np.concatenate(epochs)
+        order = np.lexsort((epochs, numbers))
+        numbers, epochs = numbers[order], epochs[order]
+        starts = np.flatnonzero(np.diff(numbers, prepend=-1))
+        stops = np.append(starts[1:], len(numbers))
+        return {self.device_ids[number]: epochs[start:stop]
+                for number, start, stop in zip(numbers[starts].tolist(), starts, stops)
+                if number < len(self.device_ids)}
+
+    def _read_with_struct(self, segments):
+        by_device = defaultdict(list)
+        for path in segments:
+            with open(path, 'rb') as segment:
+                data = segment.read()
+            usable = len(data) // RECORD.size * RECORD.size  # drop a torn last record
+            for number, epoch in RECORD.iter_unpack(memoryview(data)[:usable]):
+                if number < len(self.device_ids):
+                    by_device[self.device_ids[number]].append(epoch)
+        return {device_id: sorted(epochs) for device_id, epochs in by_device.items()}
+
+    def replay(self, dashboard, progress=None, since=None):
+        """
+        Load the logged history into a dashboard; returns the number of
+        heartbeats read. Heartbeats past the retention period are skipped, and
+        segments holding only those deleted. With `since`, only heartbeats
+        after that epoch are loaded: a persistent storage backend already
+        holds the older ones. `progress`, if given, is called with the running
+        total after every device.
+        """
+        first = self._drop_expired()
+        if since is not None:
+            first = int(since) + 1 if first is None else max(first, int(since) + 1)
+        total = 0
+        for device_id, epochs in self.read(first).items():
+            if first is not None:
+                epochs = epochs_since(epochs, first)
+                if not len(epochs):
+                    continue
+            dashboard.load_device_epochs(device_id, epochs)
+            total += len(epochs)
+            if progress is not None:
+                progress(total)
+        return total
+
+
+def _device_line(device_id):
+    """A device ID as its line in devices.txt, JSON-encoded when it would not read back as written."""
+    if '\n' in device_id or '\r' in device_id or device_id.startswith('"'):
+        return json.dumps(device_id)
+    return device_id
@@ -0,0 +1,147 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+from assertpy import assert_that
+
+import HeartbeatLog as heartbeat_log
+from Dashboard import DashBoard
+from Heartbeat import HeartBeat
+from HeartbeatLog import HeartbeatLog, RECORD
+
+START = 1_700_000_000
+
+
+def heartbeat(device_id, epoch):
+    return HeartBeat(device_id, datetime.fromtimestamp(epoch, tz=timezone.utc))
+
+
+class HeartbeatLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def logged_dashboard(self, **log_options):
+        dashboard = DashBoard(heartbeat_interval=60)
+        dashboard.log = HeartbeatLog(self.directory.name, **log_options)
+        # Three days, device_b skipping every other heartbeat, applied in batches
+        for start in range(START, START + 3 * 86400, 7200):
+            dashboard.addHeartBeats([heartbeat(device_id, epoch)
+                                     for epoch in range(start, start + 7200, 60)
+                                     for device_id in ("device_a", "device_b")
+                                     if device_id == "device_a" or epoch // 60 % 2])
+        dashboard.log.close()
+        return dashboard
+
+    def test_replay_restores_history(self):
+        original = self.logged_dashboard()
+        now = START + 3 * 86400
+
+        restored = DashBoard(heartbeat_interval=60)
+        read = HeartbeatLog(self.directory.name).replay(restored)
+
+        assert_that(read).is_equal_to(3 * 1440 + 3 * 720)
+        for window in (3600, 86400, 2 * 86400):
+            for device_id in ("device_a", "device_b"):
+                assert_that(restored.uptime(device_id, now - window, now)).is_equal_to(
+                    original.uptime(device_id, now - window, now))
+        assert_that(restored.devices["device_a"].get_last_seen()).is_equal_to(
+            original.devices["device_a"].get_last_seen())
+        # The live device trims its raw heartbeats lazily, so it may still hold a few older ones
+        replayed = restored.heartbeats_for_device("device_b")
+        assert_that(replayed).is_length(30)
+        assert_that(replayed).is_equal_to(original.heartbeats_for_device("device_b")[-30:])
+
+    def test_replay_since_skips_what_storage_already_holds(self):
+        self.logged_dashboard()
+        since = START + 3 * 86400 - 3600
+
+        restored = DashBoard(heartbeat_interval=60)
+        read = HeartbeatLog(self.directory.name).replay(restored, since=since)
+
+        assert_that(read).is_equal_to(59 + 29)
+        assert_that(restored.devices["device_a"].first_seen_epoch).is_equal_to(since + 60)
+
+    def test_segments_rotate(self):
+        self.logged_dashboard(segment_bytes=16 * 1024, group_size=100)
+        log = HeartbeatLog(self.directory.name)
+
+        assert_that(len(log.segments())).is_greater_than(1)
+        assert_that(sum(len(epochs) for epochs in log.read().values())).is_equal_to(3 * 1440 + 3 * 720)
+
+    def test_segments_past_the_retention_period_are_deleted(self):
+        self.logged_dashboard(segment_bytes=4096, group_size=100, retention=86400)
+        log = HeartbeatLog(self.directory.name, retention=86400)
+        oldest = min(int(epochs[0]) for epochs in log.read().values())
+
+        # A segment holds about four hours, and is only deleted once the next one is started
+        assert_that(oldest).is_between(START + 2 * 86400 - 12 * 3600, START + 2 * 86400)
+        assert_that(len(log.segments())).is_less_than(10)
+
+    def test_replay_skips_heartbeats_past_the_retention_period(self):
+        self.logged_dashboard(segment_bytes=16 * 1024, group_size=100, retention=None)
+        log = HeartbeatLog(self.directory.name, retention=86400)
+        segments = len(log.segments())
+
+        restored = DashBoard(heartbeat_interval=60)
+        read = log.replay(restored)
+
+        newest = START + 3 * 86400 - 60
+        assert_that(read).is_equal_to(1441 + 720)
+        assert_that(restored.devices["device_a"].first_seen_epoch).is_equal_to(newest - 86400)
+        assert_that(len(log.segments())).is_less_than(segments)
+
+    def test_torn_last_record_is_ignored(self):
+        log = HeartbeatLog(self.directory.name)
+        log.append("device_a", START)
+        log.close()
+        with open(log.segments()[-1], 'ab') as segment:
+            segment.write(RECORD.pack(0, START + 60)[:5])
+
+        assert_that(HeartbeatLog(self.directory.name).read()["device_a"].tolist()).is_equal_to([START])
+
+    def test_reopened_log_appends_to_known_devices(self):
+        log = HeartbeatLog(self.directory.name)
+        log.append("device_a", START)
+        log.close()
+        log = HeartbeatLog(self.directory.name)
+        log.append("device_a", START + 60)
+        log.append("device_b", START + 60)
+        log.close()
+
+        with open(os.path.join(self.directory.name, heartbeat_log.DEVICES_FILE)) as devices:
+            assert_that(devices.read()).is_equal_to("device_a\ndevice_b\n")
+        assert_that(list(HeartbeatLog(self.directory.name).read()["device_a"])).is_equal_to([START, START + 60])
+
+    def test_device_ids_with_line_breaks_keep_their_own_line(self):
+        log = HeartbeatLog(self.directory.name)
+        log.append("evil\nx", START)
+        log.append('"quoted"', START + 5)
+        log.append("good", START + 10)
+        log.close()
+
+        by_device = HeartbeatLog(self.directory.name).read()
+
+        assert_that({device_id: epochs.tolist() for device_id, epochs in by_device.items()}).is_equal_to(
+            {"evil\nx": [START], '"quoted"': [START + 5], "good": [START + 10]})
+
+    def test_reading_leaves_the_devices_file_alone(self):
+        log = HeartbeatLog(self.directory.name)
+        log.read()
+
+        assert_that(os.path.exists(os.path.join(self.directory.name, heartbeat_log.DEVICES_FILE))).is_false()
+        log.close()
+
+    def test_read_without_numpy(self):
+        self.logged_dashboard()
+        with mock.patch.object(heartbeat_log, "np", None):
+            by_device = HeartbeatLog(self.directory.name).read()
+
+        assert_that(by_device["device_a"]).is_length(3 * 1440)
+        assert_that(by_device["device_b"]).is_length(3 * 720)
+
+
+if __name__ == '__main__':
+    unittest.main()
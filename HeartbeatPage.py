@@ -0,0 +1,56 @@
+from bisect import bisect_left
+from collections.abc import Sequence
+from datetime import datetime, timezone
+
+from Heartbeat import HeartBeat
+
+
+class HeartbeatPage(Sequence):
+    """
+    One page of a device's raw heartbeats, oldest first.
+
+    `epochs` is a read-only view of the device's store (see
+    HeartbeatStore.between) rather than a copy, or the rows of one range
+    scan with SQLiteStorage; HeartBeat objects are only built for the items
+    that are read. Pass `next_cursor` back to get the page
+    after this one; it is None on the last page.
+    """
+
+    def __init__(self, device_id, epochs=(), next_cursor=None):
+        self.device_id = device_id
+        self.epochs = epochs
+        self.next_cursor = next_cursor
+
+    @classmethod
+    def of(cls, device_id, epochs, limit=None, cursor=None):
+        """
+        The first `limit` of `epochs`, which start where `cursor` points and
+        hold more than `limit` items when there is a next page.
+        """
+        if limit is None or len(epochs) <= limit:
+            return cls(device_id, epochs)
+        page = epochs[:limit]
+        last = int(page[-1])
+        returned = limit - bisect_left(page, last)
+        if cursor is not None and last == cursor[0]:
+            returned += cursor[1]  # the page did not get past the cursor's epoch
+        return cls(device_id, page, (last, returned))
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._heartbeat(epoch) for epoch in self.epochs[index]]
+        return self._heartbeat(self.epochs[index])
+
+    def _heartbeat(self, epoch):
+        return HeartBeat(self.device_id, datetime.fromtimestamp(int(epoch), tz=timezone.utc))
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f"HeartbeatPage({self.device_id!r}, {len(self)} heartbeats, next_cursor={self.next_cursor!r})"
@@ -0,0 +1,223 @@
+from array import array
+from bisect import bisect_left, insort
+from heapq import heapify, heappop, heappush
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the stdlib array module is the fallback
+    np = None
+
+DEFAULT_LATENESS = 30  # seconds a device's heartbeats may arrive out of order and still be appended in order
+REORDER_CAPACITY = 1024  # most heartbeats waiting for the watermark; beyond it the oldest is released anyway
+
+
+class HeartbeatStore:
+    """
+    Compact, growable column of heartbeat timestamps as int64 epoch seconds,
+    kept in time order so ranges are found by binary search.
+
+    Slots below len(store) are never rewritten in place: appends only write
+    past the end, and a heartbeat older than the newest one, a trim or an
+    out-of-order extend builds a new buffer. Views handed out by between()
+    therefore never change under the reader.
+
+    With a `lateness` of L seconds, appended heartbeats first wait in a
+    bounded reorder buffer (a heap) until the newest heartbeat is L seconds
+    ahead of them, the watermark, and are then released to the buffer in
+    time order. Heartbeats up to L seconds out of order thus cost a heap
+    push and pop instead of a new buffer; only one behind what was already
+    released takes that slower path, and is counted in `late`. Every read
+    includes the waiting heartbeats.
+    """
+
+    def __init__(self, capacity=16, use_numpy=None, lateness=0, reorder_capacity=REORDER_CAPACITY):
+        if use_numpy is None:
+            use_numpy = np is not None
+        if use_numpy and np is None:
+            raise ImportError("numpy is not installed")
+        self.use_numpy = use_numpy
+        self.lateness = lateness
+        self.reorder_capacity = reorder_capacity
+        self.late = 0  # heartbeats that arrived behind the watermark and were merged into place
+        self._pending = []  # heap of heartbeats waiting for the watermark
+        self._newest = None
+        self._n = 0
+        # Odd while trim() rebuilds the buffer, so readers on other threads can retry
+        self._generation = 0
+        if use_numpy:
+            self._buf = np.empty(max(capacity, 1), dtype=np.int64)
+        else:
+            self._buf = array('q')
+
+    def append(self, epoch):
+        if self._n and epoch < self._buf[self._n - 1]:
+            self.late += 1
+            self._insert(epoch)
+            return
+        if not self.lateness:
+            self._put(epoch)
+            return
+        heappush(self._pending, epoch)
+        if self._newest is None or epoch > self._newest:
+            self._newest = epoch
+        self._release(self._newest - self.lateness)
+
+    def _release(self, watermark):
+        """Move the waiting heartbeats up to `watermark`, and any over capacity, to the buffer, oldest first."""
+        pending = self._pending
+        if not pending or (pending[0] > watermark and len(pending) <= self.reorder_capacity):
+            return
+        self._generation += 1
+        while pending and (pending[0] <= watermark or len(pending) > self.reorder_capacity):
+            self._put(heappop(pending))
+        self._generation += 1
+
+    def _put(self, epoch):
+        if not self.use_numpy:
+            self._buf.append(epoch)
+            self._n += 1
+            return
+        if self._n == len(self._buf):
+            self._grow(self._n + 1)
+        self._buf[self._n] = epoch
+        self._n += 1
+
+    def _insert(self, epoch):
+        # Late heartbeats are rare; a new buffer keeps published slots unchanged
+        self._generation += 1
+        if self.use_numpy:
+            kept = self._buf[:self._n]
+            at = int(np.searchsorted(kept, epoch, side='right'))
+            grown = np.empty(max(2 * (self._n + 1), 16), dtype=np.int64)
+            grown[:at] = kept[:at]
+            grown[at] = epoch
+            grown[at + 1:self._n + 1] = kept[at:]
+            self._buf = grown
+        else:
+            insort(self._buf, epoch)  # the array fallback never hands out views
+        self._n += 1
+        self._generation += 1
+
+    def extend(self, epochs):
+        """Add ascending epochs; ones older than the newest stored are merged into place."""
+        if len(epochs) == 0:
+            return
+        self._release(float('inf'))  # a batch is already in order; nothing waits behind it
+        if self._newest is None or epochs[-1] > self._newest:
+            self._newest = int(epochs[-1])
+        if self._n and epochs[0] < self._buf[self._n - 1]:
+            self.late += bisect_left(epochs, self._buf[self._n - 1])
+            self._merge(epochs)
+            return
+        if not self.use_numpy:
+            self._buf.extend(int(epoch) for epoch in epochs)
+            self._n = len(self._buf)
+            return
+        epochs = np.asarray(epochs, dtype=np.int64)
+        needed = self._n + len(epochs)
+        if needed > len(self._buf):
+            self._grow(needed)
+        self._buf[self._n:needed] = epochs
+        self._n = needed
+
+    def _merge(self, epochs):
+        self._generation += 1
+        if self.use_numpy:
+            merged = np.sort(np.concatenate([self._buf[:self._n], np.asarray(epochs, dtype=np.int64)]), kind='stable')
+            self._buf = np.empty(max(2 * len(merged), 16), dtype=np.int64)
+            self._buf[:len(merged)] = merged
+            self._n = len(merged)
+        else:
+            self._buf = array('q', sorted(list(self._buf) + [int(epoch) for epoch in epochs]))
+            self._n = len(self._buf)
+        self._generation += 1
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self._buf))
+        grown = np.empty(capacity, dtype=np.int64)
+        grown[:self._n] = self._buf[:self._n]
+        self._buf = grown
+
+    def trim(self, before):
+        """Drop every epoch older than `before`."""
+        self._generation += 1
+        if self._pending and self._pending[0] < before:
+            self._pending = [epoch for epoch in self._pending if epoch >= before]
+            heapify(self._pending)
+        if self.use_numpy:
+            kept = self._buf[:self._n]
+            kept = kept[int(np.searchsorted(kept, before)):]
+            self._buf = np.empty(max(2 * len(kept), 16), dtype=np.int64)
+            self._buf[:len(kept)] = kept
+            self._n = len(kept)
+        else:
+            self._buf = self._buf[bisect_left(self._buf, before, 0, self._n):self._n]
+            self._n = len(self._buf)
+        self._generation += 1
+
+    def values(self):
+        """
+        Return the stored epochs as a list of ints. Safe to call while
+        another thread appends: appends only publish a slot after writing it,
+        and reads that overlap a trim or a rebuild are retried.
+        """
+        while True:
+            generation = self._generation
+            n, buf, pending = self._n, self._buf, list(self._pending)  # a grown buffer holds at least the first n slots
+            values = buf[:n].tolist()
+            if generation % 2 == 0 and generation == self._generation:
+                return values + sorted(pending)
+
+    def between(self, start=None, end=None):
+        """
+        Epochs in [start, end), oldest first, found by binary search. With
+        numpy this is a read-only view of the buffer, not a copy; the array
+        fallback copies just that range.
+        """
+        while True:
+            generation = self._generation
+            n, buf, pending = self._n, self._buf, list(self._pending)
+            if self.use_numpy:
+                low = 0 if start is None else int(np.searchsorted(buf[:n], start))
+                high = n if end is None else int(np.searchsorted(buf[:n], end))
+                epochs = buf[low:max(low, high)]
+                epochs.flags.writeable = False
+            else:
+                low = 0 if start is None else bisect_left(buf, start, 0, n)
+                high = n if end is None else bisect_left(buf, end, 0, n)
+                epochs = buf[low:max(low, high)]
+            if generation % 2 == 0 and generation == self._generation:
+                waiting = sorted(epoch for epoch in pending
+                                 if (start is None or epoch >= start) and (end is None or epoch < end))
+                if not waiting:
+                    return epochs
+                if self.use_numpy:  # waiting heartbeats are newer than every released one, so they go last
+                    epochs = np.concatenate([epochs, np.array(waiting, dtype=np.int64)])
+                    epochs.flags.writeable = False
+                    return epochs
+                return epochs + array('q', waiting)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the backing buffer."""
+        waiting = 8 * len(self._pending)
+        if self.use_numpy:
+            return self._buf.nbytes + waiting
+        return self._buf.buffer_info()[1] * self._buf.itemsize + waiting
+
+    def __len__(self):
+        return self._n + len(self._pending)
+
+    def __iter__(self):
+        return iter(self.values())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.values()[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("heartbeat index out of range")
+        if index >= self._n:
+            return sorted(self._pending)[index - self._n]
+        return int(self._buf[index])
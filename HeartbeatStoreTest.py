@@ -0,0 +1,87 @@
+import unittest
+from assertpy import assert_that
+
+from HeartbeatStore import HeartbeatStore, np
+
+
+class HeartbeatStoreTest(unittest.TestCase):
+    def stores(self):
+        stores = [HeartbeatStore(capacity=2, use_numpy=False)]
+        if np is not None:
+            stores.append(HeartbeatStore(capacity=2, use_numpy=True))
+        return stores
+
+    def test_append_grows_past_capacity(self):
+        for store in self.stores():
+            for epoch in range(100, 105):
+                store.append(epoch)
+            assert_that(len(store)).is_equal_to(5)
+            assert_that(store.values()).is_equal_to([100, 101, 102, 103, 104])
+
+    def test_extend_and_index(self):
+        for store in self.stores():
+            store.append(1)
+            store.extend([2, 3, 4])
+            assert_that(store[0]).is_equal_to(1)
+            assert_that(store[-1]).is_equal_to(4)
+            assert_that(store[1:3]).is_equal_to([2, 3])
+
+    def test_index_out_of_range(self):
+        for store in self.stores():
+            with self.assertRaises(IndexError):
+                store[0]
+
+    def test_late_heartbeats_are_kept_in_time_order(self):
+        for store in self.stores():
+            store.extend([10, 20, 30])
+            store.append(15)
+            store.extend([5, 40])
+            assert_that(store.values()).is_equal_to([5, 10, 15, 20, 30, 40])
+
+    def test_between_finds_a_range_without_touching_the_rest(self):
+        for store in self.stores():
+            store.extend(range(0, 100, 10))
+            assert_that(list(store.between(25, 60))).is_equal_to([30, 40, 50])
+            assert_that(list(store.between(None, 20))).is_equal_to([0, 10])
+            assert_that(list(store.between(95))).is_empty()
+
+    def test_between_views_do_not_change_when_the_store_does(self):
+        if np is None:
+            return
+        store = HeartbeatStore(use_numpy=True)
+        store.extend([10, 20, 30])
+        view = store.between(0, 100)
+        store.append(15)
+        store.trim(20)
+
+        assert_that(view.tolist()).is_equal_to([10, 20, 30])
+        assert_that(view.flags.writeable).is_false()
+
+    def test_reorder_buffer_appends_within_the_watermark_in_order(self):
+        for use_numpy in (False, True) if np is not None else (False,):
+            store = HeartbeatStore(use_numpy=use_numpy, lateness=10)
+            for epoch in (100, 105, 102, 110, 108, 120, 99):
+                store.append(epoch)
+
+            assert_that(store.values()).is_equal_to([99, 100, 102, 105, 108, 110, 120])
+            assert_that(store.late).is_equal_to(1)  # 99 arrived after 100 was released
+            assert_that(list(store.between(101, 115))).is_equal_to([102, 105, 108, 110])
+            assert_that(len(store)).is_equal_to(7)
+            assert_that(store[-1]).is_equal_to(120)  # still waiting for the watermark
+
+    def test_reorder_buffer_is_bounded(self):
+        store = HeartbeatStore(use_numpy=False, lateness=1000, reorder_capacity=4)
+        for epoch in range(10):
+            store.append(epoch)
+
+        assert_that(store._pending).is_length(4)
+        assert_that(store.values()).is_equal_to(list(range(10)))
+
+    def test_values_are_plain_ints(self):
+        for store in self.stores():
+            store.append(1_700_000_000)
+            assert_that(type(store.values()[0])).is_equal_to(int)
+
+
+if __name__ == '__main__':
+    unittest.main()
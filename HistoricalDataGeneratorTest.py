@@ -0,0 +1,61 @@
+import unittest
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from assertpy import assert_that
+
+from Dashboard import DashBoard
+from historical_data_generator import DEVICES, HistoricalDataGenerator, scaled_fleet
+
+END = datetime(2024, 1, 31, tzinfo=timezone.utc)
+
+
+def columns(generator, chunk_size=10_000):
+    chunks = list(generator.generate_chunks(chunk_size))
+    return np.concatenate([ids for ids, _ in chunks]), np.concatenate([epochs for _, epochs in chunks]), len(chunks)
+
+
+class HistoricalDataGeneratorTest(unittest.TestCase):
+    def test_scaled_fleet_keeps_the_device_mix(self):
+        fleet = scaled_fleet(1200)
+
+        assert_that(fleet).is_length(1200)
+        assert_that(len({device["id"] for device in fleet})).is_equal_to(1200)
+        assert_that(Counter(device["status"] for device in fleet)).is_equal_to(
+            Counter({status: count * 100 for status, count in Counter(d["status"] for d in DEVICES).items()}))
+
+    def test_chunks_are_time_ordered_and_seeded(self):
+        ids, epochs, chunk_count = columns(HistoricalDataGenerator(days=3, seed=7, end_time=END))
+        again, again_epochs, _ = columns(HistoricalDataGenerator(days=3, seed=7, end_time=END))
+
+        assert_that(chunk_count).is_greater_than(1)
+        assert_that(bool(np.all(np.diff(epochs) >= 0))).is_true()
+        assert_that(ids.tolist()).is_equal_to(again.tolist())
+        assert_that(epochs.tolist()).is_equal_to(again_epochs.tolist())
+
+    def test_chunks_follow_each_device_profile(self):
+        generator = HistoricalDataGenerator(days=30, seed=1, end_time=END)
+        ids, epochs, _ = columns(generator, chunk_size=100_000)
+        ticks = 30 * 86400 // 10 + 1
+        sent = Counter(ids.tolist())
+
+        assert_that(sent["device_001"]).is_equal_to(ticks)
+        assert_that(sent["device_010"] / ticks).is_close_to(0.60, tolerance=0.01)
+        assert_that(int(epochs[ids == "device_011"].max())).is_less_than(int((END - timedelta(days=16)).timestamp()))
+        assert_that(int(epochs[ids == "device_012"].min())).is_equal_to(int((END - timedelta(days=7)).timestamp()))
+
+    def test_chunks_bulk_load_into_a_dashboard(self):
+        generator = HistoricalDataGenerator(days=1, seed=3, devices=scaled_fleet(120), end_time=END)
+        dash = DashBoard()
+        loaded = dash.bulk_load(generator.generate_chunks(chunk_size=50_000))
+        now = END.timestamp() + 1
+
+        assert_that(loaded).is_greater_than(120 * 8000)
+        assert_that(dash.devices).is_length(120)
+        assert_that(dash.uptime("device_000001", now - 3600, now)).is_equal_to(100)
+        assert_that(dash.uptime("device_000010", now - 3600, now)).is_close_to(60, tolerance=8)
+
+
+if __name__ == '__main__':
+    unittest.main()
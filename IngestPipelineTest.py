@@ -0,0 +1,104 @@
+import json
+import time
+import unittest
+from types import SimpleNamespace
+
+from assertpy import assert_that
+
+from Dashboard import DashBoard
+from ingest_pipeline import IngestPipeline
+from mqtt_client import MQTTHeartbeatClient
+
+
+def payload(device_id, timestamp=1_700_000_000):
+    return json.dumps({"device_id": device_id, "timestamp": timestamp}).encode()
+
+
+class IngestPipelineTest(unittest.TestCase):
+    def test_on_message_only_enqueues(self):
+        dashboard = DashBoard()
+        client = MQTTHeartbeatClient(dashboard)
+
+        client.on_message(None, None, SimpleNamespace(topic="device/heartbeat/a", payload=payload("a")))
+
+        assert_that(client.pipeline.backlog()).is_equal_to(1)
+        assert_that(dashboard.devices).is_empty()
+
+    def test_worker_applies_queued_payloads_in_batches(self):
+        dashboard = DashBoard()
+        pipeline = IngestPipeline(dashboard, batch_size=10, flush_interval=0.01)
+        for i in range(25):
+            pipeline.submit(payload(f"device_{i % 5}", 1_700_000_000 + 10 * i))
+
+        pipeline.start()
+        pipeline.stop()
+
+        assert_that(dashboard.devices).is_length(5)
+        assert_that(pipeline.stats.parsed).is_equal_to(25)
+        assert_that(pipeline.stats.batches).is_greater_than_or_equal_to(3)
+
+    def test_bad_payloads_are_counted_as_rejected(self):
+        pipeline = IngestPipeline(DashBoard())
+        pipeline.apply([b"not json", b"[]", json.dumps({"device_id": "a"}).encode(), payload("a")])
+
+        assert_that(pipeline.stats.as_dict()).contains_entry({'rejected': 3}, {'parsed': 1})
+
+    def test_topic_levels_above_the_device_name_its_group(self):
+        dashboard = DashBoard()
+        pipeline = IngestPipeline(dashboard)
+
+        pipeline.apply([payload("a"), payload("b")], ["device/heartbeat/north/rack1/a", "device/heartbeat/b"])
+
+        assert_that(dashboard.groups.name_of("a")).is_equal_to("north/rack1")
+        assert_that(dashboard.groups.name_of("b")).is_equal_to("")
+
+    def test_numeric_device_id_is_rejected_and_ingest_goes_on(self):
+        dashboard = DashBoard()
+        pipeline = IngestPipeline(dashboard, flush_interval=0.01)
+        pipeline.start()
+        self.addCleanup(pipeline.stop)
+
+        pipeline.submit(json.dumps({"device_id": 42, "timestamp": 1_700_000_000}).encode())
+        pipeline.submit(payload("a"))
+        pipeline.stop()
+
+        assert_that(pipeline.stats.as_dict()).contains_entry({'rejected': 1}, {'parsed': 1}, {'errors': 0})
+        assert_that(dashboard.view_records()).extracting('device_id').is_equal_to(["a"])
+
+    def test_a_failing_batch_does_not_stop_the_worker(self):
+        dashboard = DashBoard()
+        pipeline = IngestPipeline(dashboard, flush_interval=0.01)
+        add_heartbeats = dashboard.addHeartBeats
+        calls = []
+
+        def fail_once(heartbeats):
+            calls.append(len(heartbeats))
+            if len(calls) == 1:
+                raise TypeError("unorderable device id")
+            add_heartbeats(heartbeats)
+
+        dashboard.addHeartBeats = fail_once
+        with self.assertLogs("ingest_pipeline", "ERROR"):
+            pipeline.start()
+            pipeline.submit(payload("a"))
+            time.sleep(0.1)
+            pipeline.submit(payload("b"))
+            pipeline.stop()
+
+        assert_that(pipeline.stats.errors).is_equal_to(1)
+        assert_that(dashboard.devices).contains_key("b")
+
+    def test_full_queue_drops_under_drop_policy(self):
+        pipeline = IngestPipeline(DashBoard(), max_queue=2, full_policy="drop")
+        results = [pipeline.submit(payload("a")) for _ in range(3)]
+
+        assert_that(results).is_equal_to([True, True, False])
+        assert_that(pipeline.stats.as_dict()).contains_entry({'received': 3}, {'dropped': 1})
+
+    def test_unknown_full_policy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            IngestPipeline(DashBoard(), full_policy="shrug")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+from collections import Counter
+
+from assertpy import assert_that
+
+import heartbeat_codec
+from Dashboard import DashBoard
+from ingest_pipeline import IngestPipeline
+from load_generator import LoadGenerator, LoadProfile, LocalBroker, VirtualDevices
+from mqtt_client import MQTTHeartbeatClient
+from sharded_ingest import partition_for
+
+START = 1_700_000_000
+
+
+class LoadGeneratorTest(unittest.TestCase):
+    def test_every_device_sends_once_per_interval(self):
+        devices = VirtualDevices(LoadProfile(devices=100, interval=10, jitter=0.1), start=START)
+
+        indexes, epochs = devices.advance(START + 100)
+
+        per_device = Counter(indexes.tolist())
+        assert_that(set(per_device)).is_length(100)
+        assert_that(min(per_device.values())).is_greater_than_or_equal_to(9)
+        assert_that(max(per_device.values())).is_less_than_or_equal_to(12)
+        assert_that(list(epochs)).is_sorted()
+        assert_that(epochs.max()).is_less_than_or_equal_to(START + 100)
+
+    def test_outages_silence_devices_and_duplicates_repeat_heartbeats(self):
+        quiet = VirtualDevices(LoadProfile(devices=100, interval=10, outage_rate=0.5, outage_seconds=50), start=START)
+        noisy = VirtualDevices(LoadProfile(devices=100, interval=10, duplicate_rate=0.5), start=START)
+
+        quiet_indexes, _ = quiet.advance(START + 100)
+        noisy_indexes, noisy_epochs = noisy.advance(START + 100)
+
+        assert_that(len(quiet_indexes)).is_less_than(500)
+        repeated = Counter(zip(noisy_indexes.tolist(), noisy_epochs.tolist()))
+        assert_that(max(repeated.values())).is_equal_to(2)
+        assert_that(len(noisy_indexes)).is_greater_than(1300)
+
+    def test_workers_split_the_fleet(self):
+        profile = LoadProfile(devices=10)
+        ids = [set(VirtualDevices(profile, worker, 3, START).device_ids) for worker in range(3)]
+
+        assert_that(set.union(*ids)).is_length(10)
+        assert_that(sum(len(worker_ids) for worker_ids in ids)).is_equal_to(10)
+
+    def test_binary_messages_pack_a_batch_each(self):
+        profile = LoadProfile(devices=100, interval=10, jitter=0, binary=True, batch_size=40)
+        devices = VirtualDevices(profile, start=START)
+
+        messages = devices.messages(*devices.advance(START + 10))
+
+        assert_that([len(heartbeat_codec.decode(payload)) for _, payload in messages]).is_equal_to([40, 40, 20])
+
+    def test_partitioned_binary_batches_hold_one_partitions_devices(self):
+        profile = LoadProfile(devices=100, interval=10, jitter=0, binary=True, batch_size=40, partitioned=True)
+        devices = VirtualDevices(profile, start=START)
+
+        messages = devices.messages(*devices.advance(START + 10))
+
+        for topic, payload in messages:
+            partition = int(topic.split("/")[2])
+            partitions = {partition_for(device_id) for device_id, _ in heartbeat_codec.decode(payload)}
+            assert_that(partitions).is_equal_to({partition})
+            assert_that(topic).is_equal_to(f"device/partition/{partition}/bin")
+        assert_that(sum(len(heartbeat_codec.decode(payload)) for _, payload in messages)).is_equal_to(100)
+
+    def test_local_broker_delivers_worker_load_to_the_client(self):
+        dashboard = DashBoard()
+        client = MQTTHeartbeatClient(dashboard, pipeline=IngestPipeline(dashboard, full_policy="block"))
+        broker = LocalBroker()
+        broker.subscribe(client)
+        generator = LoadGenerator(LoadProfile(devices=50, interval=10, speed=0), workers=2, inbox=broker.inbox)
+        client.pipeline.start()
+        broker.start()
+
+        generator.start(duration=30, start=START)
+        generator.join(timeout=30)
+        broker.stop()
+        client.pipeline.stop()
+
+        assert_that(broker.delivered).is_equal_to(generator.sent)
+        assert_that(client.pipeline.stats.parsed).is_equal_to(generator.sent)
+        assert_that(dashboard.devices).is_length(50)
+
+
+if __name__ == '__main__':
+    unittest.main()
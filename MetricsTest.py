@@ -0,0 +1,86 @@
+import threading
+import unittest
+from datetime import datetime, timezone
+
+from assertpy import assert_that
+
+from Dashboard import DashBoard
+from Heartbeat import HeartBeat
+from metrics import ADD_BATCH_SECONDS, Histogram, Registry, instrument
+
+
+def samples(text):
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+
+class MetricsTest(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5, count=2)
+        histogram.observe(3.0)
+
+        assert_that(dict(histogram.samples())).is_equal_to({
+            'latency_seconds_bucket{le="0.1"}': 1, 'latency_seconds_bucket{le="1.0"}': 3,
+            'latency_seconds_bucket{le="+Inf"}': 4, 'latency_seconds_sum': 4.05, 'latency_seconds_count': 4})
+
+    def test_every_thread_counts_into_its_own_cells(self):
+        histogram = Histogram("work_seconds", "Work", buckets=(1.0,))
+
+        def observe():
+            for _ in range(1000):
+                histogram.observe(0.5)
+        threads = [threading.Thread(target=observe) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert_that(dict(histogram.samples())['work_seconds_count']).is_equal_to(4000)
+
+    def test_cells_of_exited_threads_are_folded_into_a_total(self):
+        histogram = Histogram("work_seconds", "Work", buckets=(1.0,))
+
+        for _ in range(10):
+            threads = [threading.Thread(target=histogram.observe, args=(0.5,)) for _ in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert_that(len(histogram._cells._cells)).is_less_than_or_equal_to(20)
+        assert_that(dict(histogram.samples())).contains_entry(
+            {'work_seconds_count': 200}, {'work_seconds_sum': 100.0})
+
+    def test_instrumented_dashboard_is_rendered_in_text_format(self):
+        registry = Registry()
+        dash = DashBoard()
+        dash.addHeartBeats([HeartBeat("Patrick", datetime(2024, 1, 1, tzinfo=timezone.utc))])
+        instrument(dash, lambda: [{'received': 3, 'rejected': 1, 'parsed': 2}], lambda: True, registry)
+
+        text = registry.render()
+
+        assert_that(text).contains("# TYPE heartbeat_parse_errors_total counter\n")
+        assert_that(samples(text)).contains_entry({'heartbeat_messages_received_total': '3.0'},
+                                                  {'heartbeat_devices': '1.0'},
+                                                  {'heartbeat_stored_heartbeats': '1.0'},
+                                                  {'heartbeat_mqtt_connected': '1.0'})
+
+    def test_a_batch_of_heartbeats_is_one_observation(self):
+        before = dict(ADD_BATCH_SECONDS.samples())
+        DashBoard().addHeartBeats([HeartBeat("Patrick", datetime(2024, 1, 1, second=second, tzinfo=timezone.utc))
+                                   for second in range(5)])
+
+        after = dict(ADD_BATCH_SECONDS.samples())
+        assert_that(after['heartbeat_add_batch_seconds_count'] - before.get('heartbeat_add_batch_seconds_count', 0)) \
+            .is_equal_to(1)
+
+    def test_metrics_without_a_value_are_left_out(self):
+        registry = Registry()
+        registry.gauge("unknown", "Not known yet", lambda: None)
+
+        assert_that(registry.render().strip()).is_empty()
+
+
+if __name__ == '__main__':
+    unittest.main()
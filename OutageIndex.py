@@ -0,0 +1,160 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class OutageIndex:
+    """
+    A device's outages: every gap of more than `timeout` seconds between two
+    consecutive heartbeats, as sorted, disjoint (start, end) intervals from
+    the last heartbeat before the gap to the first one after it.
+
+    Only the first and last heartbeat and the outages themselves are kept.
+    A heartbeat after the last one appends an outage when it ends a gap, in
+    O(1). A late heartbeat can only change the outage it falls inside of: it
+    splits it in two, and pieces no longer than `timeout` are dropped, so a
+    late arrival that fills a gap closes it. Queries over a range find their
+    first and last outage with binary searches, O(log n + k) for k outages.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.first = None  # epoch of the oldest heartbeat
+        self.last = None  # epoch of the newest heartbeat
+        self._starts = array('q')
+        self._ends = array('q')  # ascending too, as the outages are disjoint
+        self.version = 0  # bumped whenever an outage is added, changed or forgotten
+
+    def __len__(self):
+        return len(self._starts)
+
+    def add(self, epoch):
+        """Record a heartbeat at `epoch` seconds."""
+        epoch = int(epoch)
+        if self.first is None:
+            self.first = self.last = epoch
+        elif epoch > self.last:
+            if epoch - self.last > self.timeout:
+                self._starts.append(self.last)
+                self._ends.append(epoch)
+                self.version += 1
+            self.last = epoch
+        elif epoch < self.first:
+            if self.first - epoch > self.timeout:
+                self._starts.insert(0, epoch)
+                self._ends.insert(0, self.first)
+                self.version += 1
+            self.first = epoch
+        else:
+            i = bisect_right(self._starts, epoch) - 1
+            if i < 0 or epoch >= self._ends[i]:
+                return  # between heartbeats that are close enough already
+            start, end = self._starts[i], self._ends[i]
+            pieces = [(s, e) for s, e in ((start, epoch), (epoch, end)) if e - s > self.timeout]
+            self._starts[i:i + 1] = array('q', [s for s, _ in pieces])
+            self._ends[i:i + 1] = array('q', [e for _, e in pieces])
+            self.version += 1
+
+    def extend(self, epochs):
+        """Record ascending epochs; when they all follow the last heartbeat, the gaps are found in one pass."""
+        if len(epochs) == 0:
+            return
+        epochs = epochs.tolist() if hasattr(epochs, 'tolist') else list(epochs)
+        if self.last is None or epochs[0] <= self.last:
+            for epoch in epochs:
+                self.add(epoch)
+            return
+        previous = [self.last] + epochs[:-1]
+        for start, end in zip(previous, epochs):
+            if end - start > self.timeout:
+                self._starts.append(int(start))
+                self._ends.append(int(end))
+                self.version += 1
+        self.last = int(epochs[-1])
+
+    def between(self, start, end):
+        """The outages overlapping [start, end), oldest first."""
+        low, high = self._span(start, end)
+        return list(zip(self._starts[low:high], self._ends[low:high]))
+
+    def count(self, start, end):
+        """Number of outages overlapping [start, end), in O(log n)."""
+        low, high = self._span(start, end)
+        return high - low
+
+    def next_end(self, after):
+        """End of the first outage that ends after `after`, or None."""
+        position = bisect_right(self._ends, after)
+        return self._ends[position] if position < len(self._ends) else None
+
+    def latest(self):
+        """The most recent outage, or None."""
+        return (self._starts[-1], self._ends[-1]) if self._starts else None
+
+    def downtime(self, start, end):
+        """Seconds of [start, end) spent in outages."""
+        return sum(min(e, end) - max(s, start) for s, e in self.between(start, end))
+
+    def mttr(self, start, end):
+        """Mean time to repair: mean seconds per outage within [start, end), or None without outages."""
+        outages = self.count(start, end)
+        return self.downtime(start, end) / outages if outages else None
+
+    def mtbf(self, start, end):
+        """
+        Mean time between failures: seconds between the first and last
+        heartbeat within [start, end) not spent in outages, per outage, or
+        None without outages.
+        """
+        outages = self.count(start, end)
+        if not outages:
+            return None
+        observed = min(end, self.last) - max(start, self.first)
+        return (observed - self.downtime(start, end)) / outages
+
+    def trim(self, before):
+        """Forget the outages that ended before `before`."""
+        dead = bisect_left(self._ends, before)
+        if dead:
+            del self._starts[:dead]
+            del self._ends[:dead]
+            self.version += 1
+
+    def freeze(self, previous=None):
+        """
+        A copy for readers on other threads, e.g. in a DashboardSnapshot; it
+        is never changed. The outages of `previous`, an older frozen copy, are
+        shared when none changed since, so only the first and last heartbeat
+        are copied.
+        """
+        copy = OutageIndex(self.timeout)
+        copy.first, copy.last, copy.version = self.first, self.last, self.version
+        if previous is not None and (previous.version, previous.timeout) == (self.version, self.timeout):
+            copy._starts, copy._ends = previous._starts, previous._ends
+        else:
+            copy._starts, copy._ends = array('q', self._starts), array('q', self._ends)
+        return copy
+
+    def with_timeout(self, timeout, recent=()):
+        """
+        A copy for another timeout. The outages longer than it are kept; gaps
+        no longer than the current timeout were never recorded, so for a
+        shorter one they are found between `recent`, ascending heartbeats at
+        the end of the history, and are lost before those.
+        """
+        outages = [(s, e) for s, e in zip(self._starts, self._ends) if e - s > timeout]
+        if timeout < self.timeout:
+            recent = recent.tolist() if hasattr(recent, 'tolist') else list(recent)
+            outages = sorted(outages + [(int(s), int(e)) for s, e in zip(recent, recent[1:])
+                                        if timeout < e - s <= self.timeout])
+        copy = OutageIndex(timeout)
+        copy.first, copy.last, copy.version = self.first, self.last, self.version + 1
+        copy._starts = array('q', [s for s, _ in outages])
+        copy._ends = array('q', [e for _, e in outages])
+        return copy
+
+    def _span(self, start, end):
+        return bisect_right(self._ends, start), bisect_left(self._starts, end)
+
+    @property
+    def nbytes(self):
+        return (len(self._starts) + len(self._ends)) * self._starts.itemsize
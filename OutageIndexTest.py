@@ -0,0 +1,105 @@
+import unittest
+
+from assertpy import assert_that
+
+from OutageIndex import OutageIndex
+
+
+def index_of(epochs, timeout=30):
+    outages = OutageIndex(timeout)
+    for epoch in epochs:
+        outages.add(epoch)
+    return outages
+
+
+class OutageIndexTest(unittest.TestCase):
+    def test_gaps_longer_than_the_timeout_are_outages(self):
+        outages = index_of([0, 10, 20, 100, 110, 120, 150, 300])
+
+        assert_that(outages.between(0, 1000)).is_equal_to([(20, 100), (150, 300)])
+        assert_that(outages.latest()).is_equal_to((150, 300))
+
+    def test_late_heartbeats_split_or_close_an_outage(self):
+        outages = index_of([0, 100, 300])
+
+        outages.add(50)  # leaves 0-50 and 50-100
+        outages.add(200)  # leaves 100-200 and 200-300
+        outages.add(220)  # 200-220 is no outage
+        outages.add(80)  # closes 50-80 and 80-100
+
+        assert_that(outages.between(0, 1000)).is_equal_to([(0, 50), (100, 200), (220, 300)])
+
+    def test_heartbeats_before_the_first_open_an_outage(self):
+        outages = index_of([100, 110])
+
+        outages.add(50)
+        outages.add(90)
+
+        assert_that(outages.between(0, 1000)).is_equal_to([(50, 90)])
+        assert_that(outages.first).is_equal_to(50)
+
+    def test_arrival_order_does_not_matter(self):
+        epochs = [0, 10, 20, 100, 110, 200, 400, 410, 420, 500]
+        shuffled = [200, 0, 500, 110, 10, 420, 100, 20, 410, 400]
+
+        assert_that(index_of(shuffled).between(0, 1000)).is_equal_to(index_of(epochs).between(0, 1000))
+
+    def test_extend_matches_adding_one_by_one(self):
+        epochs = list(range(0, 1000, 10)) + list(range(1200, 2000, 10)) + [2500]
+        extended = OutageIndex(30)
+        extended.extend(epochs[:50])
+        extended.extend(epochs[50:])
+
+        assert_that(extended.between(0, 3000)).is_equal_to(index_of(epochs).between(0, 3000))
+        assert_that(extended.last).is_equal_to(2500)
+
+    def test_range_queries(self):
+        outages = index_of([0, 100, 110, 200, 210, 400])  # outages 0-100, 110-200, 210-400
+
+        assert_that(outages.count(150, 250)).is_equal_to(2)
+        assert_that(outages.between(100, 110)).is_empty()
+        assert_that(outages.downtime(50, 300)).is_equal_to(50 + 90 + 90)
+        assert_that(outages.mttr(0, 400)).is_equal_to((100 + 90 + 190) / 3)
+        assert_that(outages.mtbf(0, 400)).is_equal_to(20 / 3)
+        assert_that(outages.mttr(100, 110)).is_none()
+
+    def test_trim_forgets_old_outages(self):
+        outages = index_of([0, 100, 200, 300])
+
+        outages.trim(150)
+
+        assert_that(outages.between(0, 1000)).is_equal_to([(100, 200), (200, 300)])
+
+    def test_frozen_copies_do_not_follow_later_heartbeats(self):
+        outages = index_of([0, 100])
+        frozen = outages.freeze()
+
+        outages.add(200)
+        outages.add(210)
+        refrozen = outages.freeze(frozen)
+
+        assert_that(frozen.between(0, 1000)).is_equal_to([(0, 100)])
+        assert_that(frozen.last).is_equal_to(100)
+        assert_that(refrozen.between(0, 1000)).is_equal_to([(0, 100), (100, 200)])
+        assert_that(outages.freeze(refrozen)._ends).is_same_as(refrozen._ends)
+
+    def test_next_end_is_when_the_oldest_outage_leaves_a_window(self):
+        outages = index_of([0, 100, 200, 300])
+
+        assert_that(outages.next_end(0)).is_equal_to(100)
+        assert_that(outages.next_end(100)).is_equal_to(200)
+        assert_that(outages.next_end(300)).is_none()
+
+    def test_with_timeout_keeps_the_outages_still_long_enough(self):
+        outages = index_of([0, 100, 150, 300, 310], timeout=40)  # outages 0-100, 100-150, 150-300
+
+        longer = outages.with_timeout(60)
+        shorter = outages.with_timeout(5, recent=[150, 300, 310])
+
+        assert_that(longer.between(0, 1000)).is_equal_to([(0, 100), (150, 300)])
+        assert_that(shorter.between(0, 1000)).is_equal_to([(0, 100), (100, 150), (150, 300), (300, 310)])
+        assert_that(shorter.version).is_greater_than(outages.version)
+
+
+if __name__ == '__main__':
+    unittest.main()
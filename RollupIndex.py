@@ -0,0 +1,206 @@
+import math
+from bisect import bisect_left
+from collections import Counter
+
+from CountIndex import CountIndex, np
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+DEFAULT_RAW_WINDOW = HOUR  # smallest TIME_WINDOWS entry in app.py
+DEFAULT_RETENTION = 30 * DAY  # largest TIME_WINDOWS entry in app.py
+
+
+class RollupIndex:
+    """
+    Heartbeat counts kept at several resolutions, each for a bounded horizon.
+
+    Every heartbeat is counted in every tier, and each tier forgets buckets
+    older than its horizon, so data is downsampled as it ages:
+
+        heartbeat interval   for raw_window
+        per minute           for a day
+        per hour             for two weeks
+        per day              for the retention period
+
+    A count over [start, end) reads the finest tier for the recent part of
+    the range and coarser tiers only for the older part, so a 30-day window
+    costs a handful of O(log n) tree walks. Memory per device is bounded by
+    the horizons, however long the process runs.
+    """
+
+    def __init__(self, resolution=10, raw_window=DEFAULT_RAW_WINDOW, retention=DEFAULT_RETENTION):
+        self.retention = retention
+        self.newest = None
+        self.tiers = []
+        self.horizons = []
+        for tier_resolution, horizon in ((resolution, raw_window), (MINUTE, DAY), (HOUR, 14 * DAY), (DAY, retention)):
+            horizon = min(horizon, retention)
+            if self.tiers and (tier_resolution <= self.tiers[-1].resolution or horizon <= self.horizons[-1]):
+                continue
+            self.tiers.append(CountIndex(tier_resolution))
+            self.horizons.append(horizon)
+        self.horizons[-1] = retention
+        # One spare bucket per tier, so a window as long as the horizon still fits
+        self.horizons = [horizon + tier.resolution for tier, horizon in zip(self.tiers, self.horizons)]
+        self._next_trims = [float('-inf')] * len(self.tiers)
+        self._next_trim = float('-inf')
+
+    def add(self, epoch, count=1):
+        """Count a heartbeat; returns False when it is older than the retention period."""
+        if self.newest is None or epoch > self.newest:
+            self.newest = epoch
+            if epoch >= self._next_trim:
+                self._trim(epoch)
+        elif epoch < self.newest - self.retention:
+            return False
+        for tier in self.tiers:
+            tier.add(epoch, count)
+        return True
+
+    def load(self, epochs):
+        """
+        Fill an empty index from ascending epochs in one pass per tier, instead
+        of one add() per heartbeat. Returns how many of the newest epochs the
+        coarsest tier kept: those in its buckets that start within its horizon,
+        the same ones add() would have kept.
+        """
+        if self.newest is not None:
+            raise ValueError("load() needs an empty index")
+        if len(epochs) == 0:
+            return 0
+        self.newest = newest = int(epochs[-1])
+        coarsest = self.tiers[-1].resolution
+        epochs = epochs_since(epochs, -(-(newest - self.horizons[-1]) // coarsest) * coarsest)
+        for tier, horizon in zip(self.tiers, self.horizons):
+            first, counts = _bucket_range(epochs_since(epochs, newest - horizon), tier.resolution)
+            tier.load(first, counts)
+        self._next_trims = [float('-inf')] * len(self.tiers)
+        self._trim(newest)
+        return len(epochs)
+
+    def extend(self, epochs):
+        """
+        Count ascending epochs with one add() per bucket and tier rather than
+        per heartbeat. Returns how many were within the retention period.
+        """
+        if self.newest is None:
+            return self.load(epochs)
+        if len(epochs) == 0:
+            return 0
+        newest = max(self.newest, int(epochs[-1]))
+        epochs = epochs_since(epochs, newest - self.retention)
+        if newest > self.newest:
+            self.newest = newest
+            if newest >= self._next_trim:
+                self._trim(newest)
+        for tier in self.tiers:
+            for bucket, count in _bucket_counts(epochs, tier.resolution):
+                tier.add(bucket * tier.resolution, count)
+        return len(epochs)
+
+    def _trim(self, newest):
+        # A tier only has a bucket to forget once its cutoff reaches the next bucket boundary
+        for position, (tier, horizon) in enumerate(zip(self.tiers, self.horizons)):
+            if newest >= self._next_trims[position]:
+                tier.trim(newest - horizon)
+                self._next_trims[position] = newest + tier.resolution - (newest - horizon) % tier.resolution
+        self._next_trim = min(self._next_trims)
+
+    def count(self, start, end):
+        """
+        Heartbeats in [start, end). Where the start falls inside a coarse
+        bucket, that bucket's count is prorated and rounded up, so a device
+        that missed no heartbeat is never counted short of one.
+        """
+        total = 0
+        for position, tier in enumerate(self.tiers):
+            if tier is self.tiers[-1] or self._covers(position, start):
+                total += tier.count(start, end)
+                if position and start % tier.resolution and start < end:
+                    bucket_end = start - start % tier.resolution + tier.resolution
+                    share = tier.bucket_count(start) * (min(bucket_end, end) - start) / tier.resolution
+                    total += math.ceil(round(share, 9))
+                return total
+            # Hand the older part over to the next tier on one of its bucket boundaries
+            coarser = self.tiers[position + 1].resolution
+            boundary = -(-tier.start_epoch() // coarser) * coarser
+            if boundary < end:
+                total += tier.count(boundary, end)
+                end = boundary
+        return total
+
+    def count_drops_after(self, start, heartbeats):
+        """
+        Latest window start that still counts the `heartbeats`-th heartbeat
+        count(start, ...) counts: once the start moves past it, the count is
+        that much lower. None when fewer are counted, or when `start` is
+        older than the finest tier, as coarser buckets are prorated.
+        """
+        if len(self.tiers) > 1 and not self._covers(0, start):
+            return None
+        return self.tiers[0].nth_bucket(start, heartbeats)
+
+    def _covers(self, position, start):
+        """Whether a tier holds every bucket count(start, ...) reads from it."""
+        tier = self.tiers[position]
+        tier_start = tier.start_epoch()
+        if tier_start is None:
+            return True
+        if position == 0:
+            # The finest tier only counts the buckets starting within the range
+            return -(-start // tier.resolution) * tier.resolution >= tier_start
+        return start >= tier_start
+
+    def resolution_for(self, window):
+        """Resolution of the finest tier that holds a whole window."""
+        for tier, horizon in zip(self.tiers, self.horizons):
+            if horizon >= window:
+                return tier.resolution
+        return self.tiers[-1].resolution
+
+    def histogram(self, start, resolution, columns):
+        """
+        Heartbeat counts for `columns` consecutive ranges of `resolution`
+        seconds from `start`, read from the finest tier that can supply them.
+        """
+        for tier in self.tiers:
+            tier_start = tier.start_epoch()
+            if resolution % tier.resolution or start % tier.resolution:
+                continue
+            if tier_start is None or start >= tier_start or tier is self.tiers[-1]:
+                per_column = resolution // tier.resolution
+                first = start // tier.resolution
+                counts = tier.bucket_range(first, first + columns * per_column)
+                return [sum(counts[i:i + per_column]) for i in range(0, len(counts), per_column)]
+        return [self.count(start + i * resolution, start + (i + 1) * resolution) for i in range(columns)]
+
+    @property
+    def nbytes(self):
+        return sum(tier.nbytes for tier in self.tiers)
+
+
+def epochs_since(epochs, cutoff):
+    """The tail of ascending epochs that is not older than cutoff."""
+    if np is not None:
+        epochs = np.asarray(epochs)
+        return epochs[np.searchsorted(epochs, cutoff):]
+    return epochs[bisect_left(epochs, cutoff):]
+
+
+def _bucket_range(epochs, resolution):
+    """First bucket and per-bucket counts of ascending, non-empty epochs."""
+    if np is not None:
+        buckets = np.asarray(epochs, dtype=np.int64) // resolution
+        return int(buckets[0]), np.bincount(buckets - buckets[0]).tolist()
+    counts = Counter(int(epoch) // resolution for epoch in epochs)
+    first = min(counts)
+    return first, [counts.get(bucket, 0) for bucket in range(first, max(counts) + 1)]
+
+
+def _bucket_counts(epochs, resolution):
+    """(bucket, count) for every non-empty bucket of ascending epochs."""
+    if len(epochs) == 0:
+        return []
+    first, counts = _bucket_range(epochs, resolution)
+    return [(bucket, count) for bucket, count in enumerate(counts, start=first) if count]
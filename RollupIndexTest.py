@@ -0,0 +1,74 @@
+import unittest
+from assertpy import assert_that
+
+from RollupIndex import RollupIndex, HOUR, DAY
+
+START = 1_700_000_000
+
+
+class RollupIndexTest(unittest.TestCase):
+    def steady_index(self, days, interval=30):
+        index = RollupIndex(resolution=interval, raw_window=HOUR, retention=30 * DAY)
+        for epoch in range(START, START + days * DAY, interval):
+            index.add(epoch)
+        return index, START + days * DAY
+
+    def test_every_window_counts_a_steady_device(self):
+        index, now = self.steady_index(days=31, interval=60)
+        for window in (HOUR, DAY, 7 * DAY, 14 * DAY, 30 * DAY):
+            assert_that(index.count(now - window + 3, now)).is_close_to(window / 60, tolerance=1)
+
+    def test_a_partly_covered_bucket_never_counts_a_steady_device_short(self):
+        index = RollupIndex(resolution=10, raw_window=HOUR, retention=30 * DAY)
+        newest = START + 7 + 8 * DAY - 10  # heartbeats 7s past every bucket boundary
+        for epoch in range(START + 7, newest + 1, 10):
+            index.add(epoch)
+        for window in (DAY, 7 * DAY):
+            for offset in (3, 15, 27, 58):  # into a coarse bucket
+                assert_that(index.count(newest + 1 - window + offset, newest + 1)).is_greater_than_or_equal_to(
+                    len(range(newest + 1 - window + offset, newest + 1, 10)))
+        assert_that(index.count(newest - 86390, newest + 1)).is_equal_to(8640)
+
+    def test_memory_is_bounded_by_the_horizons(self):
+        index, _ = self.steady_index(days=62)
+        # A Fenwick slot per bucket, with at most 4x slack: 361 raw + 1441 minute + 337 hour + 31 day buckets
+        assert_that(index.nbytes).is_less_than(4 * 8 * (361 + 1441 + 337 + 31))
+
+    def test_heartbeats_older_than_retention_are_dropped(self):
+        index, now = self.steady_index(days=31, interval=600)
+        assert_that(index.add(now - 31 * DAY)).is_false()
+        assert_that(index.count(0, now - 31 * DAY)).is_equal_to(0)
+
+    def test_late_heartbeat_inside_a_coarse_tier_is_counted(self):
+        index, now = self.steady_index(days=3)
+        before = index.count(now - 2 * DAY, now)
+        index.add(now - 2 * DAY + 5 * HOUR)
+        assert_that(index.count(now - 2 * DAY, now)).is_equal_to(before + 1)
+
+    def test_load_matches_adding_one_by_one(self):
+        index, now = self.steady_index(days=31, interval=60)
+        loaded = RollupIndex(resolution=60, raw_window=HOUR, retention=30 * DAY)
+        loaded.load(list(range(START, now, 60)))
+
+        for window in (HOUR, DAY, 7 * DAY, 30 * DAY):
+            assert_that(loaded.count(now - window + 3, now)).is_equal_to(index.count(now - window + 3, now))
+        assert_that(loaded.add(now - 31 * DAY)).is_false()
+
+    def test_load_keeps_what_adding_one_by_one_keeps_at_the_horizon(self):
+        index = RollupIndex(resolution=60, raw_window=HOUR, retention=30 * DAY)
+        # The oldest day starts before the horizon, so the coarsest tier forgets it
+        epochs = list(range(START, START + 31 * DAY + HOUR, HOUR))
+        for epoch in epochs:
+            index.add(epoch)
+        coarsest = index.tiers[-1]
+        kept = coarsest.count(START, START + 32 * DAY)
+
+        loaded = RollupIndex(resolution=60, raw_window=HOUR, retention=30 * DAY)
+
+        assert_that(loaded.load(epochs)).is_equal_to(kept).is_less_than(len(epochs))
+        assert_that(loaded.tiers[-1].count(START, START + 32 * DAY)).is_equal_to(kept)
+        assert_that(loaded.count(START, START + 32 * DAY)).is_equal_to(index.count(START, START + 32 * DAY))
+
+
+if __name__ == '__main__':
+    unittest.main()
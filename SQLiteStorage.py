@@ -0,0 +1,372 @@
+"""
+On-disk storage backend: heartbeats live in a SQLite database instead of
+memory, so how much history is kept is bounded by disk rather than RAM,
+and it survives a restart.
+
+    devices(id, device_id, first_seen, last_seen, group_name)
+    heartbeats(device, ts)                    indexed on (device, ts)
+    counts(device, resolution, bucket, count) heartbeats per minute, hour and day
+
+Heartbeats are buffered and written by commit() in one transaction per
+batch (DashBoard commits once per ingest batch), with their bucket counts
+added up in Python first and upserted. The database runs in WAL mode, and
+each reading thread has its own connection, so readers never block the
+writer. The writer's own reads commit whatever it has buffered first.
+
+A count over a range reads whole buckets for the middle of the range and
+raw rows only for its ragged edges; pages of history are range scans of
+the (device, ts) index, each starting after the last row of the one before.
+Rows older than the retention period are deleted every half retention
+period, device by device through the same index.
+"""
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter
+from collections.abc import Mapping
+from datetime import datetime, timezone
+
+from GroupIndex import group_name, group_path
+from HeartbeatPage import HeartbeatPage
+from HeartbeatStore import DEFAULT_LATENESS
+from OutageIndex import OutageIndex
+from RollupIndex import DAY, HOUR, MINUTE
+
+TIERS = (DAY, HOUR, MINUTE)  # bucket resolutions, coarsest first
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (id INTEGER PRIMARY KEY, device_id TEXT NOT NULL UNIQUE, first_seen REAL, last_seen REAL,
+                                    group_name TEXT);
+CREATE TABLE IF NOT EXISTS heartbeats (device INTEGER NOT NULL, ts INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS heartbeats_by_device_ts ON heartbeats (device, ts);
+CREATE TABLE IF NOT EXISTS counts (device INTEGER NOT NULL, resolution INTEGER NOT NULL, bucket INTEGER NOT NULL,
+                                   count INTEGER NOT NULL, PRIMARY KEY (device, resolution, bucket)) WITHOUT ROWID;
+"""
+ADD_COUNT = ("INSERT INTO counts (device, resolution, bucket, count) VALUES (?, ?, ?, ?) "
+             "ON CONFLICT (device, resolution, bucket) DO UPDATE SET count = count + excluded.count")
+
+
+class SQLiteStorage(Mapping):
+    """Storage backend keeping heartbeats in the SQLite database at `path`; see DeviceStorage.MemoryStorage."""
+
+    def __init__(self, path, lateness=DEFAULT_LATENESS):
+        self.path = path
+        self.lateness = lateness  # the (device, ts) index needs no reordering; this only decides what counts as late
+        self.late = 0  # heartbeats more than `lateness` behind their device's newest
+        self.rejected = 0  # heartbeats older than the retention period, dropped
+        self.retention = None  # set by create()
+        self._write = self._connect()
+        self._write.executescript(SCHEMA)
+        if "group_name" not in {column for _, column, *_ in self._write.execute("PRAGMA table_info(devices)")}:
+            self._write.execute("ALTER TABLE devices ADD COLUMN group_name TEXT")  # databases from before groups
+        self._local = threading.local()  # read connection per thread
+        self._devices = {}
+        for number, device_id, first_seen, last_seen, name in self._write.execute(
+                "SELECT id, device_id, first_seen, last_seen, group_name FROM devices"):
+            device = self._devices[device_id] = SQLiteDevice(self, number, device_id)
+            device.first_seen_epoch = None if first_seen is None else int(first_seen)
+            device.last_seen = last_seen
+            device.group = None if name is None else group_path(name)
+        self._next_number = max((device.number for device in self._devices.values()), default=0) + 1
+        self.stored = self._write.execute("SELECT COUNT(*) FROM heartbeats").fetchone()[0]
+        self._new_devices = []
+        self._pending = []  # (device number, epoch)
+        self._touched = {}  # device number -> device whose first/last seen changed
+        self._writer = None  # thread that buffered heartbeats
+        self._next_trim = None
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def __getitem__(self, device_id):
+        return self._devices[device_id]
+
+    def __iter__(self):
+        return iter(self._devices)
+
+    def __len__(self):
+        return len(self._devices)
+
+    def create(self, device_id, index_resolution, raw_window, retention, outage_timeout=None):
+        # outage_timeout is unused: outages are found in the heartbeats table, which holds the whole history
+        device = SQLiteDevice(self, self._next_number, device_id, index_resolution, raw_window)
+        self._next_number += 1
+        self.retention = retention
+        self._new_devices.append((device.number, device_id))
+        self._devices[device_id] = device
+        return device
+
+    def add(self, device, epochs):
+        self._pending.extend((device.number, int(epoch)) for epoch in epochs)
+        self._touched[device.number] = device
+        self._writer = threading.get_ident()
+
+    def commit(self):
+        """Write everything buffered in one transaction."""
+        if not (self._pending or self._new_devices or self._touched):
+            return
+        rows, self._pending = self._pending, []
+        new_devices, self._new_devices = self._new_devices, []
+        touched, self._touched = list(self._touched.values()), {}
+        counts = Counter((number, resolution, epoch // resolution) for number, epoch in rows for resolution in TIERS)
+        with self._write:
+            self._write.executemany("INSERT INTO devices (id, device_id) VALUES (?, ?)", new_devices)
+            self._write.executemany("INSERT INTO heartbeats (device, ts) VALUES (?, ?)", rows)
+            self._write.executemany(ADD_COUNT, [(*key, count) for key, count in counts.items()])
+            self._write.executemany("UPDATE devices SET first_seen = ?, last_seen = ?, group_name = ? WHERE id = ?",
+                                    [(device.first_seen_epoch, device.last_seen,
+                                      None if device.group is None else group_name(device.group), device.number)
+                                     for device in touched])
+        self.stored += len(rows)
+        newest = max((device.last_seen for device in touched if device.last_seen is not None), default=None)
+        if newest is not None and self.retention:
+            if self._next_trim is None:
+                self._next_trim = newest + self.retention // 2
+            elif newest >= self._next_trim:
+                self._trim(newest - self.retention)
+                self._next_trim = newest + self.retention // 2
+
+    def _trim(self, before):
+        # Device by device, so each delete is a range of the (device, ts) index or the counts key
+        numbers = [(device.number,) for device in self._devices.values()]
+        with self._write:
+            self.stored -= self._write.executemany("DELETE FROM heartbeats WHERE device = ? AND ts < ?",
+                                                   [(number, before) for number, in numbers]).rowcount
+            self._write.executemany("DELETE FROM counts WHERE device = ? AND resolution = ? AND bucket < ?",
+                                    [(number, resolution, before // resolution)
+                                     for number, in numbers for resolution in TIERS])
+        for device in self._devices.values():
+            if device.outage_index is not None:
+                device.outage_index.trim(before)
+
+    def reader(self):
+        """Connection for the calling thread; the writer's own reads see what it buffered."""
+        if self._writer is None or self._writer == threading.get_ident():
+            self.commit()
+            return self._write
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def stats(self, devices):
+        store_bytes = sum(os.path.getsize(path) for path in (self.path, self.path + "-wal") if os.path.exists(path))
+        return {'stored_heartbeats': self.stored, 'store_bytes': store_bytes, 'late_heartbeats': self.late,
+                'rejected_heartbeats': self.rejected}
+
+    def close(self):
+        self.commit()
+        self._write.close()
+
+
+class SQLiteDevice:
+    """A device whose heartbeats are kept by SQLiteStorage; answers the same queries as Device."""
+
+    def __init__(self, storage, number, device_id, index_resolution=10, raw_window=HOUR):
+        self.storage = storage
+        self.number = number
+        self.device_id = device_id
+        self.index_resolution = index_resolution
+        self.raw_window = raw_window  # what heartbeat_count() and get_heartbeats() cover, as for Device
+        self.first_seen_epoch = None
+        self.last_seen = None  # epoch seconds, fractions included
+        self.group = None  # group path, see Device.group
+        self.outage_index = None  # OutageIndex, built from the heartbeats table on the first outage query
+
+    def add_heartbeat(self, heartbeat):
+        if heartbeat.device_id != self.device_id:
+            raise ValueError(f"Heartbeat device_id {heartbeat.device_id} does not match device {self.device_id}")
+        epoch = heartbeat.timestamp.timestamp()
+        if self.last_seen is not None and self.storage.retention and epoch < self.last_seen - self.storage.retention:
+            self.storage.rejected += 1  # older than the retention period
+            return
+        if self.last_seen is not None and epoch < self.last_seen - self.storage.lateness:
+            self.storage.late += 1
+        self.storage.add(self, (epoch,))
+        self._seen(int(epoch), epoch)
+        if self.outage_index is not None:
+            self.outage_index.add(epoch)
+
+    def load_epochs(self, epochs):
+        """Add ascending epoch seconds in one step."""
+        if len(epochs) == 0:
+            return
+        self.storage.add(self, epochs)
+        self._seen(int(epochs[0]), int(epochs[-1]))
+        if self.outage_index is not None:
+            self.outage_index.extend(epochs)
+
+    def _seen(self, oldest, newest):
+        if self.first_seen_epoch is None or oldest < self.first_seen_epoch:
+            self.first_seen_epoch = oldest
+        if self.last_seen is None or newest > self.last_seen:
+            self.last_seen = newest
+
+    def last_seen_epoch(self):
+        return self.last_seen
+
+    def get_last_seen(self):
+        if self.last_seen is None:
+            return datetime.fromtimestamp(0, tz=datetime.utcnow().astimezone().tzinfo)
+        return datetime.fromtimestamp(self.last_seen, tz=timezone.utc)
+
+    def _scalar(self, query, parameters):
+        return self.storage.reader().execute(query, parameters).fetchone()[0]
+
+    def _raw_count(self, start, end):
+        return self._scalar("SELECT COUNT(*) FROM heartbeats WHERE device = ? AND ts >= ? AND ts < ?",
+                            (self.number, start, end))
+
+    def count_between(self, start, end, tiers=TIERS):
+        """Heartbeats between two epochs: whole buckets for the middle, raw rows for the edges."""
+        if start >= end:
+            return 0
+        if not tiers:
+            return self._raw_count(start, end)
+        resolution, finer = tiers[0], tiers[1:]
+        first, stop = math.ceil(start / resolution), math.floor(end / resolution)
+        if first >= stop:
+            return self.count_between(start, end, finer)
+        middle = self._scalar("SELECT COALESCE(SUM(count), 0) FROM counts WHERE device = ? AND resolution = ? "
+                              "AND bucket >= ? AND bucket < ?", (self.number, resolution, first, stop))
+        return (middle + self.count_between(start, first * resolution, finer)
+                + self.count_between(stop * resolution, end, finer))
+
+    def count_drops_after(self, start, heartbeats):
+        """Epoch of the `heartbeats`-th raw heartbeat from `start`, as counts are exact; see Device.count_drops_after."""
+        return self._nth_heartbeat(heartbeats, start)[0] if heartbeats > 0 else None
+
+    def _nth_heartbeat(self, n, start, end=None, tiers=TIERS):
+        """
+        (epoch of the n-th heartbeat from `start` before `end`, n), or (None,
+        the heartbeats in the range) when it holds fewer. Whole buckets are
+        skipped by their counts, coarsest first, so raw rows are only read
+        within the one minute the heartbeat is in.
+        """
+        if not tiers:
+            query = "SELECT ts FROM heartbeats WHERE device = ? AND ts >= ?"
+            parameters = [self.number, start]
+            if end is not None:
+                query += " AND ts < ?"
+                parameters.append(end)
+            rows = self.storage.reader().execute(query + " ORDER BY ts LIMIT ?", (*parameters, n)).fetchall()
+            return (rows[-1][0], n) if len(rows) == n else (None, len(rows))
+        resolution, finer = tiers[0], tiers[1:]
+        first = math.ceil(start / resolution)
+        stop = None if end is None else math.floor(end / resolution)
+        if stop is not None and first >= stop:
+            return self._nth_heartbeat(n, start, end, finer)
+        found, seen = self._nth_heartbeat(n, start, first * resolution, finer)
+        if found is not None:
+            return found, n
+        query = "SELECT bucket, count FROM counts WHERE device = ? AND resolution = ? AND bucket >= ?"
+        parameters = [self.number, resolution, first]
+        if stop is not None:
+            query += " AND bucket < ?"
+            parameters.append(stop)
+        for bucket, count in self.storage.reader().execute(query + " ORDER BY bucket", parameters).fetchall():
+            if seen + count >= n:
+                found, _ = self._nth_heartbeat(n - seen, bucket * resolution, (bucket + 1) * resolution, finer)
+                if found is not None:
+                    return found, n
+            seen += count
+        if stop is None:
+            return None, seen
+        found, rest = self._nth_heartbeat(n - seen, stop * resolution, end, finer)
+        return (found, n) if found is not None else (None, seen + rest)
+
+    def histogram(self, start, resolution, columns):
+        """Heartbeat counts for `columns` consecutive ranges of `resolution` seconds from `start`."""
+        start, resolution = int(start), int(resolution)
+        end = start + columns * resolution
+        counts = [0] * columns
+        for tier in TIERS:
+            if resolution % tier == 0 and start % tier == 0:
+                rows = self.storage.reader().execute(
+                    "SELECT bucket, count FROM counts WHERE device = ? AND resolution = ? AND bucket >= ? AND bucket < ?",
+                    (self.number, tier, start // tier, end // tier))
+                for bucket, count in rows:
+                    counts[(bucket * tier - start) // resolution] += count
+                return counts
+        rows = self.storage.reader().execute(
+            "SELECT (ts - ?) / ?, COUNT(*) FROM heartbeats WHERE device = ? AND ts >= ? AND ts < ? GROUP BY 1",
+            (start, resolution, self.number, start, end))
+        for column, count in rows:
+            counts[column] = count
+        return counts
+
+    def resolution_for(self, window):
+        return self.index_resolution  # raw rows are kept for the whole retention period
+
+    def heartbeat_page(self, start=None, end=None, limit=None, cursor=None):
+        """
+        Raw heartbeats in [start, end), oldest first; see Device.heartbeat_page.
+        The cursor is the (ts, rowid) of the last row returned, and the next
+        page starts right after it in the (device, ts) index.
+        """
+        query = "SELECT ts, rowid FROM heartbeats WHERE device = ?"
+        parameters = [self.number]
+        if cursor is not None:
+            query += " AND (ts, rowid) > (?, ?)"
+            parameters += cursor
+        elif start is not None:
+            query += " AND ts >= ?"
+            parameters.append(start)
+        if end is not None:
+            query += " AND ts < ?"
+            parameters.append(end)
+        query += " ORDER BY ts, rowid LIMIT ?"
+        parameters.append(-1 if limit is None else limit + 1)
+        rows = self.storage.reader().execute(query, parameters).fetchall()
+        if limit is None or len(rows) <= limit:
+            return HeartbeatPage(self.device_id, [ts for ts, _ in rows])
+        rows = rows[:limit]
+        return HeartbeatPage(self.device_id, [ts for ts, _ in rows], rows[-1])
+
+    def _raw_start(self):
+        return int(self.last_seen) - self.raw_window if self.last_seen is not None else 0
+
+    def get_heartbeats(self):
+        return list(self.heartbeat_page(self._raw_start()))
+
+    def heartbeat_count(self):
+        """Heartbeats within raw_window of the newest, the span Device keeps raw."""
+        if self.last_seen is None:
+            return 0
+        return self._raw_count(self._raw_start(), int(self.last_seen) + 1)
+
+    def calculate_uptime(self, heartbeat_interval, uptime_window, now=None):
+        """Heartbeats in the uptime window up to the latest one, as a percentage of those expected; see Device."""
+        if self.last_seen is None:
+            return 0
+        end = int(self.last_seen) + 1
+        return int(self.count_between(end - uptime_window, end) / (uptime_window / heartbeat_interval) * 100)
+
+    def calculate_slot_uptime(self, heartbeat_interval, uptime_window, now=None):
+        """Percentage of the window's heartbeat slots that saw at least one heartbeat."""
+        expected_slots = uptime_window // heartbeat_interval
+        if self.last_seen is None or expected_slots <= 0:
+            return 0
+        if now is None:
+            now = datetime.now(tz=timezone.utc)
+        stop_slot = int(now.timestamp()) // heartbeat_interval + 1
+        received = self._scalar("SELECT COUNT(DISTINCT ts / ?) FROM heartbeats WHERE device = ? AND ts >= ? AND ts < ?",
+                                (heartbeat_interval, self.number, (stop_slot - expected_slots) * heartbeat_interval,
+                                 stop_slot * heartbeat_interval))
+        return int(received / expected_slots * 100)
+
+    def outages(self, timeout):
+        """OutageIndex of the gaps longer than `timeout`; see Device.outages."""
+        if self.outage_index is None or self.outage_index.timeout != timeout:
+            self.outage_index = OutageIndex(timeout)
+            self.outage_index.extend([ts for ts, in self.storage.reader().execute(
+                "SELECT ts FROM heartbeats WHERE device = ? ORDER BY ts", (self.number,))])
+        return self.outage_index
+
+    @property
+    def nbytes(self):
+        return self.outage_index.nbytes if self.outage_index else 0  # nothing else is held in memory
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timezone
+
+from assertpy import assert_that
+
+from Dashboard import DashBoard
+from Heartbeat import HeartBeat
+from RollupIndex import DAY
+from SQLiteStorage import SQLiteStorage
+
+START = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+class SQLiteStorageTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "heartbeats.db")
+
+    def storage(self):
+        storage = SQLiteStorage(self.path)
+        self.addCleanup(storage.close)
+        return storage
+
+    def test_history_survives_reopening_the_database(self):
+        dash = DashBoard(storage=self.storage())
+        dash.bulk_load(["Patrick"] * 360, range(START, START + 3600, 10))
+        dash.devices.close()
+
+        reopened = DashBoard(storage=self.storage())
+
+        assert_that(reopened.devices["Patrick"].last_seen_epoch()).is_equal_to(START + 3590)
+        assert_that(reopened.uptime("Patrick", START, START + 3600)).is_equal_to(100)
+        assert_that(len(reopened.heartbeats_for_device("Patrick"))).is_equal_to(360)
+
+    def test_reopening_restores_groups_and_offline_detection(self):
+        dash = DashBoard(storage=self.storage(), heartbeat_interval=10, uptime_window=600)
+        dash.addHeartBeats([HeartBeat("Patrick", datetime.fromtimestamp(START + 10 * i, tz=timezone.utc),
+                                      group=("north", "rack1")) for i in range(60)])
+        dash.addHeartBeat(HeartBeat("Quiet", datetime.fromtimestamp(START, tz=timezone.utc)))
+        groups = dash.view_groups(now=START + 600)
+        dash.devices.close()
+
+        reopened = DashBoard(storage=self.storage(), heartbeat_interval=10, uptime_window=600)
+        records = reopened.view_records(now=START + 600)
+
+        assert_that({r['device_id']: (r['group'], r['status']) for r in records}).is_equal_to(
+            {"Patrick": ("north/rack1", "online"), "Quiet": ("", "offline")})
+        assert_that(reopened.view_groups(now=START + 600)).is_equal_to(groups)
+
+    def test_counts_combine_buckets_with_raw_edges(self):
+        dash = DashBoard(storage=self.storage())
+        dash.bulk_load(["Patrick"] * 8640, range(START, START + DAY, 10))
+
+        assert_that(dash.devices["Patrick"].count_between(START + 15, START + DAY - 15)).is_equal_to(8637)
+
+    def test_count_drops_after_skips_whole_buckets_to_the_nth_heartbeat(self):
+        dash = DashBoard(storage=self.storage())
+        epochs = sorted([*range(START, START + 3 * DAY, 7), *range(START + 5, START + DAY, 600)])
+        dash.bulk_load(["Patrick"] * len(epochs), epochs)
+        device = dash.devices["Patrick"]
+
+        for start in (START, START + 3, START + 3599, START + DAY - 5):
+            following = [epoch for epoch in epochs if epoch >= start]
+            for n in (1, 2, 9, 600, 20000):
+                assert_that(device.count_drops_after(start, n)).is_equal_to(following[n - 1])
+        assert_that(device.count_drops_after(START, len(epochs) + 1)).is_none()
+
+    def test_pages_resume_after_the_last_row_even_among_duplicates(self):
+        dash = DashBoard(storage=self.storage())
+        epochs = [START] * 5 + [START + 10] * 3 + list(range(START + 20, START + 100, 10))
+        dash.bulk_load(["Patrick"] * len(epochs), epochs)
+        device = dash.devices["Patrick"]
+
+        pages, cursor = [], None
+        while True:
+            page = device.heartbeat_page(START, START + 90, limit=3, cursor=cursor)
+            pages.append(list(page.epochs))
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        assert_that([epoch for page in pages for epoch in page]).is_equal_to([e for e in epochs if e < START + 90])
+        assert_that(pages[0]).is_length(3)
+
+    def test_trimming_and_paging_search_the_device_index(self):
+        storage = self.storage()
+        dash = DashBoard(storage=storage, retention=DAY)
+        dash.bulk_load(["Patrick"] * 10, range(START, START + 100, 10))
+        dash.bulk_load(["Patrick"], [START + DAY])
+        statements = []
+        storage._write.set_trace_callback(statements.append)
+        dash.bulk_load(["Patrick"], [START + 2 * DAY])  # trims
+        dash.devices["Patrick"].heartbeat_page(START, limit=1, cursor=(START, 1))
+        storage._write.set_trace_callback(None)
+
+        queries = [statement for statement in statements if statement.startswith(("DELETE", "SELECT ts, rowid"))]
+        assert_that(queries).is_length(5)  # heartbeats, counts of each tier, and the page
+        for query in queries:
+            plan = " ".join(row[-1] for row in storage._write.execute("EXPLAIN QUERY PLAN " + query))
+            assert_that(plan).starts_with("SEARCH").does_not_contain("TEMP B-TREE")
+
+    def test_other_threads_read_what_the_writer_committed(self):
+        dash = DashBoard(storage=self.storage())
+        dash.addHeartBeats([HeartBeat("Patrick", datetime.fromtimestamp(START + 10 * i, tz=timezone.utc))
+                            for i in range(6)])
+        counts = []
+        reader = threading.Thread(target=lambda: counts.append(dash.devices["Patrick"].count_between(START, START + 60)))
+        reader.start()
+        reader.join()
+
+        assert_that(counts).is_equal_to([6])
+
+    def test_rows_older_than_the_retention_period_are_deleted(self):
+        storage = self.storage()
+        dash = DashBoard(storage=storage, retention=DAY)
+        dash.bulk_load(["Patrick"] * 10, range(START, START + 100, 10))
+        dash.bulk_load(["Patrick"], [START + DAY])
+        dash.bulk_load(["Patrick"], [START + 2 * DAY])
+
+        assert_that(storage.stats(storage.values())['stored_heartbeats']).is_equal_to(2)
+
+
+if __name__ == '__main__':
+    unittest.main()
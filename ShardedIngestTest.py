@@ -0,0 +1,132 @@
+import json
+import time
+import unittest
+from collections import Counter
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from assertpy import assert_that
+
+import heartbeat_codec
+from Dashboard import DashBoard
+from ingest_pipeline import IngestPipeline
+from Heartbeat import HeartBeat
+from load_generator import LoadProfile, VirtualDevices
+from mqtt_client import MQTTHeartbeatClient
+from paho.mqtt.client import topic_matches_sub
+from sharded_ingest import (PartitionInlet, ShardFilter, ShardedDashboard, _shard_message, heartbeat_topic,
+                            partition_topic, shard_for, shard_topics)
+from ViewIndex import ViewIndex
+
+START = 1_700_000_000
+
+
+def message(device_id, timestamp=START):
+    return json.dumps({"device_id": device_id, "timestamp": timestamp}).encode(), f"device/heartbeat/{device_id}"
+
+
+class ShardedIngestTest(unittest.TestCase):
+    def test_devices_spread_over_shards(self):
+        shards = Counter(shard_for(f"device_{i:05d}", 4) for i in range(4000))
+
+        assert_that(sorted(shards)).is_equal_to([0, 1, 2, 3])
+        assert_that(min(shards.values())).is_greater_than(800)
+        assert_that(shard_for("device_00001", 4)).is_equal_to(shard_for("device_00001", 4))
+
+    def test_topic_filter_only_skips_other_shards_devices(self):
+        device_id = next(f"device_{i}" for i in range(100) if shard_for(f"device_{i}", 2) == 1)
+        shard = ShardFilter(0, 2)
+
+        assert_that(shard.may_own_topic(f"device/heartbeat/{device_id}")).is_false()
+        assert_that(shard.may_own_topic("device/heartbeat")).is_true()
+        assert_that(shard.may_own_topic("device/heartbeat/bin")).is_true()
+        assert_that(shard.may_own_topic(f"device/heartbeat/site/rack/{device_id}")).is_false()
+
+    def test_each_shard_subscribes_only_to_its_own_devices(self):
+        subscriptions = [shard_topics(shard, 3) for shard in range(3)]
+
+        for device_id in (f"device_{i}" for i in range(300)):
+            topic = partition_topic(f"device/heartbeat/site/{device_id}")
+            receivers = [shard for shard, filters in enumerate(subscriptions)
+                         if any(topic_matches_sub(f, topic) for f in filters)]
+            assert_that(receivers).is_equal_to([shard_for(device_id, 3)])
+            assert_that(heartbeat_topic(topic)).is_equal_to(f"device/heartbeat/site/{device_id}")
+
+    def test_shard_client_subscribes_to_its_partitions_and_reads_them_as_heartbeat_topics(self):
+        dashboard = DashBoard()
+        pipeline = IngestPipeline(dashboard, shard=ShardFilter(1, 2))
+        client = MQTTHeartbeatClient(dashboard, topic=shard_topics(1, 2), pipeline=PartitionInlet(pipeline))
+        subscribed = []
+        client.on_connect(SimpleNamespace(subscribe=subscribed.append), None, None, 0)
+        devices = VirtualDevices(LoadProfile(devices=40, interval=10, partitioned=True), start=START)
+        messages = devices.messages(*devices.advance(START + 10))
+        mine = [(topic, payload) for topic, payload in messages
+                if any(topic_matches_sub(subscription, topic) for subscription, _ in subscribed[0])]
+
+        pipeline.start()
+        for topic, payload in mine:
+            client.on_message(None, None, SimpleNamespace(topic=topic, payload=payload))
+        pipeline.stop()
+
+        assert_that(sorted(dashboard.devices)).is_equal_to(
+            sorted(device_id for device_id in devices.device_ids if shard_for(device_id, 2) == 1))
+        assert_that(pipeline.stats.foreign).is_equal_to(0)
+
+    def test_pipeline_keeps_only_its_shards_devices_from_a_batch(self):
+        dashboard = DashBoard()
+        pipeline = IngestPipeline(dashboard, shard=ShardFilter(0, 2))
+        device_ids = [f"device_{i}" for i in range(20)]
+
+        pipeline.apply([heartbeat_codec.encode_batch((device_id, START) for device_id in device_ids)], ["device/heartbeat/bin"])
+
+        assert_that(sorted(dashboard.devices)).is_equal_to(sorted(d for d in device_ids if shard_for(d, 2) == 0))
+        assert_that(pipeline.stats.foreign).is_equal_to(20 - len(dashboard.devices))
+
+    def test_shards_send_only_the_records_that_changed(self):
+        workers = [DashBoard(), DashBoard()]
+        for shard, worker in enumerate(workers):
+            for i in range(5):
+                worker.addHeartBeat(HeartBeat(f"device_{shard}{i}", datetime.fromtimestamp(START, tz=timezone.utc)))
+        merged = ShardedDashboard(2, broker=None)
+        sent = []
+        for shard, worker in enumerate(workers):
+            snapshot = worker.publish_snapshot(now=START + 5)
+            merged._publish(shard, *_shard_message(snapshot, 0, {})[1:3])
+            sent.append(snapshot.version)
+
+        workers[1].addHeartBeat(HeartBeat("device_12", datetime.fromtimestamp(START + 4, tz=timezone.utc)))
+        snapshot = workers[1].publish_snapshot(now=START + 5)
+        settings, full, records, groups, stats = _shard_message(snapshot, sent[1], {})
+        merged._publish(1, full, records)
+
+        assert_that(full).is_false()
+        assert_that([record['device_id'] for record in records]).is_equal_to(["device_12"])
+        assert_that(merged.snapshot().changed_since(2)).is_equal_to({"device_12"})
+        rebuilt = ViewIndex()
+        rebuilt.rebuild(record for worker in workers for record in worker.snapshot(now=START + 5).records)
+        assert_that(tuple(merged.snapshot().orders.items())).is_equal_to(tuple(rebuilt.freeze()[1].items()))
+        assert_that(dict(merged.snapshot().records_by_id)).is_equal_to(dict(rebuilt.freeze()[0]))
+
+    def test_sharded_dashboard_merges_every_shard(self):
+        dashboard = ShardedDashboard(2, broker=None, publish_interval=0.01)
+        dashboard.start()
+        self.addCleanup(dashboard.stop)
+        dashboard.submit(message(f"device_{i}", START + step * 10) for step in range(3) for i in range(20))
+
+        deadline = time.monotonic() + 10
+        while len(dashboard.view_records()) < 20 and time.monotonic() < deadline:
+            dashboard.wait_for_snapshot(dashboard.snapshot().version, timeout=0.5)
+        version = dashboard.snapshot().version
+        dashboard.uptime_window = 86400
+        snapshot = dashboard.wait_for_snapshot(version, timeout=10)
+
+        assert_that(sorted(record["device_id"] for record in dashboard.view_records())).is_equal_to(
+            sorted(f"device_{i}" for i in range(20)))
+        assert_that(dashboard.view_groups()[0]).contains_entry({'group': ""}, {'devices': 20})
+        assert_that(snapshot.settings).is_equal_to((10, 86400))
+        dashboard.stop()
+        assert_that(sum(stats["parsed"] for stats in dashboard.stats)).is_equal_to(60)
+
+
+if __name__ == '__main__':
+    unittest.main()
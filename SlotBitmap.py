@@ -0,0 +1,77 @@
+from array import array
+
+WORD_BITS = 64
+
+
+class SlotBitmap:
+    """
+    One bit per heartbeat slot (epoch // heartbeat_interval).
+
+    Setting a slot twice is a no-op, so duplicate or redelivered heartbeats
+    never count more than once towards uptime.
+    """
+
+    def __init__(self, heartbeat_interval):
+        self.heartbeat_interval = heartbeat_interval
+        self.base_slot = None  # slot held by bit 0 of word 0, always a multiple of WORD_BITS
+        self.slot_count = 0  # number of distinct slots set
+        self._words = array('Q')
+
+    def slot_for(self, epoch):
+        return int(epoch) // self.heartbeat_interval
+
+    def add(self, epoch):
+        """Record a heartbeat; returns False when its slot was already set."""
+        slot = self.slot_for(epoch)
+        if self.base_slot is None:
+            self.base_slot = slot - slot % WORD_BITS
+        elif slot < self.base_slot:
+            missing_words = (self.base_slot - slot + WORD_BITS - 1) // WORD_BITS
+            self._words = array('Q', bytes(8 * missing_words)) + self._words
+            self.base_slot -= missing_words * WORD_BITS
+
+        word, bit = divmod(slot - self.base_slot, WORD_BITS)
+        if word >= len(self._words):
+            self._words.extend([0] * (word - len(self._words) + 1))
+        mask = 1 << bit
+        if self._words[word] & mask:
+            return False
+        self._words[word] |= mask
+        self.slot_count += 1
+        return True
+
+    def count(self, start_slot, stop_slot):
+        """Number of set slots in [start_slot, stop_slot)."""
+        if self.base_slot is None:
+            return 0
+        start = max(start_slot - self.base_slot, 0)
+        stop = min(stop_slot - self.base_slot, len(self._words) * WORD_BITS)
+        if start >= stop:
+            return 0
+
+        first_word, first_bit = divmod(start, WORD_BITS)
+        last_word, last_bit = divmod(stop - 1, WORD_BITS)
+        if first_word == last_word:
+            mask = ((1 << (last_bit - first_bit + 1)) - 1) << first_bit
+            return (self._words[first_word] & mask).bit_count()
+
+        total = (self._words[first_word] >> first_bit).bit_count()
+        for word in range(first_word + 1, last_word):
+            total += self._words[word].bit_count()
+        total += (self._words[last_word] & ((1 << (last_bit + 1)) - 1)).bit_count()
+        return total
+
+    def trim(self, before_slot):
+        """Forget slots before `before_slot`, whole words at a time."""
+        if self.base_slot is None:
+            return
+        dead_words = min((before_slot - self.base_slot) // WORD_BITS, len(self._words))
+        if dead_words <= 0:
+            return
+        self.slot_count -= sum(word.bit_count() for word in self._words[:dead_words])
+        self._words = self._words[dead_words:]
+        self.base_slot += dead_words * WORD_BITS
+
+    @property
+    def nbytes(self):
+        return len(self._words) * self._words.itemsize
@@ -0,0 +1,38 @@
+import unittest
+from assertpy import assert_that
+
+from SlotBitmap import SlotBitmap
+
+
+class SlotBitmapTest(unittest.TestCase):
+    def test_duplicate_heartbeats_share_a_slot(self):
+        slots = SlotBitmap(heartbeat_interval=10)
+        assert_that(slots.add(1000)).is_true()
+        assert_that(slots.add(1005)).is_false()
+        assert_that(slots.add(1000)).is_false()
+        assert_that(slots.slot_count).is_equal_to(1)
+
+    def test_count_spans_several_words(self):
+        slots = SlotBitmap(heartbeat_interval=1)
+        for epoch in range(0, 300, 2):
+            slots.add(epoch)
+        assert_that(slots.count(0, 300)).is_equal_to(150)
+        assert_that(slots.count(10, 200)).is_equal_to(95)
+        assert_that(slots.count(63, 65)).is_equal_to(1)
+
+    def test_older_slot_extends_bitmap_backwards(self):
+        slots = SlotBitmap(heartbeat_interval=10)
+        slots.add(100_000)
+        slots.add(1_000)
+        assert_that(slots.count(0, 20_000)).is_equal_to(2)
+        assert_that(slots.count(101, 10_000)).is_equal_to(0)
+
+    def test_count_outside_recorded_range_is_zero(self):
+        slots = SlotBitmap(heartbeat_interval=10)
+        assert_that(slots.count(0, 100)).is_equal_to(0)
+        slots.add(500)
+        assert_that(slots.count(100, 200)).is_equal_to(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
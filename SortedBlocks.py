@@ -0,0 +1,114 @@
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Sequence
+from itertools import accumulate, chain
+
+BLOCK_SIZE = 512  # keys per block; a block is split in two once it holds twice as many
+
+
+class SortedBlocks:
+    """
+    Sorted list kept as a list of blocks of at most 2 * BLOCK_SIZE keys,
+    whose freeze() shares every block left unchanged since the previous one.
+
+    An insert or removal finds its block with a binary search over the
+    blocks' last keys and edits that block alone, so publishing a snapshot
+    after a few changes copies a few blocks, not the whole order.
+    """
+
+    def __init__(self, keys=()):
+        """`keys` must already be sorted."""
+        keys = list(keys)
+        self._blocks = [keys[at:at + BLOCK_SIZE] for at in range(0, len(keys), BLOCK_SIZE)]
+        self._last = [block[-1] for block in self._blocks]
+        self._frozen = [None] * len(self._blocks)  # tuple per block, None once the block changed
+
+    def __len__(self):
+        return sum(map(len, self._blocks))
+
+    def __iter__(self):
+        return chain.from_iterable(self._blocks)
+
+    def add(self, key):
+        if not self._blocks:
+            self._blocks.append([key])
+            self._last.append(key)
+            self._frozen.append(None)
+            return
+        number = min(bisect_left(self._last, key), len(self._blocks) - 1)
+        block = self._blocks[number]
+        insort(block, key)
+        self._last[number] = block[-1]
+        self._frozen[number] = None
+        if len(block) > 2 * BLOCK_SIZE:
+            self._blocks[number:number + 1] = block[:BLOCK_SIZE], block[BLOCK_SIZE:]
+            self._last[number:number + 1] = block[BLOCK_SIZE - 1], block[-1]
+            self._frozen[number:number + 1] = None, None
+
+    def remove(self, key):
+        """Remove a key that is present."""
+        number = bisect_left(self._last, key)
+        block = self._blocks[number]
+        del block[bisect_left(block, key)]
+        if block:
+            self._last[number] = block[-1]
+            self._frozen[number] = None
+        else:
+            del self._blocks[number], self._last[number], self._frozen[number]
+
+    def freeze(self):
+        """Immutable FrozenOrder of the keys, in O(blocks + changed blocks * BLOCK_SIZE)."""
+        for number, frozen in enumerate(self._frozen):
+            if frozen is None:
+                self._frozen[number] = tuple(self._blocks[number])
+        return FrozenOrder(tuple(self._frozen))
+
+
+class FrozenOrder(Sequence):
+    """
+    Read-only snapshot of a SortedBlocks: a sequence of its keys, indexed,
+    sliced and binary-searched (bisect with key=) like the tuple it stands for.
+    """
+
+    def __init__(self, blocks=()):
+        self._blocks = blocks
+        self._starts = (0, *accumulate(map(len, blocks)))  # index of each block's first key, then the length
+
+    def __len__(self):
+        return self._starts[-1]
+
+    def __iter__(self):
+        return chain.from_iterable(self._blocks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return tuple(self[at] for at in range(start, stop, step))
+            return self._slice(start, stop)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("order index out of range")
+        number = bisect_right(self._starts, index) - 1
+        return self._blocks[number][index - self._starts[number]]
+
+    def _slice(self, start, stop):
+        if start >= stop:
+            return ()
+        first = bisect_right(self._starts, start) - 1
+        last = bisect_right(self._starts, stop - 1) - 1
+        if first == last:
+            return self._blocks[first][start - self._starts[first]:stop - self._starts[first]]
+        return (self._blocks[first][start - self._starts[first]:]
+                + tuple(chain.from_iterable(self._blocks[first + 1:last]))
+                + self._blocks[last][:stop - self._starts[last]])
+
+    def __eq__(self, other):
+        if isinstance(other, (FrozenOrder, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"FrozenOrder({tuple(self)!r})"
@@ -0,0 +1,48 @@
+import random
+import unittest
+from bisect import bisect_left, bisect_right
+from assertpy import assert_that
+
+from SortedBlocks import BLOCK_SIZE, SortedBlocks
+
+
+class SortedBlocksTest(unittest.TestCase):
+    def test_stays_sorted_through_adds_and_removes(self):
+        rng = random.Random(7)
+        blocks, expected = SortedBlocks(), []
+        for _ in range(6 * BLOCK_SIZE):
+            key = (rng.randrange(1000), rng.randrange(1000))
+            if expected and rng.random() < 0.3:
+                key = expected[rng.randrange(len(expected))]
+                blocks.remove(key)
+                expected.remove(key)
+            else:
+                blocks.add(key)
+                expected.append(key)
+        expected.sort()
+
+        assert_that(list(blocks)).is_equal_to(expected)
+        frozen = blocks.freeze()
+        assert_that(frozen).is_equal_to(tuple(expected))
+        assert_that(frozen[BLOCK_SIZE - 3:3 * BLOCK_SIZE + 5]).is_equal_to(tuple(expected[BLOCK_SIZE - 3:3 * BLOCK_SIZE + 5]))
+        assert_that(frozen[-1]).is_equal_to(expected[-1])
+        for value in (0, 250, 999, 1000):
+            assert_that(bisect_left(frozen, value, key=lambda k: k[0])).is_equal_to(
+                bisect_left(expected, value, key=lambda k: k[0]))
+            assert_that(bisect_right(frozen, value, key=lambda k: k[0])).is_equal_to(
+                bisect_right(expected, value, key=lambda k: k[0]))
+
+    def test_freeze_shares_the_blocks_that_did_not_change(self):
+        blocks = SortedBlocks(range(0, 20 * BLOCK_SIZE, 2))
+        first = blocks.freeze()
+        blocks.add(7)
+
+        second = blocks.freeze()
+
+        assert_that(second[:5]).is_equal_to((0, 2, 4, 6, 7))
+        assert_that([block for block in second._blocks if not any(block is old for old in first._blocks)]).is_length(1)
+        assert_that(first[:5]).is_equal_to((0, 2, 4, 6, 8))
+
+
+if __name__ == '__main__':
+    unittest.main()
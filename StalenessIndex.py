@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+
+DEFAULT_MISSED_HEARTBEATS = 3  # a device is offline after this many heartbeat intervals of silence
+
+
+@dataclass(frozen=True)
+class StatusChange:
+    device_id: str
+    online: bool
+    at: float  # epoch seconds of the heartbeat that brought it back, or of the deadline it missed
+
+
+class StalenessIndex:
+    """
+    Timer wheel of the time each device's next heartbeat is overdue by
+    (its last heartbeat plus `timeout`), so going offline is found without
+    scanning the fleet.
+
+    The wheel maps slots of `resolution` seconds to the devices whose
+    deadline falls in them. touch() moves a device to its new slot in O(1);
+    tick() visits only the slots that have come due since the previous tick,
+    and returns the online/offline transitions in the order they happened.
+    """
+
+    def __init__(self, timeout, resolution=1):
+        self.timeout = timeout
+        self.resolution = resolution
+        self.offline = set()
+        self._entries = {}  # device_id -> (deadline, slot)
+        self._slots = {}  # slot -> device_ids with their deadline in it
+        self._cursor = None  # slots up to this one have been visited
+        self._now = None  # time of the last tick
+        self._pending = []  # devices back online since the last tick
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_online(self, device_id):
+        return device_id in self._entries and device_id not in self.offline
+
+    def touch(self, device_id, epoch):
+        """Record a heartbeat; heartbeats older than the device's latest are ignored."""
+        entry = self._entries.get(device_id)
+        if entry is not None:
+            if epoch + self.timeout <= entry[0]:
+                return
+            self._unschedule(device_id, entry[1])
+        self._schedule(device_id, epoch)
+
+    def tick(self, now):
+        """Mark the devices whose deadline passed by `now` offline; returns the transitions since the last tick."""
+        events, self._pending = self._pending, []
+        self._now = now
+        last = int(now // self.resolution)
+        if self._cursor is None:
+            self._cursor = min(self._slots, default=last) - 1
+        if last - self._cursor <= len(self._slots):
+            due_slots = range(self._cursor + 1, last + 1)
+        else:  # a long pause: fewer occupied slots than elapsed ones
+            due_slots = sorted(slot for slot in self._slots if slot <= last)
+        for slot in due_slots:
+            device_ids = self._slots.get(slot)
+            if not device_ids:
+                continue
+            due = sorted((self._entries[device_id][0], device_id) for device_id in device_ids
+                         if self._entries[device_id][0] <= now)
+            for deadline, device_id in due:
+                device_ids.discard(device_id)
+                self._entries[device_id] = (deadline, None)
+                self.offline.add(device_id)
+                events.append(StatusChange(device_id, False, deadline))
+            if not device_ids:
+                del self._slots[slot]
+        self._cursor = last - 1  # the current slot can still receive deadlines later than now
+        return events
+
+    def set_timeout(self, timeout):
+        """Change the timeout, rescheduling every device; the changes show up on the next tick."""
+        if timeout == self.timeout:
+            return
+        last_seen = {device_id: deadline - self.timeout for device_id, (deadline, _) in self._entries.items()}
+        self.timeout = timeout
+        self._entries.clear()
+        self._slots.clear()
+        for device_id, epoch in last_seen.items():
+            self._schedule(device_id, epoch)
+
+    def _schedule(self, device_id, last_seen):
+        deadline = last_seen + self.timeout
+        if device_id in self.offline:
+            if self._now is not None and deadline <= self._now:
+                self._entries[device_id] = (deadline, None)  # still overdue: stays offline, nothing to wait for
+                return
+            self.offline.discard(device_id)
+            self._pending.append(StatusChange(device_id, True, last_seen))
+        slot = int(deadline // self.resolution)
+        if self._cursor is not None:
+            slot = max(slot, self._cursor + 1)  # already overdue: picked up by the next tick
+        self._entries[device_id] = (deadline, slot)
+        self._slots.setdefault(slot, set()).add(device_id)
+
+    def _unschedule(self, device_id, slot):
+        device_ids = self._slots.get(slot)
+        if device_ids is not None:
+            device_ids.discard(device_id)
+            if not device_ids:
+                del self._slots[slot]
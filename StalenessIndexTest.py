@@ -0,0 +1,62 @@
+import unittest
+
+from assertpy import assert_that
+
+from StalenessIndex import StalenessIndex, StatusChange
+
+
+class StalenessIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = StalenessIndex(timeout=30)
+        for number in range(5):
+            self.index.touch(f"device_{number}", 1000 + number * 10)
+
+    def test_devices_go_offline_when_their_deadline_passes(self):
+        assert_that(self.index.tick(1029)).is_empty()
+
+        changes = self.index.tick(1050)
+
+        assert_that(changes).is_equal_to([StatusChange("device_0", False, 1030), StatusChange("device_1", False, 1040),
+                                          StatusChange("device_2", False, 1050)])
+        assert_that(self.index.offline).is_equal_to({"device_0", "device_1", "device_2"})
+        assert_that(self.index.tick(1055)).is_empty()
+
+    def test_a_heartbeat_brings_a_device_back_online_and_moves_its_deadline(self):
+        self.index.tick(1100)
+        self.index.touch("device_0", 1101)
+
+        assert_that(self.index.is_online("device_0")).is_true()
+        assert_that(self.index.tick(1102)).is_equal_to([StatusChange("device_0", True, 1101)])
+        assert_that(self.index.tick(1130)).is_empty()
+        assert_that(self.index.tick(1131)).is_equal_to([StatusChange("device_0", False, 1131)])
+
+    def test_older_heartbeats_do_not_move_the_deadline(self):
+        self.index.touch("device_4", 1000)
+
+        assert_that(self.index.tick(1069)).is_length(4)
+        assert_that(self.index.tick(1070)).is_equal_to([StatusChange("device_4", False, 1070)])
+
+    def test_overdue_heartbeats_of_offline_devices_keep_them_offline(self):
+        self.index.tick(1200)
+        self.index.touch("device_0", 1150)
+
+        assert_that(self.index.is_online("device_0")).is_false()
+        assert_that(self.index.tick(1201)).is_empty()
+
+    def test_a_longer_timeout_brings_devices_back(self):
+        self.index.tick(1045)
+        self.index.set_timeout(60)
+
+        assert_that(self.index.tick(1046)).is_equal_to([StatusChange("device_0", True, 1000),
+                                                        StatusChange("device_1", True, 1010)])
+        assert_that(self.index.tick(1060)).is_equal_to([StatusChange("device_0", False, 1060)])
+
+    def test_a_long_pause_only_visits_occupied_slots(self):
+        changes = self.index.tick(10 ** 9)
+
+        assert_that([change.device_id for change in changes]).is_equal_to([f"device_{n}" for n in range(5)])
+        assert_that(self.index.offline).is_length(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+
+from assertpy import assert_that
+
+from ViewIndex import ViewIndex
+from DashboardSnapshot import DashboardSnapshot
+from table_query import page_delta, parse_filter, query_page
+
+
+def record(number, uptime):
+    return {'device_id': f"device_{number:03d}", 'last_seen': f"2024-01-01 00:{number % 60:02d}:00 UTC", 'uptime': uptime,
+            'status': "online", 'group': f"site{number % 12}/rack{number % 2}", 'last_outage': "", 'outages': 0}
+
+
+class TableQueryTest(unittest.TestCase):
+    def setUp(self):
+        self.view = ViewIndex()
+        self.view.rebuild(record(number, number % 101) for number in range(300))
+
+    def page(self, *args, **kwargs):
+        return query_page(*self.view.freeze(), *args, **kwargs)
+
+    def test_default_page_is_ordered_by_device_id(self):
+        records, total = self.page(1, 10)
+
+        assert_that(total).is_equal_to(300)
+        assert_that([r['device_id'] for r in records]).is_equal_to([f"device_{n:03d}" for n in range(10, 20)])
+
+    def test_worst_uptime_first(self):
+        records, _ = self.page(0, 4, [{'column_id': 'uptime', 'direction': 'asc'}])
+        best, _ = self.page(0, 2, [{'column_id': 'uptime', 'direction': 'desc'}])
+
+        assert_that([r['uptime'] for r in records]).is_equal_to([0, 0, 0, 1])
+        assert_that([r['uptime'] for r in best]).is_equal_to([100, 100])
+
+    def test_range_filter_on_the_sort_column(self):
+        sort = [{'column_id': 'uptime', 'direction': 'desc'}]
+        records, total = self.page(0, 5, sort, "{uptime} s< 50 && {uptime} >= 40")
+
+        assert_that(total).is_equal_to(30)
+        assert_that([r['uptime'] for r in records]).is_equal_to([49, 49, 49, 48, 48])
+
+    def test_filters_on_other_columns(self):
+        records, total = self.page(0, 50, None, '{device_id} icontains "_29" && {uptime} > 90')
+
+        assert_that(total).is_equal_to(7)
+        assert_that(all(r['uptime'] > 90 and '_29' in r['device_id'] for r in records)).is_true()
+
+    def snapshot(self, version, changes):
+        records_by_id, orders = self.view.freeze()
+        return DashboardSnapshot(version, records_by_id=records_by_id, orders=orders, changes=changes)
+
+    def test_page_delta_skips_records_the_client_holds(self):
+        self.view.update(record(2, 7))
+        snapshot = self.snapshot(3, ((2, frozenset()), (3, frozenset({"device_002"}))))
+        known = [f"device_{n:03d}" for n in range(4)]
+
+        delta, _ = page_delta(snapshot, 2, known, 0, 5)
+        assert_that(delta['ids']).is_equal_to([f"device_{n:03d}" for n in range(5)])
+        assert_that(sorted(delta['rows'])).is_equal_to(["device_002", "device_004"])
+
+    def test_page_delta_sends_the_whole_page_when_history_is_missing(self):
+        snapshot = self.snapshot(5, ((4, frozenset()), (5, None)))
+
+        assert_that(page_delta(snapshot, 4, ["device_000"], 0, 3)[0]['rows']).is_length(3)
+        assert_that(page_delta(snapshot, 1, ["device_000"], 0, 3)[0]['rows']).is_length(3)
+
+    def test_updates_move_records(self):
+        self.view.update(record(5, 100))
+
+        records, _ = self.page(0, 3, [{'column_id': 'uptime', 'direction': 'desc'}])
+        assert_that([r['device_id'] for r in records]).is_equal_to(["device_201", "device_100", "device_005"])
+        assert_that(self.page(0, 400, None, "{uptime} = 5")[1]).is_equal_to(2)
+
+    def test_group_filter_matches_the_groups_below_it(self):
+        site, site_total = self.page(0, 50, None, '{group} datestartswith "site1"')
+        rack, rack_total = self.page(0, 50, None, '{group} datestartswith "site1/rack1"')
+
+        assert_that(site_total).is_equal_to(25)  # not site10 or site11
+        assert_that({r['group'] for r in site}).is_equal_to({"site1/rack1"})
+        assert_that(rack_total).is_equal_to(25)
+
+    def test_unsupported_filters_are_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_filter("{battery} > 5")
+
+
+if __name__ == '__main__':
+    unittest.main()
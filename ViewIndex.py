@@ -0,0 +1,60 @@
+from types import MappingProxyType
+
+from ChunkedMap import ChunkedMap
+from SortedBlocks import SortedBlocks
+
+SORT_COLUMNS = ("device_id", "last_seen", "uptime", "status", "group", "last_outage", "outages")
+
+
+class ViewIndex:
+    """
+    Table records kept in order of every sortable column, so a page of the
+    table sorted by any of them is a slice of one order.
+
+    Each order holds (value, device_id) keys. last_seen is formatted as
+    'YYYY-MM-DD HH:MM:SS UTC', so its text order is its time order. A changed
+    record is moved with a binary search and one block insert per column.
+    Records and orders are chunked (see ChunkedMap and SortedBlocks), so a
+    freeze after a few updates shares almost everything with the previous one.
+    """
+
+    def __init__(self):
+        self._records = ChunkedMap()  # device_id -> record
+        self._orders = {column: SortedBlocks() for column in SORT_COLUMNS}
+
+    def __len__(self):
+        return len(self._records)
+
+    def update(self, record):
+        """Insert or replace one record; returns whether it differs from the one it replaces."""
+        device_id = record['device_id']
+        old = self._records.get(device_id)
+        if old == record:
+            return False
+        for column, order in self._orders.items():
+            if old is not None:
+                if old[column] == record[column]:
+                    continue
+                order.remove((old[column], device_id))
+            order.add((record[column], device_id))
+        self._records[device_id] = record
+        return True
+
+    def rebuild(self, records):
+        """Replace every record at once, in O(n log n)."""
+        self._records = ChunkedMap((record['device_id'], record) for record in records)
+        self._orders = {column: SortedBlocks(sorted((record[column], record['device_id'])
+                                                    for record in self._records.values()))
+                        for column in SORT_COLUMNS}
+
+    def records(self):
+        return self._records.values()
+
+    def freeze(self):
+        """
+        Immutable copy for a DashboardSnapshot: (records by device_id, orders
+        by column). Costs O(n / chunk size) plus the chunks changed since the
+        last freeze, whatever the number of records.
+        """
+        return (self._records.freeze(),
+                MappingProxyType({column: order.freeze() for column, order in self._orders.items()}))
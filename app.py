@@ -1,11 +1,12 @@
-from dash import Dash, html, dash_table, dcc
-from Dashboard import DashBoard
+from dash import Dash, html, dash_table, dcc, no_update
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State
-import pandas as pd
-from datetime import datetime, timedelta
-import time
-from mqtt_client import MQTTHeartbeatClient
+from datetime import datetime, timedelta, timezone
+import os
+from flask import Response, jsonify
+import metrics
+from app_lifecycle import AppLifecycle
+from GroupIndex import group_path
 
 # Time window options in seconds
 TIME_WINDOWS = {
@@ -16,6 +17,8 @@ TIME_WINDOWS = {
     4: 2592000      # 30 days
 }
 
+PAGE_SIZE = 50  # table rows sent to the browser per page
+
 TIME_WINDOW_LABELS = {
     0: "1 Hour",
     1: "1 Day",
@@ -24,169 +27,371 @@ TIME_WINDOW_LABELS = {
     4: "1 Month"
 }
 
-# Initialize the Dash app with a Bootstrap theme
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-
-# Initialize your Dashboard
-dashboard = DashBoard()
-
-# Initialize and start MQTT client
-mqtt_client = MQTTHeartbeatClient(dashboard)
-mqtt_client.start()
 
 # Layout of the app
-app.layout = dbc.Container([
-    # Header row with title and settings button
-    dbc.Row([
-        dbc.Col(
-            html.H1("Device Heartbeat Dashboard", className="text-center"),
-            width=10
-        ),
-        dbc.Col(
-            dbc.Button(
-                "Settings ",
-                id="settings-button",
-                color="secondary",
-                className="float-end",
-                n_clicks=0,
+def build_layout():
+    return dbc.Container([
+        # Header row with title and settings button
+        dbc.Row([
+            dbc.Col(
+                html.H1("Device Heartbeat Dashboard", className="text-center"),
+                width=10
             ),
-            width=2,
-            className="d-flex align-items-center"
-        ),
-    ], className="mb-4"),
-
-    # Settings Button
-    # dbc.Button(
-    #     "Settings ",
-    #     id="settings-button",
-    #     color="secondary",
-    #     className="mb-3",
-    #     n_clicks=0,
-    # ),
-
-    # Collapsible Settings
-    dbc.Collapse(
-        dbc.Card([
-            dbc.CardBody([
-                html.H4("Dashboard Settings", className="mb-3"),
-                dbc.Row([
-                    dbc.Col([
-                        html.Label("Heartbeat Interval (seconds)"),
-                        dbc.Input(
-                            id="heartbeat-interval",
-                            type="number",
-                            value=10,
-                            min=1,
-                            step=1
-                        ),
-                    ], width=6),
-                    dbc.Col([
-                        html.Label("Uptime Window"),
-                        dcc.Slider(
-                            id="uptime-window",
-                            min=0,
-                            max=4,
-                            step=1,
-                            value=0,
-                            marks=TIME_WINDOW_LABELS
-                        ),
-                    ], width=6),
-                ]),
+            dbc.Col(
                 dbc.Button(
-                    "Update Settings",
-                    id="update-settings",
-                    color="primary",
-                    className="mt-3"
+                    "Settings ",
+                    id="settings-button",
+                    color="secondary",
+                    className="float-end",
+                    n_clicks=0,
                 ),
-            ])
+                width=2,
+                className="d-flex align-items-center"
+            ),
+        ], className="mb-4"),
+
+        # Settings Button
+        # dbc.Button(
+        #     "Settings ",
+        #     id="settings-button",
+        #     color="secondary",
+        #     className="mb-3",
+        #     n_clicks=0,
+        # ),
+
+        # Collapsible Settings
+        dbc.Collapse(
+            dbc.Card([
+                dbc.CardBody([
+                    html.H4("Dashboard Settings", className="mb-3"),
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Heartbeat Interval (seconds)"),
+                            dbc.Input(
+                                id="heartbeat-interval",
+                                type="number",
+                                value=10,
+                                min=1,
+                                step=1
+                            ),
+                        ], width=6),
+                        dbc.Col([
+                            html.Label("Uptime Window"),
+                            dcc.Slider(
+                                id="uptime-window",
+                                min=0,
+                                max=4,
+                                step=1,
+                                value=0,
+                                marks=TIME_WINDOW_LABELS
+                            ),
+                        ], width=6),
+                    ]),
+                    dbc.Button(
+                        "Update Settings",
+                        id="update-settings",
+                        color="primary",
+                        className="mt-3"
+                    ),
+                ])
+            ], className="mb-4"),
+            id="settings-collapse",
+            is_open=False,
+        ),
+
+        # Fleet health per site/rack group; a toggle cell expands or collapses a group,
+        # any other cell filters the device table to the devices below that group
+        dbc.Card([
+            dbc.CardHeader("Groups"),
+            dbc.CardBody(dash_table.DataTable(
+                id='group-table',
+                columns=[
+                    {'name': '', 'id': 'toggle'},
+                    {'name': 'Group', 'id': 'label'},
+                    {'name': 'Devices', 'id': 'devices', 'type': 'numeric'},
+                    {'name': 'Online', 'id': 'online', 'type': 'numeric'},
+                    {'name': 'Offline', 'id': 'offline', 'type': 'numeric'},
+                    {'name': 'Uptime (%)', 'id': 'uptime', 'type': 'numeric'}
+                ],
+                style_cell={'textAlign': 'left', 'padding': '6px', 'whiteSpace': 'pre'},
+                style_cell_conditional=[{'if': {'column_id': 'toggle'}, 'width': '2em', 'cursor': 'pointer'}],
+                style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'},
+                style_data_conditional=[
+                    {'if': {'column_id': 'uptime', 'filter_query': '{uptime} < 90'}, 'color': 'orange'},
+                    {'if': {'column_id': 'uptime', 'filter_query': '{uptime} < 50'}, 'color': 'red'},
+                    {'if': {'column_id': 'offline', 'filter_query': '{offline} > 0'}, 'color': 'red'}
+                ]
+            ))
         ], className="mb-4"),
-        id="settings-collapse",
-        is_open=False,
-    ),
-
-    # Data table
-    dash_table.DataTable(
-        id='dashboard-table',
-        columns=[
-            {'name': 'Device ID', 'id': 'device_id'},
-            {'name': 'Last Seen', 'id': 'last_seen'},
-            {'name': 'Uptime (%)', 'id': 'uptime'}
-        ],
-        style_table={'overflowX': 'auto'},
-        style_cell={
-            'textAlign': 'left',
-            'padding': '10px'
-        },
-        style_header={
-            'backgroundColor': 'rgb(230, 230, 230)',
-            'fontWeight': 'bold'
-        },
-        style_data_conditional=[
-            {
-                'if': {'column_id': 'uptime', 'filter_query': '{uptime} >= 90'},
-                'color': 'green'
+        dcc.Store(id='expanded-groups', data=[""]),  # names of the expanded groups; the fleet is open at first
+
+        # Data table; paging, sorting and filtering happen on the server
+        dash_table.DataTable(
+            id='dashboard-table',
+            page_action='custom',
+            page_current=0,
+            page_size=PAGE_SIZE,
+            sort_action='custom',
+            sort_mode='single',
+            sort_by=[],
+            filter_action='custom',
+            filter_query='',
+            columns=[
+                {'name': 'Device ID', 'id': 'device_id'},
+                {'name': 'Last Seen', 'id': 'last_seen'},
+                {'name': 'Uptime (%)', 'id': 'uptime', 'type': 'numeric'},
+                {'name': 'Status', 'id': 'status'},
+                {'name': 'Last Outage', 'id': 'last_outage'},
+                {'name': 'Outages', 'id': 'outages', 'type': 'numeric'},
+                {'name': 'Group', 'id': 'group'}
+            ],
+            style_table={'overflowX': 'auto'},
+            style_cell={
+                'textAlign': 'left',
+                'padding': '10px'
             },
-            {
-                'if': {'column_id': 'uptime', 'filter_query': '{uptime} < 90'},
-                'color': 'orange'
+            style_header={
+                'backgroundColor': 'rgb(230, 230, 230)',
+                'fontWeight': 'bold'
             },
-            {
-                'if': {'column_id': 'uptime', 'filter_query': '{uptime} < 50'},
-                'color': 'red'
-            }
-        ]
-    ),
-
-    # Update interval
-    dcc.Interval(
-        id='interval-component',
-        interval=10 * 1000,  # in milliseconds
-        n_intervals=0
-    )
-], fluid=True)
+            style_data_conditional=[
+                {
+                    'if': {'column_id': 'uptime', 'filter_query': '{uptime} >= 90'},
+                    'color': 'green'
+                },
+                {
+                    'if': {'column_id': 'uptime', 'filter_query': '{uptime} < 90'},
+                    'color': 'orange'
+                },
+                {
+                    'if': {'column_id': 'uptime', 'filter_query': '{uptime} < 50'},
+                    'color': 'red'
+                },
+                {
+                    'if': {'column_id': 'status', 'filter_query': '{status} = offline'},
+                    'color': 'red',
+                    'fontWeight': 'bold'
+                }
+            ]
+        ),
+
+        # Rows of the latest update for the table (patched in by the browser), and what the browser holds
+        dcc.Store(id='table-delta'),
+        dcc.Store(id='table-view'),
+
+        # Drill-down: heartbeats per time bucket of the device selected in the table
+        dcc.Graph(id='device-timeline', config={'displayModeBar': False}),
+
+        # Update interval
+        dcc.Interval(
+            id='interval-component',
+            interval=10 * 1000,  # in milliseconds
+            n_intervals=0
+        )
+    ], fluid=True)
 
 
-@app.callback(
-    Output("settings-collapse", "is_open"),
-    [Input("settings-button", "n_clicks")],
-    [State("settings-collapse", "is_open")],
-)
 def toggle_settings(n_clicks, is_open):
     if n_clicks:
         return not is_open
     return is_open
 
 
-@app.callback(
-    Output('dashboard-table', 'data'),
-    Input('interval-component', 'n_intervals'),
-    Input('update-settings', 'n_clicks'),
-    State('heartbeat-interval', 'value'),
-    State('uptime-window', 'value')
-)
-def update_table(n, n_clicks, heartbeat_interval, uptime_window_index):
+@metrics.UPDATE_TABLE_SECONDS.timed
+def update_table(dashboard, n, n_clicks, page_current, page_size, sort_by, filter_query, heartbeat_interval,
+                 uptime_window_index, table_view=None):
     # Update dashboard settings if they've changed
     if heartbeat_interval and uptime_window_index is not None:
-        dashboard.heartbeat_interval = heartbeat_interval
-        dashboard.uptime_window = TIME_WINDOWS[uptime_window_index]
-
-    # Get the DataFrame from your Dashboard
-    df = dashboard.generateViewFrame()
-    
-    # Convert the DataFrame to records
-    records = df.to_dict('records')
-    
-    # Format the timestamps in the records
+        settings = (heartbeat_interval, TIME_WINDOWS[uptime_window_index])
+        if settings != (dashboard.heartbeat_interval, dashboard.uptime_window):
+            version = dashboard.snapshot().version
+            dashboard.heartbeat_interval, dashboard.uptime_window = settings
+            # The ingest worker picks the new settings up on its next publish
+            if dashboard.background_publishing:
+                dashboard.wait_for_snapshot(version, timeout=1)
+
+    # Nothing to send when the browser already shows this page of the current view version
+    page_size = page_size or PAGE_SIZE
+    query = {'page_current': page_current or 0, 'page_size': page_size, 'sort_by': sort_by or [],
+             'filter_query': filter_query or ""}
+    table_view = table_view or {}
+    if table_view.get('query') == query and table_view.get('version') == dashboard.snapshot().version:
+        return no_update, no_update, no_update
+
+    # Otherwise only the page's rows the browser lacks, from the latest published snapshot;
+    # the ingest worker is never blocked by this read
+    try:
+        delta, total = dashboard.page_delta(table_view.get('version', 0), table_view.get('ids', ()), query['page_current'],
+                                            page_size, sort_by, filter_query)
+    except ValueError:
+        # a filter the table cannot apply matches nothing
+        delta, total = {'version': dashboard.snapshot().version, 'ids': [], 'rows': {}}, 0
+    table_view = {'version': delta['version'], 'query': query, 'ids': delta['ids']}
+    return delta, table_view, max(-(-total // page_size), 1)
+
+
+def update_groups(dashboard, n, expanded):
+    """Rows of the group table: every group whose parents are all expanded, parents first."""
+    records = dashboard.view_groups()
+    expanded = set(expanded or ())
+    parents = {name for record in records for name in _parents(record['group'])}
+    rows = []
     for record in records:
-        if 'last_seen' in record:
-            record['last_seen'] = record['last_seen'].strftime('%Y-%m-%d %H:%M:%S %Z')
-    
-    return records
+        name = record['group']
+        if not all(parent in expanded for parent in _parents(name)):
+            continue
+        toggle = ("▾" if name in expanded else "▸") if name in parents else ""
+        label = "  " * record['depth'] + (group_path(name)[-1] if name else "All devices")
+        rows.append(dict(record, toggle=toggle, label=label))
+    return rows
+
+
+def select_group(active_cell, rows, expanded):
+    """Expand or collapse a group from its toggle cell, or show only its devices from any other cell."""
+    if not active_cell or not rows or active_cell['row'] >= len(rows):
+        return no_update, no_update, no_update
+    row = rows[active_cell['row']]
+    name = row['group']
+    if active_cell['column_id'] == 'toggle':
+        if not row['toggle']:
+            return no_update, no_update, no_update
+        expanded = list(expanded or ())
+        return [group for group in expanded if group != name] if name in expanded else expanded + [name], \
+            no_update, no_update
+    return no_update, f'{{group}} datestartswith "{name}"' if name else "", 0
+
+
+def _parents(name):
+    """Names of the groups above the group called `name`."""
+    path = group_path(name)
+    return ["/".join(path[:depth]) for depth in range(len(path))]
+
+
+def update_timeline(dashboard, active_cell, n, rows, uptime_window_index):
+    import plotly.graph_objects as go  # only needed once a chart is drawn
+
+    figure = go.Figure(layout={'height': 250, 'margin': {'l': 40, 'r': 20, 't': 40, 'b': 30}})
+    if not active_cell or not rows or active_cell['row'] >= len(rows):
+        figure.update_layout(title="Select a device to see its heartbeats")
+        return figure
+    device_id = rows[active_cell['row']]['device_id']
+    end = datetime.now(tz=timezone.utc).timestamp()
+    window = TIME_WINDOWS[uptime_window_index or 0]
+    timeline = dashboard.heartbeat_timeline(device_id, end - window, end)
+    if timeline is None:
+        figure.update_layout(title=f"{device_id}: history is kept by the ingest workers")
+        return figure
+
+    # Only the per-bucket counts reach the browser, never raw heartbeats
+    first, resolution, counts = timeline
+    starts = [datetime.fromtimestamp(first + i * resolution, tz=timezone.utc) for i in range(len(counts))]
+    figure.add_bar(x=starts, y=counts, name="Heartbeats", marker_color="steelblue")
+    figure.add_scatter(x=[starts[0], starts[-1]], y=[resolution / dashboard.heartbeat_interval] * 2, mode="lines",
+                       name="Expected", line={'color': 'gray', 'dash': 'dash'})
+    figure.update_layout(title=f"{device_id}: heartbeats per {timedelta(seconds=resolution)}", showlegend=False)
+    return figure
+
+
+def create_app(lifecycle):
+    """
+    The Dash app, ready to serve at once with the dashboard `lifecycle`
+    provides; call lifecycle.start() to warm it up in the background.
+    """
+    app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+    app.layout = build_layout()
+
+    # Prometheus metrics at /metrics
+    @app.server.route("/metrics")
+    def serve_metrics():
+        return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+    # Warm-up progress; 503 until history is restored and ingest has started
+    @app.server.route("/ready")
+    def serve_ready():
+        progress = lifecycle.progress()
+        return jsonify(progress), 200 if progress['ready'] else 503
+
+    app.callback(
+        Output("settings-collapse", "is_open"),
+        [Input("settings-button", "n_clicks")],
+        [State("settings-collapse", "is_open")],
+    )(toggle_settings)
+
+    @app.callback(
+        Output('table-delta', 'data'),
+        Output('table-view', 'data'),
+        Output('dashboard-table', 'page_count'),
+        Input('interval-component', 'n_intervals'),
+        Input('update-settings', 'n_clicks'),
+        Input('dashboard-table', 'page_current'),
+        Input('dashboard-table', 'page_size'),
+        Input('dashboard-table', 'sort_by'),
+        Input('dashboard-table', 'filter_query'),
+        State('heartbeat-interval', 'value'),
+        State('uptime-window', 'value'),
+        State('table-view', 'data')
+    )
+    def table_callback(*args):
+        # The dashboard is looked up per call: warm-up swaps in the restored one
+        return update_table(lifecycle.dashboard, *args)
+
+    @app.callback(
+        Output('group-table', 'data'),
+        Input('interval-component', 'n_intervals'),
+        Input('expanded-groups', 'data')
+    )
+    def groups_callback(*args):
+        return update_groups(lifecycle.dashboard, *args)
+
+    app.callback(
+        Output('expanded-groups', 'data'),
+        Output('dashboard-table', 'filter_query'),
+        Output('dashboard-table', 'page_current'),
+        Input('group-table', 'active_cell'),
+        State('group-table', 'data'),
+        State('expanded-groups', 'data')
+    )(select_group)
+
+    # Patch the changed rows into the table in the browser, reusing the rows it already holds
+    app.clientside_callback(
+        """
+        function(delta, rows) {
+            if (!delta) {
+                return window.dash_clientside.no_update;
+            }
+            const known = {};
+            (rows || []).forEach(row => { known[row.device_id] = row; });
+            return delta.ids.map(id => delta.rows[id] || known[id]).filter(row => row !== undefined);
+        }
+        """,
+        Output('dashboard-table', 'data'),
+        Input('table-delta', 'data'),
+        State('dashboard-table', 'data')
+    )
+
+    @app.callback(
+        Output('device-timeline', 'figure'),
+        Input('dashboard-table', 'active_cell'),
+        Input('interval-component', 'n_intervals'),
+        State('dashboard-table', 'data'),
+        State('uptime-window', 'value')
+    )
+    def timeline_callback(*args):
+        return update_timeline(lifecycle.dashboard, *args)
+
+    return app
 
 
 if __name__ == '__main__':
+    lifecycle = AppLifecycle.from_env()
+    app = create_app(lifecycle)
+    debug = True
+    # The reloader runs this file in a parent that only watches for changes and a child that
+    # serves; only the serving process warms up, so there is one MQTT connection
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        lifecycle.start()
     try:
-        app.run_server(debug=True)
+        app.run_server(debug=debug)
     finally:
         # Ensure MQTT client is properly stopped when the app exits
-        mqtt_client.stop()
+        lifecycle.stop()
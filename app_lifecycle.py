@@ -0,0 +1,140 @@
+"""
+What the Dash app runs besides serving pages: restoring history, the ingest
+pipeline and the MQTT connection (or the shard workers).
+
+The web server answers as soon as the app is created. AppLifecycle.start()
+does the slow parts on a background thread: it builds the real dashboard on
+the side, restores its history, starts ingest and only then connects to the
+broker, retrying with backoff while it is down. Until the new dashboard is
+swapped in, pages show an empty one, and progress() (served at /ready) says
+how far warm-up has got. Modules only warm-up needs are imported there.
+"""
+import os
+import threading
+import time
+
+import metrics
+from Dashboard import DashBoard
+
+
+class AppLifecycle:
+    def __init__(self, log_dir=None, shards=1, db=None, broker="localhost", port=1883, min_backoff=1,
+                 max_backoff=60, registry=metrics.REGISTRY):
+        self.log_dir = log_dir  # HeartbeatLog to replay and keep appending to
+        self.shards = shards  # ingest worker processes; history is not restored with more than one
+        self.db = db  # SQLite database to keep heartbeats in, instead of memory
+        self.broker = broker
+        self.port = port
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.registry = registry
+        self.dashboard = DashBoard()  # empty until warm-up has built the real one
+        self.mqtt_client = None
+        self.stage = "created"  # then "restoring", "starting ingest" and "ready", or "failed"
+        self.error = None
+        self.heartbeats_restored = 0
+        self.warm_up_seconds = None
+        self._started = None
+        self._thread = None
+        self._stops = []  # what stop() undoes, in start order
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        return cls(log_dir=environ.get("HEARTBEAT_LOG_DIR"), shards=int(environ.get("HEARTBEAT_SHARDS", "1")),
+                   db=environ.get("HEARTBEAT_DB"), broker=environ.get("MQTT_BROKER", "localhost"),
+                   port=int(environ.get("MQTT_PORT", "1883")))
+
+    @property
+    def ready(self):
+        return self.stage == "ready"
+
+    def start(self):
+        """Begin warming up on a background thread and return at once; later calls do nothing."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._started = time.monotonic()
+            self._thread = threading.Thread(target=self._warm_up, name="app-warm-up", daemon=True)
+            self._thread.start()
+
+    def wait_until_ready(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _warm_up(self):
+        try:
+            if self.shards > 1:
+                from sharded_ingest import ShardedDashboard
+
+                self.stage = "starting ingest"
+                dashboard = ShardedDashboard(self.shards, self.broker, self.port)
+                dashboard.start()
+                self._stops.append(dashboard.stop)
+                ingest_stats, mqtt_connected = (lambda: dashboard.stats), (lambda: None)
+            else:
+                self.stage = "restoring"
+                dashboard = self._restore()
+                self.stage = "starting ingest"
+                from mqtt_client import MQTTHeartbeatClient
+
+                client = MQTTHeartbeatClient(dashboard, self.broker, self.port, min_backoff=self.min_backoff,
+                                             max_backoff=self.max_backoff)
+                client.start(retry=True)
+                self._stops.append(client.stop)
+                self.mqtt_client = client
+                ingest_stats = lambda: [client.pipeline.stats.as_dict()]
+                mqtt_connected = lambda: client.connected
+        except Exception as e:
+            self.stage, self.error = "failed", repr(e)
+            print(f"Warm-up failed: {e!r}")
+            return
+        metrics.instrument(dashboard, ingest_stats, mqtt_connected, self.registry)
+        self.dashboard = dashboard
+        self.warm_up_seconds = time.monotonic() - self._started
+        self.stage = "ready"
+        print(f"Ready after {self.warm_up_seconds:.1f}s")
+
+    def _restore(self):
+        storage = None
+        if self.db:
+            from SQLiteStorage import SQLiteStorage
+
+            storage = SQLiteStorage(self.db)
+            self._stops.append(storage.close)
+        dashboard = DashBoard(storage=storage)
+        # Optional persistence: restore history from the heartbeat log, then keep appending to it
+        if self.log_dir:
+            from HeartbeatLog import HeartbeatLog
+
+            heartbeat_log = HeartbeatLog(self.log_dir, retention=dashboard.retention)
+            self._stops.append(heartbeat_log.close)
+            # The database already holds what was logged before its newest heartbeat
+            since = None if storage is None else max(
+                (device.last_seen_epoch() for device in storage.values()), default=None)
+            self.heartbeats_restored = heartbeat_log.replay(dashboard, self._restored, since)
+            dashboard.log = heartbeat_log
+        return dashboard
+
+    def _restored(self, heartbeats):
+        self.heartbeats_restored = heartbeats
+
+    def progress(self):
+        """Warm-up state, as served at /ready."""
+        client = self.mqtt_client
+        if self.warm_up_seconds is not None:
+            seconds = self.warm_up_seconds
+        else:
+            seconds = 0.0 if self._started is None else time.monotonic() - self._started
+        return {'ready': self.ready, 'stage': self.stage, 'seconds': round(seconds, 3),
+                'heartbeats_restored': self.heartbeats_restored,
+                'mqtt_connected': None if client is None else client.connected,
+                'mqtt_connect_attempts': None if client is None else client.connect_attempts,
+                'error': self.error}
+
+    def stop(self):
+        """Wait for warm-up to finish, then stop everything it started, newest first."""
+        self.wait_until_ready()
+        while self._stops:
+            self._stops.pop()()
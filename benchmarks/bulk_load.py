@@ -0,0 +1,46 @@
+"""
+Time DashBoard.bulk_load on a month of historical_data_generator output,
+against feeding the same heartbeats through addHeartBeat.
+
+Run from the repository root:
+    python -m benchmarks.bulk_load --days 30
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+from Dashboard import DashBoard
+from Heartbeat import HeartBeat
+from historical_data_generator import HistoricalDataGenerator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--add-limit", type=int, default=200_000,
+                        help="heartbeats timed through addHeartBeat, extrapolated to the full set")
+    args = parser.parse_args()
+
+    heartbeats = HistoricalDataGenerator(days=args.days).generate_heartbeats()
+    device_ids = [heartbeat["device_id"] for heartbeat in heartbeats]
+    epochs = [heartbeat["timestamp"] for heartbeat in heartbeats]
+
+    started = time.perf_counter()
+    DashBoard().bulk_load(device_ids, epochs)
+    bulk = time.perf_counter() - started
+
+    sample = [HeartBeat(heartbeat["device_id"], datetime.fromtimestamp(heartbeat["timestamp"], tz=timezone.utc))
+              for heartbeat in heartbeats[:args.add_limit]]
+    dashboard = DashBoard()
+    started = time.perf_counter()
+    for heartbeat in sample:
+        dashboard.addHeartBeat(heartbeat)
+    one_by_one = (time.perf_counter() - started) * len(heartbeats) / max(len(sample), 1)
+
+    print(f"{len(heartbeats):,} heartbeats over {args.days} days")
+    print(f"bulk_load     {bulk:7.2f}s")
+    print(f"addHeartBeat  {one_by_one:7.2f}s  (extrapolated from {len(sample):,})")
+
+
+if __name__ == "__main__":
+    main()
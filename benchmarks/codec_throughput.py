@@ -0,0 +1,48 @@
+"""
+Compare decode throughput of JSON heartbeat payloads against the binary
+format in heartbeat_codec, single records and packed batches.
+
+Run from the repository root:
+    python -m benchmarks.codec_throughput --count 200000
+"""
+import argparse
+import json
+import time
+
+import heartbeat_codec
+from ingest_pipeline import parse_message
+
+
+def timed(decode_all):
+    started = time.perf_counter()
+    decode_all()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200_000, help="heartbeats to decode per format")
+    parser.add_argument("--batch-size", type=int, default=1000, help="heartbeats per packed binary message")
+    args = parser.parse_args()
+
+    heartbeats = [(f"device_{i % 10_000:05d}", 1_700_000_000 + 10 * i) for i in range(args.count)]
+    json_payloads = [json.dumps({"device_id": device_id, "timestamp": ts}).encode() for device_id, ts in heartbeats]
+    binary_payloads = [heartbeat_codec.encode(device_id, ts) for device_id, ts in heartbeats]
+    batches = [heartbeat_codec.encode_batch(heartbeats[i:i + args.batch_size])
+               for i in range(0, len(heartbeats), args.batch_size)]
+
+    results = {
+        "json (decode only)": (timed(lambda: [json.loads(p) for p in json_payloads]), sum(map(len, json_payloads))),
+        "binary (decode only)": (timed(lambda: [heartbeat_codec.decode(p) for p in binary_payloads]), sum(map(len, binary_payloads))),
+        f"binary x{args.batch_size} (decode only)": (timed(lambda: [heartbeat_codec.decode(p) for p in batches]), sum(map(len, batches))),
+        "json -> HeartBeat": (timed(lambda: [parse_message(p) for p in json_payloads]), sum(map(len, json_payloads))),
+        f"binary x{args.batch_size} -> HeartBeat": (timed(lambda: [parse_message(p) for p in batches]), sum(map(len, batches))),
+    }
+
+    print(f"{args.count} heartbeats")
+    for name, (seconds, size) in results.items():
+        print(f"{name:<32} {args.count / seconds:12,.0f} heartbeats/s  {size / args.count:6.1f} bytes/heartbeat")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+MQTTHeartbeatClient throughput and ingest-to-table latency on one machine,
+without a broker or network: LoadGenerator workers send to a LocalBroker,
+which delivers to the client's on_message as paho would.
+
+Latency is measured with probes: every 100 ms a heartbeat of a new device
+is published behind the load, and the time until that device is in a
+published snapshot (what update_table serves) is recorded.
+
+Run from the repository root:
+    python -m benchmarks.end_to_end --devices 100000 --interval 10 --workers 4 --duration 30
+    python -m benchmarks.end_to_end --devices 100000 --speed 0 --binary   # as fast as ingest keeps up
+"""
+import argparse
+import json
+import threading
+import time
+
+from benchmarks.fleet_scale import percentiles
+from Dashboard import DashBoard
+from ingest_pipeline import IngestPipeline
+from load_generator import TOPIC_BASE, LoadGenerator, LoadProfile, LocalBroker
+from mqtt_client import MQTTHeartbeatClient
+
+PROBE_EVERY = 0.1  # seconds
+PROBE_TIMEOUT = 10.0
+
+
+def probe(dashboard, broker, stopping, latencies):
+    """Publish probe heartbeats one at a time and time until each reaches a published snapshot."""
+    number = 0
+    while not stopping.is_set():
+        number += 1
+        device_id = f"probe-{number}"
+        sent = time.time()
+        broker.publish(f"{TOPIC_BASE}/{device_id}", json.dumps({"device_id": device_id, "timestamp": sent}).encode())
+        while device_id not in dashboard.snapshot().records_by_id:
+            if time.time() - sent > PROBE_TIMEOUT:
+                break
+            time.sleep(0.001)
+        else:
+            latencies.append(time.time() - sent)
+        stopping.wait(PROBE_EVERY)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=10_000)
+    parser.add_argument("--interval", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=30.0, help="virtual seconds of heartbeats to send")
+    parser.add_argument("--speed", type=float, default=1.0, help="virtual seconds per second; 0 for unpaced")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--outage-rate", type=float, default=0.001)
+    parser.add_argument("--duplicate-rate", type=float, default=0.01)
+    parser.add_argument("--binary", action="store_true")
+    args = parser.parse_args()
+
+    profile = LoadProfile(devices=args.devices, interval=args.interval, jitter=args.jitter,
+                          outage_rate=args.outage_rate, duplicate_rate=args.duplicate_rate, binary=args.binary,
+                          speed=args.speed)
+    dashboard = DashBoard(heartbeat_interval=int(args.interval))
+    client = MQTTHeartbeatClient(dashboard, pipeline=IngestPipeline(dashboard, full_policy="block"))
+    broker = LocalBroker()
+    broker.subscribe(client)
+    generator = LoadGenerator(profile, args.workers, inbox=broker.inbox)
+
+    client.pipeline.start()  # no network connection; the broker calls on_message directly
+    broker.start()
+    stopping, latencies = threading.Event(), []
+    prober = threading.Thread(target=probe, args=(dashboard, broker, stopping, latencies), daemon=True)
+    started = time.perf_counter()
+    generator.start(args.duration)
+    prober.start()
+    generator.join()
+    stopping.set()
+    prober.join()
+    broker.stop(timeout=None)
+    client.pipeline.stop(timeout=None)
+    elapsed = time.perf_counter() - started
+
+    stats = client.pipeline.stats
+    print(f"{args.devices:,} devices every {args.interval:g}s, {args.workers} workers, "
+          f"{'binary' if args.binary else 'JSON'}, speed {args.speed:g}")
+    print(f"messages        {broker.delivered:,} delivered, {stats.dropped:,} dropped")
+    print(f"heartbeats      {stats.parsed:,} parsed in {elapsed:.1f}s ({stats.parsed / elapsed:,.0f}/s)")
+    if latencies:
+        latency = percentiles(latencies, "latency")
+        print(f"ingest-to-table p50 {latency['latency_p50_ms']:.1f} ms  p95 {latency['latency_p95_ms']:.1f} ms  "
+              f"p99 {latency['latency_p99_ms']:.1f} ms  ({len(latencies)} probes)")
+
+
+if __name__ == "__main__":
+    main()
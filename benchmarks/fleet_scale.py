@@ -0,0 +1,202 @@
+"""
+Ingest, query and view latency at fleet scale, without a broker.
+
+For every fleet size the suite seeds a DashBoard with history from
+HistoricalDataGenerator, then measures:
+
+- heartbeats/s through DashBoard.addHeartBeat
+- heartbeats/s through MQTTHeartbeatClient.on_message (stand-in message
+  objects), until the ingest pipeline has applied them all
+- generateViewFrame and app.update_table latency percentiles (first page,
+  worst uptime first), with 1% of the fleet reporting between calls; the
+  snapshot each reads is published at the time of the generated data, not
+  the wall clock, so the fleet is online as it would be live
+- peak RSS per million stored heartbeats
+
+Each size runs in its own process so peak RSS is not shared. Results are
+written as JSON; with --baseline, any metric that got worse by more than
+--threshold makes the run exit with status 1.
+
+Run from the repository root:
+    python -m benchmarks.fleet_scale --sizes 1000 10000 100000 --output results.json
+    python -m benchmarks.fleet_scale --baseline results.json --threshold 0.15
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from Dashboard import DashBoard
+from Heartbeat import HeartBeat
+from historical_data_generator import HistoricalDataGenerator, scaled_fleet
+from ingest_pipeline import IngestPipeline
+from mqtt_client import MQTTHeartbeatClient
+
+END = datetime(2024, 1, 1, tzinfo=timezone.utc)
+TOPIC = "device/heartbeat/bench"
+
+# Whether a larger value is better, per metric
+HIGHER_IS_BETTER = {
+    "add_heartbeat_per_s": True,
+    "on_message_per_s": True,
+    "view_frame_p50_ms": False,
+    "view_frame_p95_ms": False,
+    "view_frame_p99_ms": False,
+    "update_table_p50_ms": False,
+    "update_table_p95_ms": False,
+    "update_table_p99_ms": False,
+    "peak_rss_mb_per_million": False,
+}
+
+
+def percentiles(samples, prefix):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000
+    return {f"{prefix}_p50_ms": pick(0.50), f"{prefix}_p95_ms": pick(0.95), f"{prefix}_p99_ms": pick(0.99)}
+
+
+def live_heartbeats(devices, count):
+    """`count` heartbeats following the seeded history, as (device_id, epoch)."""
+    generator = HistoricalDataGenerator(days=1, seed=1, devices=devices, end_time=END + timedelta(days=1))
+    heartbeats = []
+    for ids, epochs in generator.generate_chunks():
+        heartbeats.extend(zip(ids.tolist(), epochs.tolist()))
+        if len(heartbeats) >= count:
+            return heartbeats[:count]
+    return heartbeats
+
+
+def run_one(size, seed_hours, ingest_count, repeats):
+    devices = scaled_fleet(size)
+    seeded = HistoricalDataGenerator(days=seed_hours / 24, seed=0, devices=devices, end_time=END)
+    dashboard = DashBoard()
+    stored = dashboard.bulk_load(seeded.generate_chunks())
+    live = live_heartbeats(devices, ingest_count)
+
+    heartbeats = [HeartBeat(device_id, datetime.fromtimestamp(epoch, tz=timezone.utc)) for device_id, epoch in live]
+    started = time.perf_counter()
+    for heartbeat in heartbeats:
+        dashboard.addHeartBeat(heartbeat)
+    add_rate = len(heartbeats) / (time.perf_counter() - started)
+
+    mqtt_dashboard = DashBoard()
+    mqtt_dashboard.bulk_load(seeded.generate_chunks())
+    client = MQTTHeartbeatClient(mqtt_dashboard, pipeline=IngestPipeline(
+        mqtt_dashboard, max_queue=len(live) + 1, full_policy="block"))
+    messages = [SimpleNamespace(topic=TOPIC, payload=json.dumps({"device_id": device_id, "timestamp": epoch}).encode())
+                for device_id, epoch in live]
+    client.pipeline.start()
+    started = time.perf_counter()
+    for message in messages:
+        client.on_message(None, None, message)
+    while client.pipeline.stats.parsed + client.pipeline.stats.rejected < len(messages):
+        time.sleep(0.001)
+    on_message_rate = len(messages) / (time.perf_counter() - started)
+    client.pipeline.stop()
+
+    import app  # the real callback, without starting the app
+    now = live[-1][1] if live else END.timestamp()
+    # The history is dated, so snapshots are published at the data's own time, as an ingest
+    # worker would, instead of readers refreshing at the wall clock, where every device is offline
+    dashboard.background_publishing = True
+    dashboard.uptime_window = app.TIME_WINDOWS[0]  # the window update_table asks for
+    reporting = [device["id"] for device in devices[::100]]
+    view_frame, update_table = [], []
+    for repeat in range(repeats):
+        moment = datetime.fromtimestamp(now + repeat + 1, tz=timezone.utc)
+        dashboard.addHeartBeats([HeartBeat(device_id, moment) for device_id in reporting])
+        started = time.perf_counter()
+        dashboard.publish_snapshot(moment.timestamp())
+        dashboard.generateViewFrame()
+        view_frame.append(time.perf_counter() - started)
+
+        dashboard.addHeartBeats([HeartBeat(device_id, moment) for device_id in reporting])
+        started = time.perf_counter()
+        dashboard.publish_snapshot(moment.timestamp())
+        app.update_table(dashboard, repeat, 0, 0, app.PAGE_SIZE, [{"column_id": "uptime", "direction": "asc"}],
+                         "", dashboard.heartbeat_interval, 0)
+        update_table.append(time.perf_counter() - started)
+    online = sum(record['status'] == "online" for record in dashboard.snapshot().records)
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    return {
+        "devices": size,
+        "stored_heartbeats": stored,
+        "add_heartbeat_per_s": add_rate,
+        "on_message_per_s": on_message_rate,
+        **percentiles(view_frame, "view_frame"),
+        **percentiles(update_table, "update_table"),
+        "peak_rss_mb": peak_rss_mb,
+        "peak_rss_mb_per_million": peak_rss_mb / max((stored + len(live)) / 1e6, 1e-6),
+        "online_devices": online,  # the view was measured with these online, not a fleet long gone silent
+    }
+
+
+def regressions(results, baseline, threshold):
+    """Metrics that got worse than the baseline by more than `threshold`, as messages."""
+    previous = {entry["devices"]: entry for entry in baseline["results"]}
+    found = []
+    for entry in results:
+        old = previous.get(entry["devices"])
+        if old is None:
+            continue
+        for metric, higher_is_better in HIGHER_IS_BETTER.items():
+            if not old.get(metric):
+                continue
+            change = (entry[metric] - old[metric]) / old[metric]
+            if (-change if higher_is_better else change) > threshold:
+                found.append(f"{entry['devices']} devices: {metric} {old[metric]:.3g} -> {entry[metric]:.3g} ({change:+.0%})")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--seed-hours", type=float, default=1.0, help="history seeded per device before measuring")
+    parser.add_argument("--ingest-count", type=int, default=200_000, help="heartbeats timed per ingest path")
+    parser.add_argument("--repeats", type=int, default=20, help="samples per latency percentile")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="tolerated relative regression")
+    parser.add_argument("--run-one", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(args.run_one, args.seed_hours, args.ingest_count, args.repeats)))
+        return
+
+    results = []
+    for size in args.sizes:
+        command = [sys.executable, "-m", "benchmarks.fleet_scale", "--run-one", str(size),
+                   "--seed-hours", str(args.seed_hours), "--ingest-count", str(args.ingest_count),
+                   "--repeats", str(args.repeats)]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        entry = json.loads(output.strip().splitlines()[-1])
+        results.append(entry)
+        print(f"{size:>7} devices  add {entry['add_heartbeat_per_s']:>9,.0f}/s  "
+              f"on_message {entry['on_message_per_s']:>9,.0f}/s  "
+              f"view p95 {entry['view_frame_p95_ms']:7.1f} ms  update_table p95 {entry['update_table_p95_ms']:7.1f} ms  "
+              f"rss {entry['peak_rss_mb_per_million']:6.1f} MB/M heartbeats")
+
+    report = {"created": datetime.now(tz=timezone.utc).isoformat(), "python": sys.version.split()[0],
+              "settings": {"seed_hours": args.seed_hours, "ingest_count": args.ingest_count, "repeats": args.repeats},
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            found = regressions(results, json.load(baseline_file), args.threshold)
+        for message in found:
+            print(f"REGRESSION {message}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
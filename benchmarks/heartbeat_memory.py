@@ -0,0 +1,59 @@
+"""
+Measure memory per stored heartbeat: a list of HeartBeat objects (the old
+Device storage) against the columnar HeartbeatStore.
+
+Run from the repository root:
+    python -m benchmarks.heartbeat_memory --count 100000
+"""
+import argparse
+import tracemalloc
+from datetime import datetime, timezone, timedelta
+
+from Heartbeat import HeartBeat
+from HeartbeatStore import HeartbeatStore, np
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def heartbeat_list(count, start):
+    heartbeats = []
+    for i in range(count):
+        heartbeats.append(HeartBeat(device_id="device_001", timestamp=start + timedelta(seconds=10 * i)))
+    return heartbeats
+
+
+def heartbeat_store(count, start, use_numpy):
+    store = HeartbeatStore(use_numpy=use_numpy)
+    epoch = int(start.timestamp())
+    for i in range(count):
+        store.append(epoch + 10 * i)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100_000, help="heartbeats per measurement")
+    args = parser.parse_args()
+
+    start = datetime.now(tz=timezone.utc)
+    results = {"list[HeartBeat]": measure(lambda: heartbeat_list(args.count, start)),
+               "HeartbeatStore (array)": measure(lambda: heartbeat_store(args.count, start, False))}
+    if np is not None:
+        results["HeartbeatStore (numpy)"] = measure(lambda: heartbeat_store(args.count, start, True))
+
+    baseline = results["list[HeartBeat]"]
+    print(f"{args.count} heartbeats")
+    for name, used in results.items():
+        print(f"{name:<24} {used / args.count:8.1f} bytes/heartbeat  ({baseline / used:5.1f}x less than the list)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Time restoring a fleet's history from a HeartbeatLog on startup: memory-map
+the segments, group records per device and bulk-load them into a DashBoard.
+
+Run from the repository root:
+    python -m benchmarks.log_replay --devices 10000 --days 30 --interval 600
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from Dashboard import DashBoard
+from HeartbeatLog import DEVICES_FILE, RECORD_DTYPE, SEGMENT_PATTERN, HeartbeatLog
+
+
+def write_log(directory, devices, days, interval, segment_bytes):
+    """Write the log files directly, one day of the whole fleet at a time."""
+    with open(os.path.join(directory, DEVICES_FILE), 'w', encoding='utf-8') as device_file:
+        device_file.writelines(f"device_{number:05d}\n" for number in range(devices))
+    start = 1_700_000_000 - days * 86400
+    segment_number, segment_size, segment = 1, 0, None
+    for day in range(days):
+        epochs = np.arange(start + day * 86400, start + (day + 1) * 86400, interval, dtype=np.int64)
+        chunk = np.empty(len(epochs) * devices, dtype=RECORD_DTYPE)
+        chunk['epoch'] = np.repeat(epochs, devices)
+        chunk['device'] = np.tile(np.arange(devices, dtype=np.uint32), len(epochs))
+        if segment is None or segment_size >= segment_bytes:
+            if segment is not None:
+                segment.close()
+                segment_number += 1
+            segment, segment_size = open(os.path.join(directory, SEGMENT_PATTERN.format(segment_number)), 'wb'), 0
+        segment.write(chunk.tobytes())
+        segment_size += chunk.nbytes
+    segment.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--interval", type=int, default=600, help="seconds between heartbeats of one device")
+    parser.add_argument("--segment-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_log(directory, args.devices, args.days, args.interval, args.segment_mb * 1024 * 1024)
+        log = HeartbeatLog(directory)
+        segments = log.segments()
+        size = sum(os.path.getsize(path) for path in segments)
+
+        dashboard = DashBoard(heartbeat_interval=args.interval)
+        started = time.perf_counter()
+        by_device = log.read()
+        read = time.perf_counter() - started
+        for device_id, epochs in by_device.items():
+            dashboard.load_device_epochs(device_id, epochs)
+        total = time.perf_counter() - started
+        log.close()
+
+    heartbeats = sum(len(epochs) for epochs in by_device.values())
+    print(f"{args.devices} devices, {args.days} days every {args.interval}s: "
+          f"{heartbeats:,} heartbeats, {size / 2**20:.0f} MiB in {len(segments)} segments")
+    print(f"read + group  {read:7.2f}s")
+    print(f"replay total  {total:7.2f}s  ({heartbeats / total:,.0f} heartbeats/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Time to first response of the Dash app: start `python app.py` with a heartbeat
+log to restore and a broker that never answers, then poll until the page (and
+/ready, where it exists) answers.
+
+Run from the repository root:
+    python -m benchmarks.startup --devices 10000 --days 7 --interval 600
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.log_replay import write_log
+
+UNREACHABLE_BROKER = "10.255.255.1"  # not routed, so connecting hangs until it times out
+
+
+def wait_for(url, started, timeout, status=200):
+    """Seconds from `started` until `url` answers with `status`, or None on timeout."""
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == status:
+                    return time.perf_counter() - started
+        except urllib.error.HTTPError as error:
+            if error.code == status:
+                return time.perf_counter() - started
+        except OSError:
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--interval", type=int, default=600, help="seconds between heartbeats of one device")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_log(directory, args.devices, args.days, args.interval, 64 * 1024 * 1024)
+        env = dict(os.environ, HEARTBEAT_LOG_DIR=directory, MQTT_BROKER=UNREACHABLE_BROKER, PORT=str(args.port))
+        started = time.perf_counter()
+        server = subprocess.Popen([sys.executable, "app.py"], env=env, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL)
+        try:
+            first = wait_for(f"http://127.0.0.1:{args.port}/", started, args.timeout)
+            ready = wait_for(f"http://127.0.0.1:{args.port}/ready", started, args.timeout)
+        finally:
+            server.terminate()
+            server.wait()
+
+    def seconds(value):
+        return "timed out" if value is None else f"{value:6.2f}s"
+
+    print(f"{args.devices} devices, {args.days} days every {args.interval}s of history, broker unreachable")
+    print(f"first response  {seconds(first)}")
+    print(f"ready           {seconds(ready)}")
+
+
+if __name__ == "__main__":
+    main()
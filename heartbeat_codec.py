@@ -0,0 +1,61 @@
+"""
+Compact binary heartbeat payloads, accepted alongside JSON.
+
+A payload is a 4-byte header followed by fixed-size 40-byte records:
+
+    header:  magic (0xB7), version (1), record count (uint16)
+    record:  timestamp (float64 epoch seconds), device_id (32 bytes UTF-8, NUL padded)
+
+All fields are little-endian. The magic byte can never start a JSON document,
+so binary and JSON payloads can share a topic. Publishers may also mark a
+topic with the BINARY_TOPIC_SUFFIX.
+"""
+import struct
+
+MAGIC = 0xB7
+VERSION = 1
+BINARY_TOPIC_SUFFIX = "/bin"
+DEVICE_ID_BYTES = 32
+MAX_BATCH = 0xFFFF
+
+HEADER = struct.Struct('<BBH')
+RECORD = struct.Struct(f'<d{DEVICE_ID_BYTES}s')
+
+
+def is_binary(payload, topic=None):
+    if topic is not None and topic.endswith(BINARY_TOPIC_SUFFIX):
+        return True
+    return len(payload) > 0 and payload[0] == MAGIC
+
+
+def encode(device_id, timestamp):
+    """Encode a single heartbeat."""
+    return encode_batch([(device_id, timestamp)])
+
+
+def encode_batch(heartbeats):
+    """Encode (device_id, epoch seconds) pairs into one packed payload."""
+    records = [RECORD.pack(float(timestamp), _device_id_bytes(device_id)) for device_id, timestamp in heartbeats]
+    if len(records) > MAX_BATCH:
+        raise ValueError(f"A binary payload holds at most {MAX_BATCH} heartbeats, got {len(records)}")
+    return HEADER.pack(MAGIC, VERSION, len(records)) + b''.join(records)
+
+
+def decode(payload):
+    """Decode a binary payload into a list of (device_id, epoch seconds) pairs."""
+    if len(payload) < HEADER.size:
+        raise ValueError("Binary heartbeat payload is shorter than its header")
+    magic, version, count = HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported binary heartbeat payload (magic {magic:#x}, version {version})")
+    body = memoryview(payload)[HEADER.size:]
+    if len(body) != count * RECORD.size:
+        raise ValueError(f"Binary heartbeat payload announces {count} records but holds {len(body)} bytes")
+    return [(raw_id.rstrip(b'\0').decode(), timestamp) for timestamp, raw_id in RECORD.iter_unpack(body)]
+
+
+def _device_id_bytes(device_id):
+    encoded = device_id.encode()
+    if len(encoded) > DEVICE_ID_BYTES:
+        raise ValueError(f"Device id {device_id} is longer than {DEVICE_ID_BYTES} bytes")
+    return encoded
@@ -1,7 +1,12 @@
 from datetime import datetime, timedelta, timezone
 import random
 from Heartbeat import HeartBeat
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # only generate_chunks() needs numpy
+    np = None
 
 # Device configurations
 DEVICES = [
@@ -24,21 +29,39 @@ DEVICES = [
     {"id": "device_012", "status": "new", "reliability": 1.0}
 ]
 
+def scaled_fleet(device_count: int, template: List[Dict] = DEVICES) -> List[Dict]:
+    """
+    A fleet profile of device_count devices with the same status and
+    reliability mix as the template, e.g. scaled_fleet(100_000).
+
+    Returns:
+        List of device configurations shaped like DEVICES
+    """
+    return [dict(template[i % len(template)], id=f"device_{i + 1:06d}") for i in range(device_count)]
+
+
 class HistoricalDataGenerator:
-    def __init__(self, days: int = 7, heartbeat_interval: int = 10):
+    def __init__(self, days: int = 7, heartbeat_interval: int = 10, seed: Optional[int] = None,
+                 devices: Optional[List[Dict]] = None, end_time: Optional[datetime] = None):
         """
         Initialize the historical data generator.
         
         Args:
             days: Number of days of historical data to generate
             heartbeat_interval: Interval between heartbeats in seconds
+            seed: Seed for reproducible data
+            devices: Fleet profile, DEVICES by default (see scaled_fleet)
+            end_time: Time of the last heartbeat, now by default
         """
         self.days = days
         self.heartbeat_interval = heartbeat_interval
-        self.end_time = datetime.now(tz=timezone.utc)
+        self.seed = seed
+        self.devices = devices if devices is not None else DEVICES
+        self.random = random.Random(seed)
+        self.end_time = end_time or datetime.now(tz=timezone.utc)
         self.start_time = self.end_time - timedelta(days=self.days)
-        self.failure_date = self.start_time + timedelta(days=14)  # For device_011
-        self.new_device_date = self.end_time - timedelta(days=7)  # For device_012
+        self.failure_date = self.start_time + timedelta(days=14)  # For fails_midway devices
+        self.new_device_date = self.end_time - timedelta(days=7)  # For new devices
         
     def generate_heartbeats(self) -> List[Dict]:
         """
@@ -52,7 +75,7 @@ class HistoricalDataGenerator:
         interval = timedelta(seconds=self.heartbeat_interval)
         
         while current_time <= self.end_time:
-            for device in DEVICES:
+            for device in self.devices:
                 # Skip new device before its start date
                 if device["status"] == "new" and current_time < self.new_device_date:
                     continue
@@ -63,7 +86,7 @@ class HistoricalDataGenerator:
                         continue
                         
                 # Determine if heartbeat should be sent based on reliability
-                if random.random() <= device["reliability"]:
+                if self.random.random() <= device["reliability"]:
                     heartbeat = HeartBeat(
                         device_id=device["id"],
                         timestamp=current_time
@@ -80,6 +103,43 @@ class HistoricalDataGenerator:
         
         return heartbeats
 
+    def generate_chunks(self, chunk_size: int = 1_000_000) -> Iterator[Tuple["np.ndarray", "np.ndarray"]]:
+        """
+        Generate the same kind of data with NumPy, for fleets far larger than
+        DEVICES. Whole ticks are generated at once: one random draw per
+        device and tick, masked by reliability and by each device's active
+        period (new devices start late, fails_midway devices stop early).
+
+        Args:
+            chunk_size: Approximate number of device ticks per chunk
+
+        Returns:
+            Iterator of time-ordered (device_ids, epochs) column chunks, ready
+            for DashBoard.bulk_load; memory use does not grow with the period
+        """
+        if np is None:
+            raise ImportError("generate_chunks needs numpy")
+        rng = np.random.default_rng(self.seed)
+        ids = np.array([device["id"] for device in self.devices])
+        reliability = np.array([device["reliability"] for device in self.devices], dtype=np.float32)
+        start = int(self.start_time.timestamp())
+        end = int(self.end_time.timestamp())
+        statuses = [device["status"] for device in self.devices]
+        # Each device only reports within [active_from, active_until)
+        active_from = np.array([int(self.new_device_date.timestamp()) if status == "new" else start
+                                for status in statuses], dtype=np.int64)
+        active_until = np.array([int(self.failure_date.timestamp()) if status == "fails_midway" else end + 1
+                                 for status in statuses], dtype=np.int64)
+
+        ticks_per_chunk = max(chunk_size // len(ids), 1)
+        step = ticks_per_chunk * self.heartbeat_interval
+        for chunk_start in range(start, end + 1, step):
+            ticks = np.arange(chunk_start, min(chunk_start + step, end + 1), self.heartbeat_interval, dtype=np.int64)
+            sent = rng.random((len(ticks), len(ids)), dtype=np.float32) <= reliability
+            sent &= (ticks[:, None] >= active_from) & (ticks[:, None] < active_until)
+            tick_rows, device_columns = np.nonzero(sent)  # row-major, so ordered by time
+            yield ids[device_columns], ticks[tick_rows]
+
 def generate_month_of_data() -> List[Dict]:
     """
     Convenience function to generate one month of test data.
@@ -91,6 +151,16 @@ def generate_month_of_data() -> List[Dict]:
     return generator.generate_heartbeats()
 
 if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        # Streaming mode for large fleets: historical_data_generator.py DEVICE_COUNT [DAYS]
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+        generator = HistoricalDataGenerator(days=days, seed=0, devices=scaled_fleet(int(sys.argv[1])))
+        total = sum(len(epochs) for _, epochs in generator.generate_chunks())
+        print(f"Generated {total} heartbeats for {sys.argv[1]} devices over {days} days")
+        sys.exit()
+
     # Example usage
     heartbeats = generate_month_of_data()
     print(f"Generated {len(heartbeats)} heartbeats")
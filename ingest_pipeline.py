@@ -0,0 +1,183 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+import heartbeat_codec
+from GroupIndex import topic_group
+from Heartbeat import HeartBeat
+
+FULL_POLICIES = ("drop", "block")
+
+logger = logging.getLogger(__name__)
+
+
+class IngestStats:
+    """Pipeline counters. Each one has a single writer thread, so no locks are needed."""
+
+    def __init__(self):
+        self.received = 0  # written by the submitting (MQTT network) thread
+        self.dropped = 0  # written by the submitting thread
+        self.parsed = 0  # written by the worker
+        self.rejected = 0  # written by the worker
+        self.batches = 0  # written by the worker
+        self.skipped = 0  # messages for another shard's device, written by the submitting thread
+        self.foreign = 0  # parsed heartbeats of another shard's devices, written by the worker
+        self.errors = 0  # batches or snapshot publishes that raised, written by the worker
+
+    def as_dict(self):
+        return dict(received=self.received, parsed=self.parsed, rejected=self.rejected,
+                    dropped=self.dropped, batches=self.batches, skipped=self.skipped, foreign=self.foreign,
+                    errors=self.errors)
+
+
+def parse_payload(payload, group=None):
+    """Turn a raw JSON heartbeat payload into a HeartBeat, or None when it is not one."""
+    message = json.loads(payload)
+    device_id = message.get('device_id')
+    timestamp = message.get('timestamp')
+    if not isinstance(device_id, str) or not device_id or not timestamp:
+        return None  # device IDs are compared with each other, so they must all be strings
+    return HeartBeat(device_id=device_id, timestamp=timestamp, group=group)
+
+
+def parse_message(payload, topic=None):
+    """All heartbeats carried by one message, JSON or binary (see heartbeat_codec), with the topic's group path."""
+    group = topic_group(topic)
+    if heartbeat_codec.is_binary(payload, topic):
+        return [HeartBeat(device_id=device_id, timestamp=timestamp, group=group)
+                for device_id, timestamp in heartbeat_codec.decode(payload) if device_id]
+    heartbeat = parse_payload(payload, group)
+    return [heartbeat] if heartbeat is not None else []
+
+
+class IngestPipeline:
+    """
+    Decouples the MQTT network thread from dashboard updates.
+
+    submit() only enqueues the raw payload into a bounded queue. A worker
+    thread drains it in batches of up to batch_size, or whatever arrived
+    within flush_interval seconds, parses them and applies each batch to the
+    dashboard in one call. When the queue is full, submit() either drops
+    the message ("drop") or blocks the caller until there is room ("block"),
+    which pushes back on the broker connection.
+
+    While running, the worker is the dashboard's only writer: it also
+    publishes a fresh snapshot at most every snapshot_interval seconds, so
+    readers never wait on ingest.
+
+    With a shard (see sharded_ingest.ShardFilter) the pipeline only keeps
+    the heartbeats of devices that shard owns, discarding the others by
+    topic before they are queued where it can.
+    """
+
+    def __init__(self, dashboard, batch_size=500, flush_interval=0.1, max_queue=10000, full_policy="drop",
+                 snapshot_interval=0.25, shard=None):
+        if full_policy not in FULL_POLICIES:
+            raise ValueError(f"Unknown full_policy {full_policy}, expected one of {FULL_POLICIES}")
+        self.dashboard = dashboard
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.full_policy = full_policy
+        self.snapshot_interval = snapshot_interval
+        self.shard = shard
+        self.stats = IngestStats()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._worker = None
+
+    def submit(self, payload, topic=None):
+        """Enqueue a raw payload; returns False when it was dropped."""
+        self.stats.received += 1
+        if self.shard is not None and not self.shard.may_own_topic(topic):
+            self.stats.skipped += 1
+            return True
+        try:
+            self._queue.put((payload, topic), block=self.full_policy == "block")
+            return True
+        except queue.Full:
+            self.stats.dropped += 1
+            return False
+
+    def start(self):
+        if self._worker is not None:
+            return
+        self._stopping.clear()
+        self.dashboard.publish_snapshot()
+        self.dashboard.background_publishing = True
+        self._worker = threading.Thread(target=self._run, name="heartbeat-ingest", daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout=5):
+        """Stop the worker after it has applied everything already queued."""
+        if self._worker is None:
+            return
+        self._stopping.set()
+        self._worker.join(timeout)
+        self._worker = None
+        self.dashboard.background_publishing = False
+
+    def backlog(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        next_snapshot = 0.0
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                payloads, topics = zip(*batch)
+                self.apply(payloads, topics)
+            # Also publish when idle, so uptimes follow the clock
+            if time.monotonic() >= next_snapshot:
+                self._publish()
+                next_snapshot = time.monotonic() + self.snapshot_interval
+        self._publish()
+
+    def _publish(self):
+        # One bad snapshot must not stop the worker; the next publish tries again
+        try:
+            self.dashboard.publish_snapshot()
+        except Exception:
+            self.stats.errors += 1
+            logger.exception("Publishing a dashboard snapshot failed")
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def apply(self, payloads, topics=None):
+        """Parse a batch of payloads and hand the heartbeats to the dashboard in one call."""
+        heartbeats = []
+        for payload, topic in zip(payloads, topics or [None] * len(payloads)):
+            try:
+                parsed = parse_message(payload, topic)
+            except (ValueError, TypeError, AttributeError, OverflowError, OSError):
+                parsed = []
+            if parsed:
+                heartbeats.extend(parsed)
+            else:
+                self.stats.rejected += 1
+        self.stats.parsed += len(heartbeats)
+        self.stats.batches += 1
+        if self.shard is not None:
+            owned = [heartbeat for heartbeat in heartbeats if self.shard.owns(heartbeat.device_id)]
+            self.stats.foreign += len(heartbeats) - len(owned)
+            heartbeats = owned
+        if heartbeats:
+            # A batch the dashboard cannot apply is counted and skipped; the worker keeps running
+            try:
+                self.dashboard.addHeartBeats(heartbeats)
+            except Exception:
+                self.stats.errors += 1
+                logger.exception("Applying a batch of %d heartbeats failed", len(heartbeats))
@@ -0,0 +1,268 @@
+"""
+Load generator: 10k-100k virtual devices sending heartbeats at a set rate,
+with jitter, outages and duplicates, from several worker processes.
+
+Each worker owns every `workers`-th device and keeps their next send times
+in one numpy array, so a tick is a comparison over the array instead of a
+timer per device. Messages go to a real broker, or, without one, to a
+LocalBroker in the consuming process, which hands them to
+MQTTHeartbeatClient.on_message the way paho's network thread does. With
+--partitioned, heartbeats go to the per-partition topics a sharded dashboard
+subscribes to (see sharded_ingest).
+
+Run from the repository root, e.g. 100k devices every 10s for a minute:
+    python load_generator.py --devices 100000 --interval 10 --workers 4 --duration 60 --broker localhost
+benchmarks/end_to_end.py drives a dashboard through a LocalBroker instead.
+"""
+import argparse
+import json
+import multiprocessing
+import threading
+import time
+from collections import defaultdict, namedtuple
+from dataclasses import dataclass
+
+import numpy as np
+
+import heartbeat_codec
+from sharded_ingest import partition_for, partition_topic
+
+TOPIC_BASE = "device/heartbeat"
+SEND_BATCH = 1000  # messages per put on a LocalBroker inbox
+TICKS_PER_INTERVAL = 10  # how finely virtual time advances, per heartbeat interval
+
+LocalMessage = namedtuple("LocalMessage", "topic payload")  # the fields of paho's MQTTMessage that are read
+
+
+@dataclass
+class LoadProfile:
+    devices: int = 10_000
+    interval: float = 10.0  # seconds between one device's heartbeats
+    jitter: float = 0.1  # every interval is off by up to this fraction, either way
+    outage_rate: float = 0.0  # chance that a heartbeat is not sent and the device goes silent
+    outage_seconds: float = 60.0  # how long such an outage lasts
+    duplicate_rate: float = 0.0  # chance that a heartbeat is sent twice
+    binary: bool = False  # packed binary batches (heartbeat_codec) instead of one JSON message per heartbeat
+    batch_size: int = 500  # heartbeats per binary message
+    partitioned: bool = False  # send to per-partition topics, for a sharded dashboard (see sharded_ingest)
+    speed: float = 1.0  # virtual seconds per wall second; 0 sends as fast as they are taken
+    seed: int = 0
+    device_prefix: str = "device_"
+
+
+class VirtualDevices:
+    """The devices of one worker and when each sends next, in virtual epoch seconds."""
+
+    def __init__(self, profile, worker=0, workers=1, start=None):
+        self.profile = profile
+        self.rng = np.random.default_rng((profile.seed, worker))
+        numbers = np.arange(worker, profile.devices, workers)
+        self.device_ids = [f"{profile.device_prefix}{number:06d}" for number in numbers.tolist()]
+        self.topics = [f"{TOPIC_BASE}/{device_id}" for device_id in self.device_ids]
+        if profile.partitioned:
+            self.partitions = {device_id: partition_for(device_id) for device_id in self.device_ids}
+            self.topics = [partition_topic(topic) for topic in self.topics]
+        self.clock = time.time() if start is None else start
+        # First heartbeats spread over one interval, so the fleet does not send in lockstep
+        self.next_due = self.clock + self.rng.uniform(0, profile.interval, len(numbers))
+
+    def advance(self, until):
+        """(device index, epoch) of every heartbeat sent up to `until`, in send order."""
+        profile = self.profile
+        indexes, epochs = [], []
+        while True:
+            due = np.flatnonzero(self.next_due <= until)
+            if not len(due):
+                break
+            due_epochs = self.next_due[due]
+            steps = profile.interval * (1 + self.rng.uniform(-profile.jitter, profile.jitter, len(due)))
+            silent = self.rng.random(len(due)) < profile.outage_rate
+            self.next_due[due] = due_epochs + steps + np.where(silent, profile.outage_seconds, 0)
+            sent, sent_epochs = due[~silent], due_epochs[~silent]
+            repeated = self.rng.random(len(sent)) < profile.duplicate_rate
+            indexes += [sent, sent[repeated]]
+            epochs += [sent_epochs, sent_epochs[repeated]]
+        self.clock = until
+        if not indexes:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        indexes, epochs = np.concatenate(indexes), np.concatenate(epochs)
+        order = np.argsort(epochs, kind="stable")
+        return indexes[order], epochs[order]
+
+    def messages(self, indexes, epochs):
+        """(topic, payload) pairs carrying the given heartbeats."""
+        device_ids = self.device_ids
+        if self.profile.binary:
+            topic = TOPIC_BASE + heartbeat_codec.BINARY_TOPIC_SUFFIX
+            pairs = [(device_ids[index], epoch) for index, epoch in zip(indexes.tolist(), epochs.tolist())]
+            size = self.profile.batch_size
+            if not self.profile.partitioned:
+                return [(topic, heartbeat_codec.encode_batch(pairs[start:start + size]))
+                        for start in range(0, len(pairs), size)]
+            by_partition = defaultdict(list)  # a batch only goes to the shard of its partition
+            for pair in pairs:
+                by_partition[self.partitions[pair[0]]].append(pair)
+            return [(partition_topic(topic, partition), heartbeat_codec.encode_batch(batch[start:start + size]))
+                    for partition, batch in by_partition.items() for start in range(0, len(batch), size)]
+        topics = self.topics
+        return [(topics[index], json.dumps({"device_id": device_ids[index], "timestamp": epoch}).encode())
+                for index, epoch in zip(indexes.tolist(), epochs.tolist())]
+
+
+def run_worker(profile, worker, workers, start, duration, sent, stopping, inbox=None, broker=None, port=1883):
+    """Worker process: send its devices' heartbeats for `duration` virtual seconds, to `inbox` or a broker."""
+    devices = VirtualDevices(profile, worker, workers, start)
+    client = None
+    if inbox is None:
+        import paho.mqtt.client as mqtt
+
+        client = mqtt.Client()
+        client.connect(broker, port, 60)
+        client.loop_start()
+
+    tick = profile.interval / TICKS_PER_INTERVAL
+    end = start + duration
+    started = time.monotonic()
+    while devices.clock < end and not stopping.is_set():
+        if profile.speed:
+            until = min(start + (time.monotonic() - started) * profile.speed, end)
+        else:
+            until = min(devices.clock + tick, end)
+        messages = devices.messages(*devices.advance(until))
+        if inbox is not None:
+            for offset in range(0, len(messages), SEND_BATCH):
+                inbox.put(messages[offset:offset + SEND_BATCH])  # blocks while the consumer catches up
+        else:
+            for topic, payload in messages:
+                client.publish(topic, payload)
+        sent[worker] += len(messages)
+        if profile.speed:
+            time.sleep(tick / profile.speed)
+
+    if client is not None:
+        client.loop_stop()
+        client.disconnect()
+
+
+class LoadGenerator:
+    """Worker processes sending one LoadProfile between them."""
+
+    def __init__(self, profile, workers=1, inbox=None, broker="localhost", port=1883):
+        self.profile = profile
+        self.workers = workers
+        self.inbox = inbox  # a LocalBroker's inbox, or None to publish to the broker
+        self.broker = broker
+        self.port = port
+        # fork keeps the caller's __main__ from being re-imported by every worker
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self._sent = self._context.Array("q", workers, lock=False)  # one counter per worker, so no lock
+        self._stopping = self._context.Event()
+        self._processes = []
+
+    @property
+    def sent(self):
+        """Messages sent so far."""
+        return sum(self._sent)
+
+    def start(self, duration, start=None):
+        """Send `duration` virtual seconds of heartbeats, from `start` (now by default) on."""
+        start = time.time() if start is None else start
+        self._processes = [
+            self._context.Process(
+                target=run_worker, name=f"heartbeat-load-{worker}", daemon=True,
+                args=(self.profile, worker, self.workers, start, duration, self._sent, self._stopping, self.inbox,
+                      self.broker, self.port))
+            for worker in range(self.workers)]
+        for process in self._processes:
+            process.start()
+
+    def join(self, timeout=None):
+        for process in self._processes:
+            process.join(timeout)
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self.join(timeout)
+
+
+class LocalBroker:
+    """
+    In-process stand-in for an MQTT broker, for runs on one machine without
+    a network. Publishers in any process put lists of (topic, payload) on
+    `inbox`; one delivery thread hands every message to each subscriber's
+    on_message(client, userdata, message). Topic filters are not applied.
+    """
+
+    def __init__(self, max_batches=64):
+        methods = multiprocessing.get_all_start_methods()
+        self.inbox = multiprocessing.get_context("fork" if "fork" in methods else "spawn").Queue(max_batches)
+        self.subscribers = []
+        self.delivered = 0  # written by the delivery thread only
+        self._thread = None
+
+    def subscribe(self, client):
+        self.subscribers.append(client)
+
+    def publish(self, topic, payload):
+        self.inbox.put([(topic, payload)])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._deliver, name="local-broker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop after delivering everything already published."""
+        if self._thread is None:
+            return
+        self.inbox.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _deliver(self):
+        while True:
+            batch = self.inbox.get()
+            if batch is None:
+                return
+            for topic, payload in batch:
+                message = LocalMessage(topic, payload)
+                for subscriber in self.subscribers:
+                    subscriber.on_message(None, None, message)
+            self.delivered += len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=10_000)
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds between one device's heartbeats")
+    parser.add_argument("--jitter", type=float, default=0.1, help="fraction every interval may be off by")
+    parser.add_argument("--outage-rate", type=float, default=0.0, help="chance a heartbeat starts an outage")
+    parser.add_argument("--outage-seconds", type=float, default=60.0)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="chance a heartbeat is sent twice")
+    parser.add_argument("--binary", action="store_true", help="publish packed binary batches")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="publish to per-partition topics, for a dashboard with HEARTBEAT_SHARDS set")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of heartbeats to send")
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+
+    profile = LoadProfile(devices=args.devices, interval=args.interval, jitter=args.jitter,
+                          outage_rate=args.outage_rate, outage_seconds=args.outage_seconds,
+                          duplicate_rate=args.duplicate_rate, binary=args.binary,
+                          partitioned=args.partitioned)
+    generator = LoadGenerator(profile, args.workers, broker=args.broker, port=args.port)
+    started = time.perf_counter()
+    generator.start(args.duration)
+    try:
+        generator.join()
+    except KeyboardInterrupt:
+        generator.stop()
+    elapsed = time.perf_counter() - started
+    print(f"Sent {generator.sent:,} messages in {elapsed:.1f}s ({generator.sent / elapsed:,.0f}/s) "
+          f"for {args.devices:,} devices")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Prometheus text-format metrics, served by app.py at /metrics.
+
+Histograms are updated from several threads (the ingest worker, Dash
+callbacks) while /metrics reads them. Every thread updates cells of its
+own, created the first time it records something and folded into a shared
+total when it exits, so updates never take a lock; a scrape sums the cells
+of all threads. Everything else, including
+the ingest counters (IngestStats, one writer thread per counter), is read
+when scraped, so it costs nothing in between.
+"""
+import functools
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _PerThread:
+    """
+    One cell per writing thread; the lock is only taken when a thread writes
+    for the first time, and when it exits: its cell is then folded into a
+    shared total, so short-lived threads do not leave cells behind.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._cells = {}  # id(cell) -> cell, for live threads
+        self._retired = [0] * size  # what exited threads counted
+        self._lock = threading.Lock()
+
+    def cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0] * self._size
+            # Thread-local values are dropped when the thread exits, and the owner with them
+            owner = self._local.owner = _CellOwner()
+            weakref.finalize(owner, self._retire, cell)
+            with self._lock:
+                self._cells[id(cell)] = cell
+            return cell
+
+    def _retire(self, cell):
+        with self._lock:
+            del self._cells[id(cell)]
+            self._retired = [retired + value for retired, value in zip(self._retired, cell)]
+
+    def totals(self):
+        with self._lock:
+            cells = [self._retired, *self._cells.values()]
+        return [sum(column) for column in zip(*cells)]
+
+
+class _CellOwner:
+    """Lives exactly as long as one thread's thread-local cell."""
+
+
+class Histogram:
+    """Cumulative buckets with the given upper bounds, plus +Inf, a sum and a count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._cells = _PerThread(len(self.buckets) + 2)  # one per bucket, +Inf, then the sum
+
+    def observe(self, value, count=1):
+        """Record `count` observations of `value` at once."""
+        cell = self._cells.cell()
+        cell[bisect_left(self.buckets, value)] += count
+        cell[-1] += value * count
+
+    def timed(self, function):
+        """Decorator observing how long every call takes."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.observe(time.perf_counter() - started)
+        return wrapper
+
+    def samples(self):
+        totals = self._cells.totals()
+        samples, cumulative = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), totals[:-1]):
+            cumulative += count
+            samples.append((f'{self.name}_bucket{{le="{bound}"}}', cumulative))
+        samples.append((f"{self.name}_sum", totals[-1]))
+        samples.append((f"{self.name}_count", cumulative))
+        return samples
+
+
+class Gauge:
+    """A value read when scraped; `read` returns None when there is nothing to report."""
+
+    def __init__(self, name, documentation, read, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.kind = kind
+
+    def samples(self):
+        value = self.read()
+        return [] if value is None else [(self.name, value)]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric  # a metric registered again replaces the old one
+        return metric
+
+    def histogram(self, name, documentation, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, buckets))
+
+    def gauge(self, name, documentation, read, kind="gauge"):
+        return self.register(Gauge(name, documentation, read, kind))
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            samples = metric.samples()
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name} {float(value)!r}" for name, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+ADD_BATCH_SECONDS = REGISTRY.histogram(
+    "heartbeat_add_batch_seconds", "Time DashBoard.addHeartBeats takes to apply one batch of heartbeats")
+VIEW_FRAME_SECONDS = REGISTRY.histogram(
+    "heartbeat_generate_view_frame_seconds", "Time DashBoard.generateViewFrame takes")
+UPDATE_TABLE_SECONDS = REGISTRY.histogram(
+    "heartbeat_update_table_seconds", "Time the update_table Dash callback takes")
+
+
+def resident_memory_bytes():
+    """Resident set size of this process, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def instrument(dashboard, ingest_stats, mqtt_connected=lambda: None, registry=REGISTRY):
+    """
+    Register the gauges read from a running dashboard. `ingest_stats`
+    returns the IngestStats.as_dict() of every ingest pipeline, and
+    `mqtt_connected` whether the broker connection is up (None if unknown).
+    """
+    def total(key):
+        return lambda: sum(stats.get(key, 0) for stats in ingest_stats())
+
+    registry.gauge("heartbeat_messages_received_total", "MQTT messages received", total("received"), "counter")
+    registry.gauge("heartbeat_messages_dropped_total", "Messages dropped because the ingest queue was full",
+                   total("dropped"), "counter")
+    registry.gauge("heartbeat_parse_errors_total", "Messages that did not hold a valid heartbeat", total("rejected"),
+                   "counter")
+    registry.gauge("heartbeat_ingest_errors_total", "Heartbeat batches or snapshot publishes that failed",
+                   total("errors"), "counter")
+    registry.gauge("heartbeat_heartbeats_parsed_total", "Heartbeats parsed from messages", total("parsed"), "counter")
+
+    parsed = total("parsed")
+    previous = [time.monotonic(), parsed()]  # (time, parsed heartbeats) at the previous scrape
+
+    def ingest_rate():
+        now, count = time.monotonic(), parsed()
+        then, then_count = previous
+        previous[:] = [now, count]
+        return (count - then_count) / (now - then) if now > then else None
+
+    registry.gauge("heartbeat_ingest_rate", "Heartbeats parsed per second since the previous scrape", ingest_rate)
+
+    scraped = [0.0, {}]  # storage_stats() walks every device, so it is read once per scrape
+
+    def storage(key):
+        def read():
+            if time.monotonic() - scraped[0] > 1.0:
+                scraped[:] = [time.monotonic(), dashboard.storage_stats()]
+            return scraped[1].get(key)
+        return read
+
+    registry.gauge("heartbeat_devices", "Devices known to the dashboard", storage("devices"))
+    registry.gauge("heartbeat_stored_heartbeats", "Raw heartbeat timestamps stored", storage("stored_heartbeats"))
+    registry.gauge("heartbeat_store_bytes", "Estimated bytes held by heartbeat stores and indexes",
+                   storage("store_bytes"))
+    registry.gauge("heartbeat_late_total", "Heartbeats that arrived behind the reorder watermark",
+                   storage("late_heartbeats"), "counter")
+    registry.gauge("heartbeat_rejected_total", "Heartbeats dropped as older than the retention period",
+                   storage("rejected_heartbeats"), "counter")
+    registry.gauge("process_resident_memory_bytes", "Resident memory of the Dash process", resident_memory_bytes)
+    registry.gauge("heartbeat_mqtt_connected", "1 while connected to the MQTT broker",
+                   lambda: None if mqtt_connected() is None else int(mqtt_connected()))
+    return registry
@@ -1,57 +1,87 @@
 import json
+import threading
 from datetime import datetime
 import paho.mqtt.client as mqtt
-from Heartbeat import HeartBeat
+from ingest_pipeline import IngestPipeline
 
 class MQTTHeartbeatClient:
-    def __init__(self, dashboard, broker="localhost", port=1883, topic="device/heartbeat/#"):
+    def __init__(self, dashboard, broker="localhost", port=1883, topic="device/heartbeat/#", pipeline=None,
+                 min_backoff=1, max_backoff=60):
         self.client = mqtt.Client()
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
+        self.client.on_disconnect = self.on_disconnect
         self.broker = broker
         self.port = port
         self.topic = topic
         self.dashboard = dashboard
+        self.connected = False  # set by the network thread
+        self.connect_attempts = 0
+        self.min_backoff = min_backoff  # seconds between connection attempts, doubling up to max_backoff
+        self.max_backoff = max_backoff
+        self._connector = None
+        self._stopping = threading.Event()
+        # Parsing and dashboard updates happen on the pipeline's worker, not the network thread
+        self.pipeline = pipeline or IngestPipeline(dashboard)
 
     def on_connect(self, client, userdata, flags, rc):
         print(f"Connected with result code {rc}")
-        # Subscribe to the heartbeat topic
-        client.subscribe(self.topic)
+        self.connected = rc == 0
+        # Subscribe to the heartbeat topic, or to each of a list of topics
+        client.subscribe(self.topic if isinstance(self.topic, str) else [(topic, 0) for topic in self.topic])
+
+    def on_disconnect(self, client, userdata, rc):
+        self.connected = False
 
     def on_message(self, client, userdata, msg):
-        try:
-            # Parse the JSON message
-            payload = json.loads(msg.payload.decode())
-            
-            # Extract device_id and timestamp
-            device_id = payload.get('device_id')
-            timestamp = payload.get('timestamp')
-            
-            if device_id and timestamp:
-                # Create a new HeartBeat instance
-                heartbeat = HeartBeat(device_id=device_id, timestamp=timestamp)
-                # Add it to the dashboard
-                self.dashboard.addHeartBeat(heartbeat)
-                print(f"Added heartbeat for device {device_id}")
-        except json.JSONDecodeError:
-            print(f"Error decoding message: {msg.payload}")
-        except Exception as e:
-            print(f"Error processing message: {e}")
+        self.pipeline.submit(msg.payload, msg.topic)
 
-    def start(self):
-        """Start the MQTT client"""
+    def start(self, retry=False):
+        """
+        Start the MQTT client. With retry, connect on a background thread
+        instead, trying again with exponential backoff until the broker
+        answers or stop() is called.
+        """
+        self.pipeline.start()
+        if retry:
+            self._stopping.clear()
+            self._connector = threading.Thread(target=self._connect_with_backoff, name="mqtt-connect", daemon=True)
+            self._connector.start()
+            return
         try:
-            self.client.connect(self.broker, self.port, 60)
-            # Start the client loop in a non-blocking way
-            self.client.loop_start()
-            print(f"Connected to MQTT broker at {self.broker}:{self.port}")
+            self._connect()
         except Exception as e:
             print(f"Failed to connect to MQTT broker: {e}")
 
+    def _connect(self):
+        self.connect_attempts += 1
+        self.client.connect(self.broker, self.port, 60)
+        # Start the client loop in a non-blocking way; it reconnects with the same backoff after a drop
+        self.client.reconnect_delay_set(self.min_backoff, self.max_backoff)
+        self.client.loop_start()
+        print(f"Connected to MQTT broker at {self.broker}:{self.port}")
+
+    def _connect_with_backoff(self):
+        delay = self.min_backoff
+        while not self._stopping.is_set():
+            try:
+                self._connect()
+                return
+            except Exception as e:
+                print(f"Failed to connect to MQTT broker: {e}; retrying in {delay}s")
+            self._stopping.wait(delay)
+            delay = min(delay * 2, self.max_backoff)
+
     def stop(self):
         """Stop the MQTT client"""
+        self._stopping.set()
+        if self._connector is not None:
+            self._connector.join()
+            self._connector = None
         self.client.loop_stop()
         self.client.disconnect()
+        self.pipeline.stop()
+        print(f"Ingest stopped: {self.pipeline.stats.as_dict()}")
 
     def publish_test_message(self):
         """Publish a test message to verify the connection"""
@@ -0,0 +1,350 @@
+"""
+Sharded ingestion: N worker processes share the heartbeat load, so JSON
+parsing and Device updates are no longer bound to one core by the GIL.
+
+Every device belongs to exactly one of PARTITIONS topic partitions, chosen
+by a stable hash of its ID, and partition p to shard p % shards. Publishers
+send a device's heartbeats to its partition topic,
+device/partition/<p>/[<group>/...]<device_id> (see partition_topic), and each
+worker process subscribes to its own partitions only, so the broker hands it
+just its own devices' messages. The worker reads them as the
+device/heartbeat/... topics they stand for, still skips other shards' devices
+in batched binary payloads, and owns a full DashBoard for its shard. Workers send the records that changed
+since their last message (all of them at first, and after a settings
+change) and their group counters to the Dash process over a pipe, and
+ShardedDashboard merges them into one table and one group tree.
+
+Without a broker, payloads can be handed to ShardedDashboard.submit(),
+which routes them to the owning worker.
+"""
+import multiprocessing
+import threading
+import time
+import zlib
+from multiprocessing.connection import wait
+
+import heartbeat_codec
+from DashboardSnapshot import DashboardSnapshot
+from HeartbeatPage import HeartbeatPage
+from Dashboard import DashBoard
+from GroupIndex import merge_records
+from ingest_pipeline import IngestPipeline
+from metrics import VIEW_FRAME_SECONDS
+from table_query import page_delta, query_page
+from ViewIndex import ViewIndex
+
+TOPIC_PREFIX = "device/heartbeat/"
+PARTITION_PREFIX = "device/partition/"
+PARTITIONS = 256  # topic partitions; enough to spread over any sensible number of shards
+
+
+def partition_for(device_id):
+    """Stable topic partition of a device, the same in every process."""
+    return zlib.crc32(device_id.encode()) % PARTITIONS
+
+
+def shard_for(device_id, shards):
+    """Stable shard number of a device: the shard subscribed to its partition."""
+    return partition_for(device_id) % shards
+
+
+def shard_topics(shard, shards):
+    """Topic filters of the partitions one shard subscribes to."""
+    return [f"{PARTITION_PREFIX}{partition}/#" for partition in range(shard, PARTITIONS, shards)]
+
+
+def partition_topic(topic, partition=None):
+    """
+    The partition topic for a device/heartbeat/... topic, that publishers to
+    a sharded dashboard send to: the partition of the device it names, or
+    `partition` for one naming no device, such as a binary batch of that
+    partition's devices.
+    """
+    if partition is None:
+        partition = partition_for(topic_device(topic))
+    return f"{PARTITION_PREFIX}{partition}/{topic[len(TOPIC_PREFIX):]}"
+
+
+def heartbeat_topic(topic):
+    """The device/heartbeat/... topic a partition topic stands for; any other topic is returned as it is."""
+    if not topic or not topic.startswith(PARTITION_PREFIX):
+        return topic
+    return TOPIC_PREFIX + topic[len(PARTITION_PREFIX):].partition('/')[2]
+
+
+def topic_device(topic, topic_prefix=TOPIC_PREFIX):
+    """Device ID named by a device/heartbeat/[<group>/...]<device_id> topic, or None for any other topic."""
+    if not topic or not topic.startswith(topic_prefix) or topic.endswith(heartbeat_codec.BINARY_TOPIC_SUFFIX):
+        return None
+    device_id = topic[len(topic_prefix):].rsplit('/', 1)[-1]  # after any group levels, see GroupIndex
+    return device_id or None
+
+
+class ShardFilter:
+    """Which heartbeats one shard keeps."""
+
+    def __init__(self, shard, shards, topic_prefix=TOPIC_PREFIX):
+        self.shard = shard
+        self.shards = shards
+        self.topic_prefix = topic_prefix
+
+    def owns(self, device_id):
+        return shard_for(device_id, self.shards) == self.shard
+
+    def may_own_topic(self, topic):
+        """False only when the topic names a device of another shard."""
+        device_id = topic_device(topic, self.topic_prefix)
+        return device_id is None or self.owns(device_id)
+
+
+class PartitionInlet:
+    """A shard's IngestPipeline as its MQTT client feeds it: partition topics are submitted as heartbeat topics."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def submit(self, payload, topic=None):
+        return self.pipeline.submit(payload, heartbeat_topic(topic))
+
+    def __getattr__(self, name):
+        return getattr(self.pipeline, name)
+
+
+def run_shard(shard, shards, connection, inbox, broker, port, heartbeat_interval, uptime_window, publish_interval):
+    """Worker process: ingest one shard and send its snapshot records to the Dash process."""
+    dashboard = DashBoard(heartbeat_interval=heartbeat_interval, uptime_window=uptime_window)
+    pipeline = IngestPipeline(dashboard, shard=ShardFilter(shard, shards), full_policy="block")
+    client = drain = None
+    if broker is not None:
+        from mqtt_client import MQTTHeartbeatClient
+        client = MQTTHeartbeatClient(dashboard, broker, port, shard_topics(shard, shards),
+                                     pipeline=PartitionInlet(pipeline))
+        client.start(retry=True)
+    else:
+        pipeline.start()
+        drain = threading.Thread(target=_drain_inbox, args=(inbox, pipeline), daemon=True)
+        drain.start()
+
+    sent_version = 0
+    while True:
+        if connection.poll(publish_interval):
+            settings = connection.recv()
+            if settings is None:
+                break
+            # Picked up by the ingest worker on its next publish, as in app.update_table
+            dashboard.heartbeat_interval, dashboard.uptime_window = settings
+        snapshot = dashboard.snapshot()
+        if snapshot.version != sent_version:
+            connection.send(_shard_message(snapshot, sent_version, pipeline.stats.as_dict()))
+            sent_version = snapshot.version
+
+    if client is not None:
+        client.stop()
+    else:
+        inbox.put(None)  # queued after everything already submitted
+        drain.join()
+        pipeline.stop()
+    connection.send(_shard_message(dashboard.snapshot(), sent_version, pipeline.stats.as_dict()))
+    connection.close()
+
+
+def _shard_message(snapshot, sent_version, stats):
+    """
+    (settings, full, records, groups, stats) for the Dash process: the
+    records that changed after `sent_version`, or every record, with full
+    set, when that is not known.
+    """
+    changed = snapshot.changed_since(sent_version) if sent_version else None
+    if changed is None:
+        return snapshot.settings, True, tuple(snapshot.records), snapshot.groups, stats
+    records = tuple(snapshot.records_by_id[device_id] for device_id in changed if device_id in snapshot.records_by_id)
+    return snapshot.settings, False, records, snapshot.groups, stats
+
+
+def _drain_inbox(inbox, pipeline):
+    while True:
+        messages = inbox.get()
+        if messages is None:
+            return
+        for payload, topic in messages:
+            pipeline.submit(payload, topic)
+
+
+class ShardedDashboard:
+    """
+    Dash-side stand-in for DashBoard in sharded mode. It serves the merged
+    records of every shard as snapshots, and forwards setting changes to
+    the workers.
+    """
+
+    def __init__(self, shards, broker="localhost", port=1883, heartbeat_interval=10, uptime_window=3600,
+                 publish_interval=0.25):
+        self.shards = shards
+        self.broker = broker
+        self.port = port
+        self.publish_interval = publish_interval
+        self.background_publishing = True  # workers always publish in the background
+        self.log = None
+        self.stats = [{} for _ in range(shards)]  # latest IngestStats.as_dict() per shard
+        self._settings = (heartbeat_interval, uptime_window)
+        self._shard_records = [{} for _ in range(shards)]  # device_id -> latest record, per shard
+        self._view = ViewIndex()  # every shard's records, merged
+        self._shard_groups = [() for _ in range(shards)]
+        self._shard_settings = [self._settings] * shards
+        self._snapshot = DashboardSnapshot()
+        self._snapshot_published = threading.Condition()
+        self._processes = []
+        self._connections = []
+        self._inboxes = []
+        self._receiver = None
+
+    @property
+    def heartbeat_interval(self):
+        return self._settings[0]
+
+    @heartbeat_interval.setter
+    def heartbeat_interval(self, heartbeat_interval):
+        self._configure((heartbeat_interval, self._settings[1]))
+
+    @property
+    def uptime_window(self):
+        return self._settings[1]
+
+    @uptime_window.setter
+    def uptime_window(self, uptime_window):
+        self._configure((self._settings[0], uptime_window))
+
+    def _configure(self, settings):
+        if settings == self._settings:
+            return
+        self._settings = settings
+        for connection in self._connections:
+            connection.send(settings)
+
+    def start(self):
+        if self._processes:
+            return
+        # fork keeps app.py from being re-imported by every worker
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        for shard in range(self.shards):
+            parent_end, child_end = context.Pipe()
+            inbox = context.Queue() if self.broker is None else None
+            process = context.Process(
+                target=run_shard, name=f"heartbeat-shard-{shard}", daemon=True,
+                args=(shard, self.shards, child_end, inbox, self.broker, self.port, *self._settings,
+                      self.publish_interval))
+            process.start()
+            child_end.close()
+            self._processes.append(process)
+            self._connections.append(parent_end)
+            self._inboxes.append(inbox)
+        self._receiver = threading.Thread(target=self._receive, name="heartbeat-shards", daemon=True)
+        self._receiver.start()
+
+    def stop(self, timeout=5):
+        for connection in self._connections:
+            connection.send(None)
+        if self._receiver is not None:
+            self._receiver.join(timeout)
+        for process in self._processes:
+            process.join(timeout)
+        self._processes, self._connections, self._inboxes, self._receiver = [], [], [], None
+
+    def submit(self, payloads_and_topics):
+        """Route (payload, topic) pairs to the shards, for runs without a broker."""
+        routed = [[] for _ in range(self.shards)]
+        for payload, topic in payloads_and_topics:
+            topic = heartbeat_topic(topic)
+            device_id = topic_device(topic)
+            if device_id is not None:
+                routed[shard_for(device_id, self.shards)].append((payload, topic))
+            else:
+                for messages in routed:  # every shard keeps its own devices from it
+                    messages.append((payload, topic))
+        for inbox, messages in zip(self._inboxes, routed):
+            if messages:
+                inbox.put(messages)
+
+    def _receive(self):
+        connections = {connection: shard for shard, connection in enumerate(self._connections)}
+        while connections:
+            for connection in wait(list(connections)):
+                shard = connections[connection]
+                try:
+                    settings, full, records, groups, stats = connection.recv()
+                except EOFError:
+                    del connections[connection]
+                    continue
+                self._shard_settings[shard] = settings
+                self._shard_groups[shard] = groups
+                self.stats[shard] = stats
+                self._publish(shard, full, records)
+
+    def _publish(self, shard, full, records):
+        if full:
+            # A shard's whole record set, e.g. after a settings change: the merged orders are rebuilt
+            self._shard_records[shard] = {record['device_id']: record for record in records}
+            self._view.rebuild(record for shard_records in self._shard_records for record in shard_records.values())
+            changed = None
+        else:
+            shard_records = self._shard_records[shard]
+            for record in records:
+                shard_records[record['device_id']] = record
+            changed = frozenset(record['device_id'] for record in records if self._view.update(record))
+        records_by_id, orders = self._view.freeze()
+        previous = self._snapshot
+        version = previous.version + 1
+        self._snapshot = DashboardSnapshot(version, time.time(), records_by_id.values(), None,
+                                           settings=self._settings, records_by_id=records_by_id, orders=orders,
+                                           changes=previous.recent_changes(version, changed),
+                                           groups=tuple(merge_records(self._shard_groups)))
+        with self._snapshot_published:
+            self._snapshot_published.notify_all()
+
+    def snapshot(self):
+        return self._snapshot
+
+    def view_records(self, now=None):
+        """Merged table records of every shard."""
+        return list(self._snapshot.records)
+
+    def view_groups(self, now=None):
+        """Group counters of every shard added up."""
+        return list(self._snapshot.groups)
+
+    def view_page(self, page_current=0, page_size=50, sort_by=None, filter_query=""):
+        """One page of the merged table and the number of matching records."""
+        snapshot = self._snapshot
+        return query_page(snapshot.records_by_id, snapshot.orders, page_current, page_size, sort_by, filter_query)
+
+    def page_delta(self, since_version=0, known_ids=(), page_current=0, page_size=50, sort_by=None, filter_query=""):
+        """One page of the merged table as a patch, see table_query.page_delta."""
+        return page_delta(self._snapshot, since_version, known_ids, page_current, page_size, sort_by, filter_query)
+
+    @property
+    def view_version(self):
+        return self._snapshot.version
+
+    def wait_for_snapshot(self, newer_than, timeout=None):
+        """Wait for a snapshot newer than `newer_than` that every shard built with the current settings."""
+        with self._snapshot_published:
+            self._snapshot_published.wait_for(
+                lambda: self._snapshot.version > newer_than
+                and all(settings == self._settings for settings in self._shard_settings), timeout)
+        return self._snapshot
+
+    @VIEW_FRAME_SECONDS.timed
+    def generateViewFrame(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.view_records())
+
+    def storage_stats(self):
+        return {'devices': len(self._snapshot.records_by_id)}  # the heartbeats themselves live in the workers
+
+    def heartbeats_for_device(self, device_id, start=None, end=None, limit=None, cursor=None):
+        return HeartbeatPage(device_id)  # raw heartbeats stay in the worker processes
+
+    def heartbeat_timeline(self, device_id, start, end, buckets=None):
+        return None  # so do the rollups
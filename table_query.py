@@ -0,0 +1,126 @@
+"""
+Server-side paging, sorting and filtering of the device table, for a
+DataTable with page_action, sort_action and filter_action set to 'custom'.
+
+Pages are read from a snapshot's column orders (see ViewIndex): the sort
+column's order is narrowed with binary searches by any range filters on
+that column, so an unfiltered or range-filtered page costs O(log n + page
+size). Other filters (contains, !=, filters on other columns) are checked
+against every candidate so the matching rows can be counted.
+
+page_delta() answers the same query as a patch for a browser that already
+holds some of the page's records from an earlier snapshot version.
+"""
+import re
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+from ViewIndex import SORT_COLUMNS
+
+DEFAULT_SORT = "device_id"
+NUMERIC_COLUMNS = ("uptime", "outages")
+PATH_COLUMNS = ("group",)  # datestartswith matches the group and the groups below it, not sibling prefixes
+
+# {column} operator value, as written by DataTable.filter_query; s/i prefixes are case sensitivity flags
+FILTER_PART = re.compile(r"^\s*\{(?P<column>[^}]+)\}\s+(?P<operator>[si]?(?:<=|>=|!=|<|>|=|eq|ne|lt|le|gt|ge|contains|datestartswith))\s+(?P<value>.+?)\s*$")
+OPERATORS = {"eq": "=", "ne": "!=", "lt": "<", "le": "<=", "gt": ">", "ge": ">="}
+
+_value = itemgetter(0)
+
+
+def parse_filter(filter_query):
+    """[(column, operator, value)] for a DataTable filter_query; raises ValueError on anything else."""
+    filters = []
+    for part in (filter_query or "").split(" && "):
+        if not part.strip():
+            continue
+        match = FILTER_PART.match(part)
+        if not match or match['column'] not in SORT_COLUMNS:
+            raise ValueError(f"Unsupported filter {part!r}")
+        operator = match['operator']
+        if operator[0] in "si":
+            operator = operator[1:]  # contains is always case-insensitive
+        operator = OPERATORS.get(operator, operator)
+        value = match['value']
+        if len(value) > 1 and value[0] == value[-1] and value[0] in "'\"`":
+            value = value[1:-1].replace("\\" + value[0], value[0])
+        if match['column'] in NUMERIC_COLUMNS and operator not in ("contains", "datestartswith"):
+            value = float(value)
+        filters.append((match['column'], operator, value))
+    return filters
+
+
+def _matches(record, column, operator, value):
+    field = record[column]
+    if operator == "contains":
+        return str(value).lower() in str(field).lower()
+    if operator == "datestartswith":
+        if column in PATH_COLUMNS and value:
+            return field == value or field.startswith(value + "/")
+        return str(field).startswith(str(value))
+    if not isinstance(value, float):
+        field = str(field)
+    return {"=": field == value, "!=": field != value, "<": field < value, "<=": field <= value,
+            ">": field > value, ">=": field >= value}[operator]
+
+
+def _bounds(order, filters):
+    """Slice of `order` whose values satisfy the range filters on its column."""
+    low, high = 0, len(order)
+    for _, operator, value in filters:
+        if operator in (">=", "="):
+            low = max(low, bisect_left(order, value, key=_value))
+        if operator == ">":
+            low = max(low, bisect_right(order, value, key=_value))
+        if operator == "<":
+            high = min(high, bisect_left(order, value, key=_value))
+        if operator in ("<=", "="):
+            high = min(high, bisect_right(order, value, key=_value))
+    return low, max(low, high)
+
+
+def query_page(records_by_id, orders, page_current=0, page_size=50, sort_by=None, filter_query=""):
+    """
+    One page of table records and the number of records matching the filter.
+    sort_by is DataTable's [{'column_id': ..., 'direction': 'asc' | 'desc'}].
+    """
+    sort = sort_by[0] if sort_by else {"column_id": DEFAULT_SORT, "direction": "asc"}
+    column = sort["column_id"]
+    if column not in orders:
+        raise ValueError(f"Cannot sort by {column}")
+    filters = parse_filter(filter_query)
+    order = orders[column]
+
+    ranged = [f for f in filters if f[0] == column and f[1] in ("<", "<=", ">", ">=", "=")]
+    rest = [f for f in filters if f not in ranged]
+    low, high = _bounds(order, ranged)
+    descending = sort["direction"] == "desc"
+    start = page_current * page_size
+
+    if not rest:
+        if descending:
+            keys = order[max(high - start - page_size, low):max(high - start, low)][::-1]
+        else:
+            keys = order[low + start:min(low + start + page_size, high)]
+        return [records_by_id[device_id] for _, device_id in keys], high - low
+    # Other filters have to look at every candidate to count the matches
+    keys = order[low:high][::-1] if descending else order[low:high]
+    matching = [records_by_id[device_id] for _, device_id in keys
+                if all(_matches(records_by_id[device_id], *f) for f in rest)]
+    return matching[start:start + page_size], len(matching)
+
+
+def page_delta(snapshot, since_version=0, known_ids=(), page_current=0, page_size=50, sort_by=None, filter_query=""):
+    """
+    One page of `snapshot` as a patch for a client holding the records of
+    `known_ids` as of version `since_version`, and the number of matching
+    records. The patch is {'version', 'ids', 'rows'}: the device IDs of the
+    page in order, and only the records the client lacks or holds an older
+    copy of, by device ID.
+    """
+    records, total = query_page(snapshot.records_by_id, snapshot.orders, page_current, page_size, sort_by, filter_query)
+    changed = snapshot.changed_since(since_version)
+    known = set(known_ids or ()) if changed is not None else set()
+    rows = {record['device_id']: record for record in records
+            if record['device_id'] not in known or record['device_id'] in changed}
+    return {'version': snapshot.version, 'ids': [record['device_id'] for record in records], 'rows': rows}, total
@@ -1,6 +1,8 @@
 import paho.mqtt.client as mqtt
 import time
 import json
+import sys
+import heartbeat_codec
 from historical_data_generator import generate_month_of_data
 
 # MQTT Configuration
@@ -13,12 +15,14 @@ def connect_mqtt():
     client.connect(MQTT_BROKER, MQTT_PORT, 60)
     return client
 
-def publish_historical_data(delay: float = 0.001):
+def publish_historical_data(delay: float = 0.001, binary: bool = False, batch_size: int = 1000):
     """
     Publish historical heartbeat data to MQTT broker.
     
     Args:
         delay: Delay between messages in seconds to avoid overwhelming the broker
+        binary: Publish packed binary batches (see heartbeat_codec) instead of one JSON message per heartbeat
+        batch_size: Heartbeats per binary message
     """
     print("Generating historical heartbeat data...")
     heartbeats = generate_month_of_data()
@@ -28,9 +32,16 @@ def publish_historical_data(delay: float = 0.001):
     client = connect_mqtt()
     client.loop_start()
     
-    for heartbeat in heartbeats:
-        client.publish(MQTT_TOPIC, json.dumps(heartbeat), retain=False)
-        time.sleep(delay)
+    if binary:
+        for start in range(0, len(heartbeats), batch_size):
+            batch = heartbeats[start:start + batch_size]
+            payload = heartbeat_codec.encode_batch((heartbeat["device_id"], heartbeat["timestamp"]) for heartbeat in batch)
+            client.publish(MQTT_TOPIC, payload, retain=False)
+            time.sleep(delay)
+    else:
+        for heartbeat in heartbeats:
+            client.publish(MQTT_TOPIC, json.dumps(heartbeat), retain=False)
+            time.sleep(delay)
     
     client.loop_stop()
     client.disconnect()
@@ -45,4 +56,4 @@ if __name__ == "__main__":
     print("- 1 device that only appears in the last week")
     print("\nStarting data generation and publishing...")
     
-    publish_historical_data()
+    publish_historical_data(binary="--binary" in sys.argv)
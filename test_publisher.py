@@ -1,12 +1,15 @@
 import paho.mqtt.client as mqtt
 import json
+import sys
 import time
 from datetime import datetime
 import random
+import heartbeat_codec
 
 class HeartbeatPublisher:
-    def __init__(self, broker="localhost", port=1883):
+    def __init__(self, broker="localhost", port=1883, binary=False):
         self.client = mqtt.Client()
+        self.binary = binary  # publish compact binary payloads instead of JSON
         self.broker = broker
         self.port = port
         self.topic_base = "device/heartbeat"
@@ -32,9 +35,20 @@ class HeartbeatPublisher:
             "timestamp": datetime.now().timestamp()
         }
         topic = f"{self.topic_base}/{device_id}"
-        self.client.publish(topic, json.dumps(message), retain=False)
+        if self.binary:
+            payload = heartbeat_codec.encode(message["device_id"], message["timestamp"])
+        else:
+            payload = json.dumps(message)
+        self.client.publish(topic, payload, retain=False)
         print(f"Published heartbeat for {device_id}")
         
+    def publish_batch(self, device_ids):
+        """Publish one packed binary message carrying a heartbeat for each device"""
+        now = datetime.now().timestamp()
+        payload = heartbeat_codec.encode_batch((device_id, now) for device_id in device_ids)
+        self.client.publish(self.topic_base, payload, retain=False)
+        print(f"Published {len(device_ids)} heartbeats in one batch")
+
     def simulate_devices(self, duration_seconds=60, interval_seconds=10):
         """Simulate devices sending heartbeats for a specified duration"""
         print(f"Starting simulation for {duration_seconds} seconds...")
@@ -42,8 +56,11 @@ class HeartbeatPublisher:
         
         while time.time() - start_time < duration_seconds:
             # Randomly skip some heartbeats to simulate device issues
-            for device_id in self.devices:
-                if random.random() > 0.1:  # 90% chance to send heartbeat
+            sending = [device_id for device_id in self.devices if random.random() > 0.1]  # 90% chance to send heartbeat
+            if self.binary:
+                self.publish_batch(sending)
+            else:
+                for device_id in sending:
                     self.publish_heartbeat(device_id)
             
             time.sleep(interval_seconds)
@@ -54,7 +71,7 @@ class HeartbeatPublisher:
         print("Publisher stopped")
 
 if __name__ == "__main__":
-    publisher = HeartbeatPublisher()
+    publisher = HeartbeatPublisher(binary="--binary" in sys.argv)
     if publisher.connect():
         try:
             # Run simulation for 5 minutes with heartbeats every 10 seconds